@@ -0,0 +1,91 @@
+"""
+Benchmark for fetching every habit with its activities (`db.get_all_habits()` and the streaming
+`db.iter_habits_with_activities()`) at growing database sizes, to check that the time per activity stays flat, i.e.
+that fetching is linear in the size of the database.  Each size gets its own scratch database in a temporary directory.
+The largest size is given by --habits and --activities, and the smaller ones are fractions of it (--scales).
+
+Usage: python -m benchmarks.bench_get_all_habits [--habits 10000] [--activities 1000000] [--scales 0.01,0.1,1]
+       python -m benchmarks.bench_get_all_habits --habits 100000 --activities 10000000  (the full-size run)
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from modules import db
+from modules.utils import make_uuid
+
+
+def populate(num_habits: int, num_activities: int, num_orphans: int, seed: int = 0):
+    """
+    Fill the connected (empty) database with habits, and activities spread randomly across them.
+    :param num_habits: The number of habits to create
+    :param num_activities: The number of activities to create, in total
+    :param num_orphans: How many of the activities should belong to habits that don't exist
+    :param seed: Seed for the random number generator, so that runs are repeatable
+    :return: None
+    """
+    rand = random.Random(seed)
+    start = datetime(2020, 1, 1, 7, 30, 0)
+    habit_uuids = [make_uuid() for _ in range(num_habits)]
+
+    cur = db.get_connection().cursor()
+    # The rollup isn't what's being measured, and keeping it up to date would dominate the time taken to populate
+    cur.execute("DROP TRIGGER IF EXISTS trg_activities_roll_up_into_habit_periods")
+    # Orphaned activities can only be left over from before foreign keys were enforced, so make them the same way
+    cur.execute("PRAGMA foreign_keys = OFF")
+    cur.executemany("INSERT INTO habits(id, uuid, title, recurrence, created_at) VALUES(?, ?, ?, ?, ?)", (
+        (idx + 1, habit_uuid, f"Habit {idx}", "daily" if idx % 2 == 0 else "weekly",
+         start.strftime("%Y-%m-%d %H:%M:%S"))
+        for (idx, habit_uuid) in enumerate(habit_uuids)
+    ))
+    start_timestamp = int(start.replace(tzinfo=timezone.utc).timestamp())
+    cur.executemany("INSERT INTO activities(uuid, habit_id, performed_at) VALUES(?, ?, ?)", (
+        (make_uuid(), -idx if idx < num_orphans else rand.randrange(num_habits) + 1,
+         start_timestamp + rand.randrange(4 * 365 * 24 * 60 * 60))
+        for idx in range(num_activities)
+    ))
+    db.get_connection().commit()
+    cur.execute("PRAGMA foreign_keys = ON")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=10_000)
+    parser.add_argument("--activities", type=int, default=1_000_000, help="activities in total")
+    parser.add_argument("--orphans", type=float, default=0.001, help="fraction of activities without a habit")
+    parser.add_argument("--scales", default="0.01,0.1,1", help="comma-separated fractions of the full size")
+    args = parser.parse_args()
+
+    print(f"{'habits':>10} {'activities':>12} {'orphans':>9} {'get_all_habits()':>18} {'streamed':>12} "
+          f"{'ns/activity':>12}")
+    for scale in (float(s) for s in args.scales.split(",")):
+        num_habits = max(1, round(args.habits * scale))
+        num_activities = round(args.activities * scale)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db.connect(os.path.join(tmp_dir, "bench.db"))
+            db.setup_tables()
+            populate(num_habits, num_activities, round(num_activities * args.orphans))
+            num_orphans = db.count_orphaned_activities()
+
+            start = time.perf_counter()
+            db.get_all_habits()
+            listed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in db.iter_habits_with_activities():
+                pass
+            streamed = time.perf_counter() - start
+
+            db.disconnect()
+
+        ns_per_activity = streamed * 1e9 / max(1, num_activities)
+        print(f"{num_habits:>10} {num_activities:>12} {num_orphans:>9} {listed:>17.2f}s {streamed:>11.2f}s "
+              f"{ns_per_activity:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark for turning database records into `Habit` and `Activity` models, which is what `analytics.get_habits()` spends
+most of its time on.  No database is needed: the records are generated in memory.
+
+The models' constructors used to be dispatched by `multimethod` on the types of their arguments.  The baseline is a copy
+of those constructors (see `DispatchedHabit` and `DispatchedActivity`), which is only timed if `multimethod` is
+installed (it is no longer one of the app's requirements).
+
+Usage: python -m benchmarks.bench_hydration [--habits 1000] [--activities 100] [--repeat 5]
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from typing import Optional, Union
+
+from classes.habit import Habit
+from classes.activity import Activity
+from modules.utils import make_uuid
+
+try:
+    from multimethod import multimethod
+except ImportError:
+    multimethod = None
+
+
+if multimethod is not None:
+    class DispatchedHabit(Habit):
+        """
+        `Habit` with the constructors it had before they were merged into one, each of them dispatched by `multimethod`
+        """
+        __slots__ = ()
+
+        @multimethod
+        def __init__(self, title: str, recurrence: str, created_at: Optional[str] = None):
+            raise NotImplementedError("not benchmarked")
+
+        @multimethod
+        def __init__(self, uuid: str):
+            raise NotImplementedError("not benchmarked")
+
+        @multimethod
+        def __init__(self, db_item: dict[str, Union[tuple[str, ...], list[tuple[str, ...]]]]):
+            self.__parse_from_db__(db_item)
+
+    class DispatchedActivity(Activity):
+        """
+        `Activity` with the constructors it had before they were merged into one, each of them dispatched by
+        `multimethod`
+        """
+        __slots__ = ()
+
+        @multimethod
+        def __init__(self, habit_uuid: str, performed_at: Optional[str] = None):
+            raise NotImplementedError("not benchmarked")
+
+        @multimethod
+        def __init__(self, activity_tuple: tuple[str, str, Union[str, int]]):
+            self.__parse_from_db__(activity_tuple)
+
+
+def make_db_items(num_habits: int, num_activities: int):
+    """
+    Generate records shaped like the ones returned by `db.get_all_habits()`.
+    :param num_habits: The number of habits to generate
+    :param num_activities: The number of activities to generate per habit
+    :return: A list of dictionary objects with a "habit" tuple and a list of "activities" tuples
+    """
+    start = datetime(2023, 1, 1, 7, 30, 0)
+    db_items = []
+    for _ in range(num_habits):
+        habit_uuid = make_uuid()
+        db_items.append({
+            "habit": (habit_uuid, "Jog", "daily", start.strftime("%Y-%m-%d %H:%M:%S")),
+            "activities": [
+                (make_uuid(), habit_uuid, (start + timedelta(days=i, hours=1)).strftime("%Y-%m-%d %H:%M:%S"))
+                for i in range(num_activities)
+            ],
+        })
+    return db_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--activities", type=int, default=100, help="activities per habit")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db_items = make_db_items(args.habits, args.activities)
+    activity_tuples = [activity for db_item in db_items for activity in db_item["activities"]]
+
+    # Each scenario is compared with the first one of its group (the baseline, if it can be run)
+    groups = {
+        "habits": {
+            "Habit(db_item), multimethod": (
+                (lambda: [DispatchedHabit(db_item) for db_item in db_items]) if multimethod is not None else None
+            ),
+            "Habit(db_item)": lambda: [Habit(db_item) for db_item in db_items],
+            "Habit.from_db_row()": lambda: [Habit.from_db_row(i["habit"], i["activities"]) for i in db_items],
+        },
+        "activities": {
+            "Activity(activity_tuple), multimethod": (
+                (lambda: [DispatchedActivity(activity) for activity in activity_tuples]) if multimethod is not None
+                else None
+            ),
+            "Activity(activity_tuple)": lambda: [Activity(activity) for activity in activity_tuples],
+        },
+        "habits and their activities": {
+            "Habit(db_item) + materialise activities": lambda: [list(Habit(i).get_activities()) for i in db_items],
+        },
+    }
+
+    print(f"{args.habits} habits x {args.activities} activities, best of {args.repeat}")
+    for (group, scenarios) in groups.items():
+        print(f"\n{group}:")
+        reference = None
+        for (name, scenario) in scenarios.items():
+            if scenario is None:
+                print(f"  {name:45} skipped (multimethod is not installed)")
+                continue
+            best = min(timeit.repeat(scenario, number=1, repeat=args.repeat))
+            reference = reference if reference is not None else best
+            print(f"  {name:45} {best * 1000:10.1f} ms {reference / best:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
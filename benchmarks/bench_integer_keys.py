@@ -0,0 +1,167 @@
+"""
+Benchmark for migration 5 (integer ids and POSIX timestamps in the `activities` table), comparing the size of the
+database and the time taken by the typical activity queries before and after the migration.  A scratch database is set
+up with the schema as it was before the migration (version 4) and filled with random activities, measured, then brought
+up to date by reconnecting (which applies the migration) and measured again.  Sizes are measured after a VACUUM, so that
+they only count the pages in use.
+
+Usage: python -m benchmarks.bench_integer_keys [--habits 1000] [--activities 1000000]
+       python -m benchmarks.bench_integer_keys --habits 10000 --activities 10000000  (the full-size run)
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from modules import db
+from modules.utils import make_uuid
+
+# The same queries against each schema: the text schema refers to habits by uuid and stores datetime strings, while
+# the integer schema refers to them by id and stores timestamps
+queries = {
+    "one habit's activities": (
+        "SELECT * FROM activities WHERE habit = :habit_uuid ORDER BY performed_at ASC",
+        """
+        SELECT activities.uuid, habits.uuid, activities.performed_at
+        FROM habits JOIN activities ON activities.habit_id = habits.id
+        WHERE habits.uuid = :habit_uuid ORDER BY activities.performed_at ASC
+        """,
+    ),
+    "last performed": (
+        "SELECT MAX(performed_at) FROM activities WHERE habit = :habit_uuid",
+        "SELECT MAX(performed_at) FROM activities WHERE habit_id = (SELECT id FROM habits WHERE uuid = :habit_uuid)",
+    ),
+    "performed in a month": (
+        """
+        SELECT COUNT(*) FROM activities
+        WHERE habit = :habit_uuid AND performed_at BETWEEN '2022-03-01 00:00:00' AND '2022-03-31 23:59:59'
+        """,
+        """
+        SELECT COUNT(*) FROM activities
+        WHERE habit_id = (SELECT id FROM habits WHERE uuid = :habit_uuid)
+            AND performed_at BETWEEN strftime('%s', '2022-03-01 00:00:00') AND strftime('%s', '2022-03-31 23:59:59')
+        """,
+    ),
+    "all habits with activities": (
+        """
+        SELECT * FROM habits LEFT JOIN activities ON activities.habit = habits.uuid
+        ORDER BY habits.uuid ASC, activities.performed_at ASC
+        """,
+        """
+        SELECT habits.uuid, habits.title, habits.recurrence, habits.created_at, activities.uuid, habits.uuid,
+            activities.performed_at
+        FROM habits LEFT JOIN activities ON activities.habit_id = habits.id
+        ORDER BY habits.uuid ASC, activities.performed_at ASC
+        """,
+    ),
+}
+
+# How many times the single-habit queries are run (each for a different habit)
+num_lookups = 200
+
+
+def populate_old_schema(num_habits: int, num_activities: int, seed: int = 0):
+    """
+    Set up the connected database with the schema as it was at version 4, and fill it with habits, and activities
+    spread randomly across them.
+    :return: The uuids of the habits
+    """
+    migrations = db.migrations
+    db.migrations = [m for m in migrations if m[0] <= 4]
+    try:
+        db.setup_tables()
+    finally:
+        db.migrations = migrations
+
+    rand = random.Random(seed)
+    start = datetime(2020, 1, 1, 7, 30, 0)
+    habit_uuids = [make_uuid() for _ in range(num_habits)]
+
+    cur = db.get_connection().cursor()
+    # The rollup isn't what's being measured, and keeping it up to date would dominate the time taken to populate
+    cur.execute("DROP TRIGGER IF EXISTS trg_activities_roll_up_into_habit_periods")
+    cur.executemany("INSERT INTO habits VALUES(?, ?, ?, ?)", (
+        (habit_uuid, f"Habit {idx}", "daily" if idx % 2 == 0 else "weekly", start.strftime("%Y-%m-%d %H:%M:%S"))
+        for (idx, habit_uuid) in enumerate(habit_uuids)
+    ))
+    cur.executemany("INSERT INTO activities VALUES(?, ?, ?)", (
+        (make_uuid(), rand.choice(habit_uuids),
+         (start + timedelta(seconds=rand.randrange(4 * 365 * 24 * 60 * 60))).strftime("%Y-%m-%d %H:%M:%S"))
+        for _ in range(num_activities)
+    ))
+    db.get_connection().commit()
+    return habit_uuids
+
+
+def measure(schema_idx: int, habit_uuids: list[str]):
+    """
+    :param schema_idx: 0 for the text schema and 1 for the integer schema, i.e. which of the `queries` to run
+    :return: A tuple containing the size of the database in bytes, a dictionary of sizes per table/index, and a
+        dictionary of the time taken by each query (per run, in seconds)
+    """
+    connection = db.get_connection()
+    connection.commit()
+    connection.execute("VACUUM")
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    (page_count, page_size) = (connection.execute("PRAGMA page_count").fetchone()[0],
+                               connection.execute("PRAGMA page_size").fetchone()[0])
+    object_sizes = dict(connection.execute("""
+        SELECT name, SUM(pgsize) FROM dbstat
+        WHERE name LIKE '%activities%' OR name LIKE '%habits%'
+        GROUP BY name
+    """).fetchall())
+
+    timings = {}
+    lookups = habit_uuids[:num_lookups]
+    for (name, sql) in queries.items():
+        sql = sql[schema_idx]
+        start = time.perf_counter()
+        if name == "all habits with activities":
+            for _ in connection.execute(sql):
+                pass
+            timings[name] = time.perf_counter() - start
+        else:
+            for habit_uuid in lookups:
+                connection.execute(sql, {"habit_uuid": habit_uuid}).fetchall()
+            timings[name] = (time.perf_counter() - start) / len(lookups)
+
+    return page_count * page_size, object_sizes, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=1_000)
+    parser.add_argument("--activities", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "bench.db")
+        db.connect(db_name, profile="bulk-import")
+        start = time.perf_counter()
+        habit_uuids = populate_old_schema(args.habits, args.activities)
+        print(f"Populated {args.habits} habits and {args.activities} activities in {time.perf_counter() - start:.1f}s")
+        before = measure(0, habit_uuids)
+        db.disconnect()
+
+        start = time.perf_counter()
+        db.connect(db_name, profile="bulk-import")  # applies migration 5
+        print(f"Migrated in {time.perf_counter() - start:.1f}s")
+        after = measure(1, habit_uuids)
+        db.disconnect()
+
+    print(f"\n{'':<40} {'before':>12} {'after':>12} {'change':>8}")
+    print(f"{'database size (MB)':<40} {before[0] / 1e6:>12.1f} {after[0] / 1e6:>12.1f} "
+          f"{(after[0] - before[0]) / before[0]:>+8.0%}")
+    for name in sorted(set(before[1]) | set(after[1])):
+        print(f"{'  ' + name + ' (MB)':<40} {before[1].get(name, 0) / 1e6:>12.1f} {after[1].get(name, 0) / 1e6:>12.1f}")
+    for name in queries:
+        (t_before, t_after) = (before[2][name], after[2][name])
+        unit = ("s", 1) if name == "all habits with activities" else ("ms", 1e3)
+        print(f"{name + ' (' + unit[0] + ')':<40} {t_before * unit[1]:>12.3f} {t_after * unit[1]:>12.3f} "
+              f"{(t_after - t_before) / t_before:>+8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark for the PRAGMA profiles in `db.pragma_profiles`, measuring for each profile:
+ - single writes: activities created one at a time with `db.create_activity()`, i.e. one commit each, which is what
+   the interactive app does
+ - bulk writes: activities imported with `db.create_activities_bulk()`, i.e. one commit for the lot
+ - reads under write load: `db.get_habit()` calls made while another thread keeps creating activities, along with how
+   many of those reads failed because the database was locked
+Each profile gets its own scratch database in a temporary directory.
+
+Usage: python -m benchmarks.bench_pragma_profiles [--habits 100] [--writes 2000] [--bulk 200000] [--seconds 3]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from modules import db
+
+
+def make_datetimes(num: int, start: datetime = datetime(2020, 1, 1, 7, 30, 0)):
+    return ((start + timedelta(minutes=idx)).strftime("%Y-%m-%d %H:%M:%S") for idx in range(num))
+
+
+def bench_single_writes(habit_uuids: list[str], num_writes: int):
+    """
+    :return: Activities created per second, one commit each
+    """
+    start = time.perf_counter()
+    for (idx, performed_at) in enumerate(make_datetimes(num_writes)):
+        db.create_activity(habit_uuids[idx % len(habit_uuids)], performed_at)
+    return num_writes / (time.perf_counter() - start)
+
+
+def bench_bulk_writes(habit_uuid: str, num_rows: int):
+    """
+    :return: Activities created per second, in a single transaction
+    """
+    start = time.perf_counter()
+    db.create_activities_bulk(habit_uuid, make_datetimes(num_rows, datetime(2024, 1, 1, 7, 30, 0)))
+    return num_rows / (time.perf_counter() - start)
+
+
+def bench_reads_under_load(habit_uuids: list[str], seconds: float):
+    """
+    Read habits on this thread while another thread creates activities as fast as it can.
+    :return: A tuple containing the number of reads per second, the number of writes per second, and the number of
+        reads and writes that failed because the database was locked
+    """
+    stop = threading.Event()
+    counts = {"writes": 0, "locked": 0}
+
+    def write():
+        for (idx, performed_at) in enumerate(make_datetimes(10_000_000, datetime(2028, 1, 1, 7, 30, 0))):
+            if stop.is_set():
+                break
+            try:
+                db.create_activity(habit_uuids[idx % len(habit_uuids)], performed_at)
+                counts["writes"] += 1
+            except sqlite3.OperationalError:  # "database is locked"
+                counts["locked"] += 1
+        db.default_pool.release_connection()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    num_reads = 0
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < seconds:
+            try:
+                db.get_habit(habit_uuids[num_reads % len(habit_uuids)])
+                num_reads += 1
+            except sqlite3.OperationalError:
+                counts["locked"] += 1
+    finally:
+        stop.set()
+        writer.join()
+    elapsed = time.perf_counter() - start
+
+    return num_reads / elapsed, counts["writes"] / elapsed, counts["locked"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=100)
+    parser.add_argument("--writes", type=int, default=2_000, help="activities to create one at a time")
+    parser.add_argument("--bulk", type=int, default=200_000, help="activities to import in one transaction")
+    parser.add_argument("--seconds", type=float, default=3, help="how long to read for under write load")
+    parser.add_argument("--profiles", default=",".join(db.pragma_profiles), help="comma-separated profile names")
+    args = parser.parse_args()
+
+    print(f"{'profile':>12} {'single writes/s':>16} {'bulk rows/s':>12} {'reads/s (loaded)':>17} "
+          f"{'writes/s (loaded)':>18} {'locked':>7}")
+    for profile in args.profiles.split(","):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db.connect(os.path.join(tmp_dir, "bench.db"), profile=profile)
+            db.setup_tables()
+            habit_uuids = [db.create_habit(f"Habit {idx}", "daily")["habit"][0] for idx in range(args.habits)]
+
+            single_writes = bench_single_writes(habit_uuids, args.writes)
+            # A habit of its own, so that the big import doesn't weigh on the reads below
+            bulk_rows = bench_bulk_writes(db.create_habit("Import", "daily")["habit"][0], args.bulk)
+            (reads, loaded_writes, locked) = bench_reads_under_load(habit_uuids, args.seconds)
+
+            db.disconnect()
+
+        print(f"{profile:>12} {single_writes:>16.0f} {bulk_rows:>12.0f} {reads:>17.0f} {loaded_writes:>18.0f} "
+              f"{locked:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark for the start-up time of the app, i.e. what every scripted call of `main.py` pays before it does any work.
+Each command is run as a fresh process in a scratch directory (with its own database, set up beforehand so that the
+first run doesn't pay for the starter data), and timed from start to exit.  One extra run of each under
+`python -X importtime` breaks down how much of that was spent importing modules, and which imports cost the most.
+
+The interactive app can't be run without a terminal, so "menus" stands in for it: it imports the home menu, which is
+what the app loads before its first prompt.
+
+Usage: python -m benchmarks.bench_startup [--repeat 10] [--top 8]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# The root of the repository, where `main.py` is
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The commands to time, as arguments to the Python interpreter
+commands = {
+    "python": ["-c", "pass"],  # the interpreter on its own, for comparison
+    "help": [os.path.join(repo_dir, "main.py"), "--help"],
+    "stats": [os.path.join(repo_dir, "main.py"), "stats"],
+    "perform": [os.path.join(repo_dir, "main.py"), "perform", "Jog", "--at", "2024-01-01 07:30:00"],
+    "menus": ["-c", "import modules.cli.home"],
+}
+
+
+def run(args: list[str], cwd: str, import_time: bool = False):
+    """
+    Run the Python interpreter with the given arguments.
+    :return: A tuple containing the time the process took to run (in seconds) and what it wrote to stderr
+    """
+    env = dict(os.environ, PYTHONPATH=repo_dir)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *(["-X", "importtime"] if import_time else []), *args], cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def parse_import_times(stderr: str):
+    """
+    :param stderr: The output of `python -X importtime`, which has a line per module: "import time: <self us> |
+        <cumulative us> | <module>", with the module indented by how deeply it was nested in other imports
+    :return: A tuple containing the total time spent on imports (in seconds) and a list of tuples containing the time
+        (in seconds, including the modules it imported) and the name of each top-level import
+    """
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        (_, cumulative, name) = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # a top-level import has a single space before its name
+            top_level.append((int(cumulative) / 1_000_000, name.strip()))
+    return sum(t for (t, _) in top_level), top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=8, help="how many of the slowest imports to list per command")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run(commands["stats"], tmp_dir)  # sets up the database, along with the starter data
+
+        results = {}
+        for (name, command) in commands.items():
+            times = [run(command, tmp_dir)[0] for _ in range(args.repeat)]
+            (total_import_time, top_level) = parse_import_times(run(command, tmp_dir, import_time=True)[1])
+            results[name] = (min(times), statistics.median(times), total_import_time, top_level)
+
+    print(f"{'command':<10} {'best (ms)':>10} {'median (ms)':>12} {'imports (ms)':>13}")
+    for (name, (best, median, total_import_time, _)) in results.items():
+        print(f"{name:<10} {best * 1000:>10.1f} {median * 1000:>12.1f} {total_import_time * 1000:>13.1f}")
+
+    for (name, (_, _, _, top_level)) in results.items():
+        if name == "python":
+            continue
+        print(f"\nSlowest imports of {name}:")
+        for (seconds, module) in sorted(top_level, reverse=True)[:args.top]:
+            print(f"  {seconds * 1000:>8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
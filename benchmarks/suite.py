@@ -0,0 +1,193 @@
+"""
+Benchmark suite for the hot paths of the models, the analytics and the database, run against synthetic datasets (see
+`example_data.generate_dataset()`) of growing size.  For each size (a total number of activities), the scenarios are:
+ - bulk_import: `db.import_dataset()` of the whole dataset into an empty database
+ - cold_load: streaming every habit with its activities (`db.iter_habits_with_activities()`, which is what
+   `db.get_all_habits()` lists) right after connecting
+ - cold_stats: `analytics.get_habits()` with no stored stats, i.e. computing every habit's stats in the database
+ - warm_stats: `analytics.get_habits()` again, served from the stored stats
+ - models_stats: `analytics.get_habits(engine="models")`, i.e. `Habit.get_completion_rate()` and friends for every habit
+ - streaks: `Habit.get_all_streaks()` and `Habit.get_latest_streak()` for every habit
+ - perform: the latency of `Habit.perform()` on the habit with the most activities (per call)
+Each scenario is timed `--repeat` times and the best time kept (except bulk_import, which is run once per size).
+
+The results are written to a JSON file (--output).  Given a baseline (--baseline, e.g. the results file of an earlier
+run), each result is compared with the baseline's, and the suite exits with status 1 if any of them got slower by more
+than the threshold (--threshold, as a fraction).
+
+Usage: python -m benchmarks.suite [--sizes 1e3,1e4,1e5] [--repeat 3] [--output bench_results.json]
+       python -m benchmarks.suite --sizes 1e6,1e7 --repeat 1  (the large sizes)
+       python -m benchmarks.suite --baseline baseline.json [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from classes.habit import Habit
+from modules import analytics, db, example_data
+
+# Roughly how many activities a generated habit has over `years_of_history`, for choosing how many habits to generate
+# for a given number of activities
+activities_per_habit = 300
+years_of_history = 2
+
+# Differences smaller than this many seconds are never counted as regressions, since they are mostly noise
+min_regression_seconds = 0.0002
+
+# How many activities the perform scenario adds (and averages over)
+num_performs = 20
+
+
+def make_dataset(num_activities: int, seed: int):
+    """
+    :return: A tuple containing a list of habit records and a generator of exactly `num_activities` activity records
+    """
+    num_habits = max(1, -(-num_activities // activities_per_habit))  # i.e. rounded up
+    (habits, activities) = example_data.generate_dataset(num_habits, years=years_of_history, seed=seed)
+    return habits, islice(activities, num_activities)
+
+
+def best_time(func, repeat: int):
+    """
+    :return: The shortest time taken by `func()`, in seconds, over `repeat` runs
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_size(num_activities: int, repeat: int, seed: int):
+    """
+    Run every scenario against a dataset of the given size, in a scratch database.
+    :return: A dictionary of the time taken by each scenario, in seconds
+    """
+    today = example_data.default_end  # the generated activities all come before this
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "bench.db")
+        db.connect(db_name)
+        db.setup_tables()
+        (habits, activities) = make_dataset(num_activities, seed)
+        timings["bulk_import"] = best_time(lambda: db.import_dataset(habits, activities), 1)
+
+        def cold_load():
+            db.disconnect()
+            db.connect(db_name)
+            for _ in db.iter_habits_with_activities():
+                pass
+        timings["cold_load"] = best_time(cold_load, repeat)
+
+        def cold_stats():
+            db.get_connection().execute("DELETE FROM habit_stats")
+            db.get_connection().commit()
+            analytics.get_habits(today)
+        timings["cold_stats"] = best_time(cold_stats, repeat)
+        timings["warm_stats"] = best_time(lambda: analytics.get_habits(today), repeat)
+        timings["models_stats"] = best_time(lambda: analytics.get_habits(today, engine="models"), repeat)
+
+        def streaks():
+            for db_item in db.iter_habits_with_activities():
+                habit = Habit.from_db_row(db_item["habit"], db_item["activities"])
+                habit.get_all_streaks()
+                habit.get_latest_streak(today)
+        timings["streaks"] = best_time(streaks, repeat)
+
+        (biggest_habit, _) = db.get_connection().execute("""
+            SELECT habits.uuid, COUNT(*) AS num_activities
+            FROM habits JOIN activities ON activities.habit_id = habits.id
+            GROUP BY habits.id ORDER BY num_activities DESC LIMIT 1
+        """).fetchone()
+        habit = Habit(biggest_habit)
+        habit.get_activities()  # load the habit before timing, as the app would have it loaded already
+        performed_at = [(today + timedelta(minutes=idx)).strftime("%Y-%m-%d %H:%M:%S") for idx in range(num_performs)]
+        start = time.perf_counter()
+        for dt in performed_at:
+            habit.perform(dt)
+        timings["perform"] = (time.perf_counter() - start) / num_performs
+
+        db.disconnect()
+
+    return timings
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """
+    Compare results with a baseline.
+    :param results: The "results" of a results file, i.e. a dictionary keyed by "<scenario>@<size>"
+    :param baseline: The "results" of the baseline's results file
+    :param threshold: How much slower than the baseline a result may be, as a fraction (e.g. 0.25 for 25%)
+    :return: A list of tuples, one per result that is also in the baseline, containing the key, the baseline's time,
+        the new time, the relative change and whether it counts as a regression
+    """
+    comparisons = []
+    for (key, result) in results.items():
+        if key not in baseline:
+            continue
+        (before, after) = (baseline[key]["seconds"], result["seconds"])
+        change = (after - before) / before if before > 0 else 0.0
+        regressed = change > threshold and after - before > min_regression_seconds
+        comparisons.append((key, before, after, change, regressed))
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1e3,1e4,1e5", help="comma-separated numbers of activities")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    results = {}
+    for num_activities in (int(float(size)) for size in args.sizes.split(",")):
+        timings = run_size(num_activities, args.repeat, args.seed)
+        for (scenario, seconds) in timings.items():
+            results[f"{scenario}@{num_activities}"] = {
+                "scenario": scenario,
+                "activities": num_activities,
+                "seconds": seconds,
+            }
+            print(f"{scenario:>14} @ {num_activities:<10} {seconds * 1000:>12.2f} ms")
+
+    with open(args.output, "w") as file:
+        json.dump({
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "results": results,
+        }, file, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        comparisons = compare(results, baseline, args.threshold)
+
+        print(f"\n{'':<26} {'baseline (ms)':>14} {'now (ms)':>12} {'change':>8}")
+        for (key, before, after, change, regressed) in comparisons:
+            print(f"{key:<26} {before * 1000:>14.2f} {after * 1000:>12.2f} {change:>+8.0%}"
+                  f"{'  REGRESSED' if regressed else ''}")
+
+        num_regressed = sum(1 for c in comparisons if c[4])
+        if num_regressed > 0:
+            print(f"{num_regressed} result(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,33 @@
-from multimethod import multimethod
-from typing import Optional
+from typing import Optional, Union
 from modules.db import create_activity
 from modules import utils
 
 
 class Activity:
-    @multimethod
-    def __init__(self, habit_uuid: str, performed_at: Optional[str] = None):
-        """
-        Create a new activity in the database and then initialise a model to represent the newly-created activity.
-        :param habit_uuid: The uuid of the habit that's being performed
+    # Activities are created in large numbers when habits are loaded, so don't give each one a `__dict__`
+    __slots__ = ("__uuid__", "__habit__", "__performed_at__")
+
+    def __init__(self, habit_uuid_or_activity_tuple: Union[str, tuple], performed_at: Optional[str] = None):
+        """
+        An activity model can be initialised in two ways:
+        * `Activity(habit_uuid, performed_at=None)` creates a new activity in the database and then initialises a model
+          to represent the newly-created activity.
+        * `Activity(activity_tuple)` transfers the data of an existing record to the model.
+        :param habit_uuid_or_activity_tuple: Either the uuid of the habit that's being performed, or a record from the
+            `activities` database table.  The time of performance in the record may also have already been converted to
+            a POSIX timestamp (e.g. by `ActivityLog`).
         :param performed_at: The date/time at which the habit was performed, as specified by the user.  If not
             specified, the database will add a timestamp when the record is created.  This date/time is taken to be
             of the local timezone.  This value should be a string of the format YYYY-mm-dd HH:MM:SS.
         """
-        performed_at_gmt = utils.format_date_for_db(performed_at) if performed_at is not None else None
-        new_activity = create_activity(habit_uuid, performed_at_gmt)
-        self.__parse_from_db__(new_activity)
-
-    @multimethod
-    def __init__(self, activity_tuple: tuple[str, str, str]):
-        """
-        Given a record from the `activities` database table, transfer the data to this `Activity` model object
-        :param activity_tuple: A record from the `activities` database table
-        """
-        self.__parse_from_db__(activity_tuple)
+        if isinstance(habit_uuid_or_activity_tuple, tuple) and performed_at is None:
+            self.__parse_from_db__(habit_uuid_or_activity_tuple)
+        elif isinstance(habit_uuid_or_activity_tuple, str):
+            performed_at_gmt = utils.format_date_for_db(performed_at) if performed_at is not None else None
+            new_activity = create_activity(habit_uuid_or_activity_tuple, performed_at_gmt)
+            self.__parse_from_db__(new_activity)
+        else:
+            raise TypeError("Activity() takes either a habit uuid and an optional date/time, or an activity tuple")
 
     def get_uuid(self):
         return self.__uuid__
@@ -38,7 +41,7 @@ class Activity:
         """
         return self.__performed_at__
 
-    def __parse_from_db__(self, activity_tuple: tuple[str, str, str]):
+    def __parse_from_db__(self, activity_tuple: tuple[str, str, Union[str, int]]):
         """
         Translate the data from an activity database record to this `Activity` model object.
         :param activity_tuple: A record from the `activities` database table
@@ -46,7 +49,9 @@ class Activity:
         """
         self.__uuid__ = activity_tuple[0]
         self.__habit__ = activity_tuple[1]
-        self.__performed_at__ = utils.to_datetime(activity_tuple[2], True)
+        performed_at = activity_tuple[2]
+        self.__performed_at__ = utils.timestamp_to_datetime(performed_at) if isinstance(performed_at, int) \
+            else utils.to_datetime(performed_at, True)
 
     def __str__(self):
         return f"Habit {self.__habit__} performed at {self.__performed_at__}"
@@ -0,0 +1,142 @@
+from array import array
+from bisect import bisect_right
+from typing import Optional, Sequence, Union
+from uuid import UUID
+
+from modules import utils
+from classes.activity import Activity
+
+
+class ActivityLog:
+    """
+    The performances of one habit, stored column by column rather than as a list of `Activity` models.  The times of
+    performance are kept in ascending order as POSIX timestamps in an array of 64-bit integers, and the uuids of the
+    activities are packed into a byte string (16 bytes each, in the same order).  That is about 24 bytes per activity.
+    `Activity` models are only created when an individual activity is asked for, e.g. by indexing into or iterating over
+    the log.
+    """
+    __slots__ = ("__habit_uuid__", "__timestamps__", "__uuids__")
+
+    def __init__(self, habit_uuid: str, activity_tuples: Optional[list[tuple]] = None):
+        """
+        :param habit_uuid: The uuid of the habit whose performances this log holds
+        :param activity_tuples: Records from the `activities` database table belonging to this habit, sorted by the time
+            they were performed
+        """
+        self.__habit_uuid__ = habit_uuid
+        self.__timestamps__ = array("q")
+        self.__uuids__ = bytearray()
+
+        if activity_tuples is not None:
+            self.extend(activity_tuples)
+
+    @classmethod
+    def from_columns(cls, habit_uuid: str, timestamps: Sequence[int], uuids: bytes):
+        """
+        Create a log from activities that have already been decoded into columns (see `get_columns()`).
+        :param habit_uuid: The uuid of the habit whose performances this log holds
+        :param timestamps: When the habit was performed, as POSIX timestamps sorted in ascending order
+        :param uuids: The uuids of the activities, packed 16 bytes each, in the same order as `timestamps`
+        :return: The new `ActivityLog`
+        """
+        log = cls(habit_uuid)
+        log.__timestamps__ = array("q", timestamps)
+        log.__uuids__ = bytearray(uuids)
+        return log
+
+    def __len__(self):
+        return len(self.__timestamps__)
+
+    def __getitem__(self, idx: Union[int, slice]):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("activity log index out of range")
+
+        return Activity((self.get_uuid(idx), self.__habit_uuid__, self.__timestamps__[idx]))
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def get_timestamps(self):
+        """
+        :return: The times at which the habit was performed, as POSIX timestamps in ascending order.  This is the log's
+            own buffer, so it must not be modified.
+        """
+        return self.__timestamps__
+
+    def get_columns(self):
+        """
+        :return: A tuple containing copies of the log's two columns: the times of performance (an array of POSIX
+            timestamps in ascending order) and the packed uuids (16 bytes each).  This is a compact form of the log that
+            is cheap to send to another process, and that `from_columns()` turns back into a log.
+        """
+        return array("q", self.__timestamps__), bytes(self.__uuids__)
+
+    def get_uuid(self, idx: int):
+        """
+        :param idx: The position of the activity in the log
+        :return: The uuid of that activity
+        """
+        return str(UUID(bytes=bytes(self.__uuids__[16 * idx:16 * (idx + 1)])))
+
+    def get_last_performed_at(self):
+        """
+        :return: The last datetime the habit was performed (local timezone) (or None if never performed)
+        """
+        if len(self.__timestamps__) == 0:
+            return None
+
+        return utils.timestamp_to_datetime(self.__timestamps__[-1])
+
+    def add(self, activity_tuple: tuple):
+        """
+        Add an activity to the log, keeping the log in chronological order.
+        :param activity_tuple: A record from the `activities` database table
+        :return: When the activity was performed, as a POSIX timestamp
+        """
+        timestamp = utils.to_timestamp(activity_tuple[2])
+        idx = bisect_right(self.__timestamps__, timestamp)  # usually the end of the log, i.e. an append
+        self.__timestamps__.insert(idx, timestamp)
+        self.__uuids__[16 * idx:16 * idx] = self.__pack_uuid__(activity_tuple[0])
+        return timestamp
+
+    def extend(self, activity_tuples: list[tuple], sort: bool = True):
+        """
+        Add a batch of activities to the log.
+        :param activity_tuples: Records from the `activities` database table
+        :param sort: Whether to put the log back into chronological order afterwards.  When adding several batches in a
+            row, pass False and call `sort()` once at the end instead.
+        :return: When the new activities were performed, as an array of POSIX timestamps (in the order given)
+        """
+        timestamps = utils.to_timestamps([activity[2] for activity in activity_tuples])
+        self.__timestamps__.extend(timestamps)
+        self.__uuids__ += b"".join(self.__pack_uuid__(activity[0]) for activity in activity_tuples)
+
+        if sort:
+            self.sort()
+
+        return timestamps
+
+    def sort(self):
+        """
+        Put the log back into chronological order (if it isn't already), moving each uuid along with its timestamp.
+        :return: None
+        """
+        timestamps = self.__timestamps__
+        if all(timestamps[i] <= timestamps[i + 1] for i in range(len(timestamps) - 1)):
+            return
+
+        # The log is normally made up of a few already-sorted runs, which is the case the sort handles in linear time
+        order = sorted(range(len(self.__timestamps__)), key=self.__timestamps__.__getitem__)
+        uuids = self.__uuids__
+        self.__timestamps__ = array("q", (self.__timestamps__[i] for i in order))
+        self.__uuids__ = bytearray(b"".join(uuids[16 * i:16 * (i + 1)] for i in order))
+
+    @staticmethod
+    def __pack_uuid__(uuid: str):
+        return bytes.fromhex(uuid.replace("-", ""))
@@ -1,48 +1,112 @@
 from datetime import datetime
-from multimethod import multimethod
-from typing import Union, Optional
+from typing import Union, Optional, Iterable, Sequence
 
-from modules.db import create_habit, get_habit, delete_habit, get_all_habits_abridged
-from modules import utils
-from classes.activity import Activity
+from modules.db import create_habit, get_habit, delete_habit, get_all_habits_abridged, get_last_performed_at, \
+    create_activity, create_activities_streamed, get_habit_with_periods
+from modules import utils, streaks, completion
+from classes.activity_log import ActivityLog
 
 
 class Habit:
 
-    @multimethod
-    def __init__(self, title: str, recurrence: str, created_at: Optional[str] = None):
+    # Habits are created in large numbers when they are all loaded for the stats, so don't give each one a `__dict__`
+    __slots__ = ("__uuid__", "__title__", "__recurrence__", "__created_at__", "__activities__", "__streaks__",
+                 "__periods__")
+
+    def __init__(self, title_uuid_or_db_item: Union[str, dict], recurrence: Optional[str] = None,
+                 created_at: Optional[str] = None):
         """
-        Create a new habit in the database and then initialise a model to represent the newly-created habit.
-        :param title: The title of the habit
-        :param recurrence: How often the habit should be performed, e.g. daily
-        :param created_at: The date/time at which the habit was created, according to the user.  If not specified, the
+        A habit model can be initialised in three ways:
+        * `Habit(title, recurrence, created_at=None)` creates a new habit in the database and then initialises a model
+          to represent the newly-created habit.
+        * `Habit(uuid)` initialises the model to represent an existing habit, fetched from the database.
+        * `Habit(db_item)` initialises the model from a habit that has already been fetched from the database (see
+          `from_db_row()`).
+        :param title_uuid_or_db_item: The title of a new habit, the uuid of an existing habit, or a dictionary object
+            that has a "habit" value, which is the habit tuple from the database, and an "activities" value, which is a
+            list of the activity tuples belonging to this habit
+        :param recurrence: How often a new habit should be performed, e.g. daily
+        :param created_at: The date/time at which a new habit was created, according to the user.  If not specified, the
             database will add a timestamp when the record is created.  The provided date/time is assumed to be of the
             local timezone.  This value should be a string of the format YYYY-mm-dd HH:MM:SS.
         :return: None
         """
-        created_at_gmt = utils.format_date_for_db(created_at) if created_at is not None else None
-        created_habit = create_habit(title, recurrence, created_at_gmt)
-        self.__parse_from_db__(created_habit)
-
-    @multimethod
-    def __init__(self, uuid: str):
+        if isinstance(title_uuid_or_db_item, dict) and recurrence is None:
+            self.__parse_from_db__(title_uuid_or_db_item)
+        elif isinstance(title_uuid_or_db_item, str) and recurrence is None:
+            fetched_habit = get_habit(title_uuid_or_db_item)
+            self.__parse_from_db__(fetched_habit)
+        elif isinstance(title_uuid_or_db_item, str) and isinstance(recurrence, str):
+            created_at_gmt = utils.format_date_for_db(created_at) if created_at is not None else None
+            created_habit = create_habit(title_uuid_or_db_item, recurrence, created_at_gmt)
+            self.__parse_from_db__(created_habit)
+        else:
+            raise TypeError("Habit() takes either a title, recurrence and optional date/time, a uuid, or a db item")
+
+    @classmethod
+    def from_db_row(cls, habit_tuple: tuple, activity_tuples: list[tuple]):
         """
-        Initialise the model to represent an existing habit (from the database).
-        :param uuid: The uuid of the habit to fetch and create a model of.
-        :return: None
+        Create a model of a habit that has already been fetched from the database.  This is the quickest way to create a
+        model of an existing habit, e.g. when loading all the habits at once.
+        :param habit_tuple: The habit's record from the `habits` database table
+        :param activity_tuples: The habit's records from the `activities` database table, sorted by the time they were
+            performed
+        :return: The new `Habit` model
         """
-        fetched_habit = get_habit(uuid)
-        self.__parse_from_db__(fetched_habit)
+        habit = cls.__new__(cls)
+        habit.__parse_from_db__({
+            "habit": habit_tuple,
+            "activities": activity_tuples,
+        })
+        return habit
+
+    @classmethod
+    def from_columns(cls, habit_tuple: tuple, timestamps: Sequence[int], uuids: bytes):
+        """
+        Create a model of a habit whose activities have already been decoded into columns (see
+        `ActivityLog.get_columns()`), e.g. after being sent to another process.
+        :param habit_tuple: The habit's record from the `habits` database table
+        :param timestamps: When the habit was performed, as POSIX timestamps sorted in ascending order
+        :param uuids: The uuids of the activities, packed 16 bytes each, in the same order as `timestamps`
+        :return: The new `Habit` model
+        """
+        habit = cls.__new__(cls)
+        habit.__parse_habit_tuple__(habit_tuple)
+        habit.__set_activity_log__(ActivityLog.from_columns(habit.__uuid__, timestamps, uuids))
+        return habit
 
-    @multimethod
-    def __init__(self, db_item: dict[str, Union[tuple[str, ...], list[tuple[str, ...]]]]):
+    @classmethod
+    def from_habit_periods(cls, habit_tuple: tuple, period_tuples: list[tuple]):
+        """
+        Create a model of a habit from its rollup of activities per day/week (the `habit_periods` database table) rather
+        than from every activity.  That is all the streak and completion calculations need, so it's the quickest way to
+        load a habit with a long history just to look at its stats.  The individual activities are only fetched if they
+        are asked for (e.g. by `get_activities()`).
+        :param habit_tuple: The habit's record from the `habits` database table
+        :param period_tuples: The habit's records from the `habit_periods` database table, sorted by period
+        :return: The new `Habit` model
         """
-        Initialise the model to represent an existing habit (from the database).
-        :param db_item: The dictionary object that has a "habit" value, which is the habit tuple
-            from the database, and an "activities" value, which is a list of the activity tuples
-            belonging to this habit
+        habit = cls.__new__(cls)
+        habit.__parse_habit_tuple__(habit_tuple)
+        active_periods = [
+            (period, utils.to_timestamp(first_at), utils.to_timestamp(last_at))
+            for (_, period, _, first_at, last_at) in period_tuples
+        ]
+        habit.__activities__ = None
+        habit.__streaks__ = streaks.StreakIndex.from_active_periods(habit.__recurrence__, active_periods)
+        habit.__periods__ = completion.PeriodIndex.from_active_periods(habit.__recurrence__, active_periods)
+        return habit
+
+    @classmethod
+    def load_from_rollup(cls, uuid: str):
         """
-        self.__parse_from_db__(db_item)
+        Fetch an existing habit from the database via its rollup of activities per day/week (see
+        `from_habit_periods()`).
+        :param uuid: The uuid of the habit
+        :return: The new `Habit` model
+        """
+        fetched_habit = get_habit_with_periods(uuid)
+        return cls.from_habit_periods(fetched_habit["habit"], fetched_habit["periods"])
 
     def get_uuid(self):
         return self.__uuid__
@@ -60,16 +124,18 @@ class Habit:
         return self.__created_at__
 
     def get_activities(self):
-        return self.__activities__
+        """
+        :return: The performances of this habit in chronological order, as an `ActivityLog` (a sequence of `Activity`
+            models that are only created as they are accessed)
+        """
+        return self.__get_activity_log__()
 
     def get_date_last_performed(self):
         """
         :return: The last datetime this habit was performed (local timezone) (or None if never performed)
         """
-        if len(self.__activities__) == 0:
-            return None
-
-        return self.__activities__[-1].get_performed_at()
+        latest_run = self.__streaks__.get_latest_run()
+        return utils.timestamp_to_datetime(latest_run[3]) if latest_run is not None else None
 
     def get_interval_label(self, count: int = 1):
         """
@@ -87,7 +153,7 @@ class Habit:
         return f"""Title: {self.__title__}
 Recurs: {self.__recurrence__}
 Created at: {self.__created_at__}
-Has been performed {len(self.__activities__)} time{"" if len(self.__activities__) == 1 else "s"}"""
+Has been performed {len(self.get_activities())} time{"" if len(self.get_activities()) == 1 else "s"}"""
 
     def __refresh__(self):
         """
@@ -110,17 +176,39 @@ Has been performed {len(self.__activities__)} time{"" if len(self.__activities__
             }
         :return: None
         """
-        db_habit = db_item["habit"]
-        db_activities = db_item["activities"]
+        self.__parse_habit_tuple__(db_item["habit"])
+        self.__set_activity_log__(ActivityLog(self.__uuid__, db_item["activities"]))
 
+    def __parse_habit_tuple__(self, db_habit: tuple[str, ...]):
+        """
+        Transfer the data from a habit database record (without its activities) to this `Habit` model object.
+        :param db_habit: A record from the `habits` database table
+        :return: None
+        """
         self.__uuid__ = db_habit[0]
         self.__title__ = db_habit[1]
         self.__recurrence__ = db_habit[2]
         self.__created_at__ = utils.to_datetime(db_habit[3], True)
 
-        self.__activities__ = []
-        for activity in db_activities:
-            self.__activities__.append(Activity(activity))
+    def __set_activity_log__(self, activity_log: ActivityLog):
+        """
+        Give this `Habit` model its activities, and index them for the streak and completion calculations.
+        :param activity_log: All the habit's activities
+        :return: None
+        """
+        self.__activities__ = activity_log
+        self.__streaks__ = streaks.StreakIndex(self.__recurrence__, activity_log.get_timestamps())
+        self.__periods__ = completion.PeriodIndex(self.__recurrence__, activity_log.get_timestamps())
+
+    def __get_activity_log__(self):
+        """
+        Habits loaded from the `habit_periods` rollup (see `from_habit_periods()`) only fetch their individual
+        activities from the database once they are needed.
+        :return: The habit's `ActivityLog`
+        """
+        if self.__activities__ is None:
+            self.__activities__ = ActivityLog(self.__uuid__, get_habit(self.__uuid__)["activities"])
+        return self.__activities__
 
     def perform(self, performed_at: Optional[str] = None):
         """
@@ -130,8 +218,61 @@ Has been performed {len(self.__activities__)} time{"" if len(self.__activities__
             should be in the format YYYY-mm-dd HH:MM:SS.
         :return: None
         """
-        Activity(self.__uuid__, performed_at)
-        self.__refresh__()
+        activity_log = self.__get_activity_log__()  # before the new activity exists, so it isn't loaded twice
+        performed_at_gmt = utils.format_date_for_db(performed_at) if performed_at is not None else None
+        activity_tuple = create_activity(self.__uuid__, performed_at_gmt)
+
+        # Slot the new activity into its place in the (sorted) log instead of reloading the whole habit.  Activities
+        # usually arrive in chronological order, so this is normally an append.
+        timestamp = activity_log.add(activity_tuple)
+        self.__streaks__.add(timestamp)
+        self.__periods__.add(timestamp)
+
+        self.__check_consistency__()
+
+    def perform_many(self, performed_at: Iterable[Union[str, datetime]], chunk_size: int = 1000):
+        """
+        Indicate that this habit has been performed many times, e.g. when importing a history of performances.  All the
+        performances are recorded in a single database transaction.  `performed_at` may be a generator, in which case
+        it is consumed `chunk_size` items at a time.
+        :param performed_at: The date/times at which the habit was performed.  These must be of the local timezone,
+            either as datetime objects or as strings in the format YYYY-mm-dd HH:MM:SS.
+        :param chunk_size: The number of performances to send to the database per batch
+        :return: The number of performances recorded
+        """
+        activity_log = self.__get_activity_log__()  # before the new activities exist, so they aren't loaded twice
+        performed_at_gmt = (
+            utils.format_date_for_db(dt) if isinstance(dt, str) else utils.format_datetime_for_db(dt)
+            for dt in performed_at
+        )
+
+        def add_chunk_to_model(activity_tuples: list[tuple]):
+            for timestamp in activity_log.extend(activity_tuples, sort=False):
+                self.__streaks__.add(timestamp)
+                self.__periods__.add(timestamp)
+
+        try:
+            num_created = create_activities_streamed(self.__uuid__, performed_at_gmt, chunk_size, add_chunk_to_model)
+        except BaseException:
+            # The database has rolled back every chunk, including those already added to this model, so reload it
+            self.__refresh__()
+            raise
+        activity_log.sort()
+        self.__check_consistency__()
+
+        return num_created
+
+    def __check_consistency__(self):
+        """
+        Cheap check that the activities of this model are in step with the database after it has added to them: if the
+        most recent performance in the database doesn't match ours, the habit has been changed elsewhere since this
+        model was loaded, so fall back to a full reload.
+        :return: None
+        """
+        db_last_timestamp = get_last_performed_at(self.__uuid__)
+        timestamps = self.__get_activity_log__().get_timestamps()
+        if db_last_timestamp != (timestamps[-1] if len(timestamps) > 0 else None):
+            self.__refresh__()
 
     def remove(self):
         """
@@ -147,62 +288,10 @@ Has been performed {len(self.__activities__)} time{"" if len(self.__activities__
         :return: A list of dictionary objects, where each object has the start date and end date of the streak, and
             the length of the streak
         """
-        # 1. Group the activities by period (day/week performed)
-        dict_activities_per_period = utils.group_activities_by_performance_period(
-            self.__activities__, self.__recurrence__)
-
-        # 2. Extract a list of the unique dates on which the habit was performed and make sure it's sorted in ascending
-        # order.
-        active_dates = sorted(dict_activities_per_period)
-
-        # 3. Now for the business of computing the streaks.
-        # `streaks`: Initially, this will just be a list of tuples like ("2023-12-01", "2023-12-04"), indicating when a
-        # streak started and ended
-        streaks = []
-        # `streak_start`: Holds onto a date and uses it as the reference point as we iterate through the subsequent
-        # dates to see if a streak is formed.  Once a streak breaks, `streak_start` will be replaced by the date that
-        # broke the streak and the cycle of comparisons will resume.  `streak_start` being None indicates that we are
-        # ready to start observing a new streak.
-        streak_start = None
-        # `streak_length` keeps count of how many unique periods (days/weeks) make up the streak
-        streak_length = 0
-        # `interval` is the number of days that make up the recurrence period
-        interval = 1 if self.__recurrence__ == "daily" else 7
-
-        for (idx, dt_string) in enumerate(active_dates):
-            curr_dt = utils.to_datetime(f"{dt_string} 00:00:00")
-
-            if (idx + 1) < len(active_dates):  # there is another date after this one
-                next_dt = utils.to_datetime(f"{active_dates[idx + 1]} 00:00:00")
-
-                if streak_start is None:  # we are not busy observing a streak
-                    streak_start = curr_dt  # so maybe this is the beginning of one; who knows!
-                    streak_length = 1
-
-                days_to_next_date = utils.get_num_days_from_to(streak_start, next_dt, False)
-                if days_to_next_date == streak_length * interval:
-                    # matches the expected days to get to the nth-following day/week, so increment streak length
-                    streak_length += 1
-                else:  # next date is beyond the nth-following day/week
-                    if streak_length > 1:  # and we were busy observing a streak, so this terminates it
-                        streaks.append((utils.to_date_only_string(streak_start), dt_string))
-
-                    # reset to indicate we are ready to observe a new streak
-                    streak_start = None
-                    streak_length = 0
-            else:  # no dates left to compare to
-                # if we were busy observing a streak, this terminates it
-                if streak_length > 1:
-                    streaks.append((utils.to_date_only_string(streak_start), dt_string))
-
-        streaks_detailed_list = list(map(
-            lambda streak: utils.get_streak_accurate_params(
-                dict_activities_per_period[streak[0]],
-                dict_activities_per_period[streak[1]],
-                self
-            ),
-            streaks
-        ))
+        streaks_detailed_list = [
+            streaks.get_run_params(run) for run in self.__streaks__.get_runs()
+            if streaks.get_run_length(run) > 1  # a single period on its own doesn't count as a streak
+        ]
 
         streaks_detailed_list.sort(key=lambda s: s["start"] if sort_by == "date" else s["length"],
                                    reverse=sort_order == "desc")
@@ -215,7 +304,7 @@ Has been performed {len(self.__activities__)} time{"" if len(self.__activities__
         :return: A dictionary object containing the accurate start and end dates of the streak, and the length of the
             streak.
         """
-        if len(self.__activities__) == 0:
+        if len(self.__streaks__) == 0:
             return {
                 "length": 0,
                 "start": None,
@@ -227,50 +316,15 @@ Has been performed {len(self.__activities__)} time{"" if len(self.__activities__
         if today is None:
             today = datetime.today()
 
-        activities_grouped_by_date = utils.group_activities_by_performance_period(self.__activities__,
-                                                                                  self.__recurrence__)
-        active_dates = sorted(activities_grouped_by_date, reverse=True)  # sort from most recent performance to oldest
-
-        if len(active_dates) > 1:
-            streak_end = active_dates[0]  # most recent performance date
-            streak_end_dt = utils.to_datetime(f"{streak_end} 00:00:00")
-            streak_start = None  # need to figure out when this streak started
-            streak_length = 1  # we definitely know it is at least 1 period long
-            interval = 1 if self.__recurrence__ == "daily" else 7  # number of days that make up one period
-            idx = 1  # start looking for the start of the streak from second date onwards
-            while idx < len(self.__activities__) and streak_start is None:
-                curr_dt = utils.to_datetime(f"{active_dates[idx]} 00:00:00")
-                # `diff` is the difference in days between the current date and the end of the streak
-                diff = utils.get_num_days_from_to(curr_dt, streak_end_dt, False)
-                # If `curr_dt` is the date we are expecting in order for the streak to continue...
-                if diff == interval * streak_length:
-                    streak_length += 1  # ... document that the streak indeed goes on
-                    if (idx + 1) == len(active_dates):
-                        # If we've reached the end of the list, then `curr_dt` is the start of the streak
-                        streak_start = active_dates[idx]
-                    else:
-                        # Otherwise, look at the next date to see if the streak includes it too
-                        idx += 1
-                else:
-                    # `curr_dt` has broken the streak, so the actual start of the start is the date that came before it
-                    streak_start = active_dates[idx - 1]
-        else:  # the only activities recorded happened within one period
-            streak_start = active_dates[0]
-            streak_end = active_dates[0]
-
-        streak_params = utils.get_streak_accurate_params(
-            activities_grouped_by_date[streak_start],
-            activities_grouped_by_date[streak_end],
-            self
-        )
+        latest_run = self.__streaks__.get_latest_run()
+        streak_params = streaks.get_run_params(latest_run)
 
-        # A date-only string for the start of the period that `today` belongs to, e.g. if we are looking at a weekly
-        # habit, the start of the period is the Monday of the week that `today` belongs to
-        today_period = utils.to_date_only_string(today) if self.__recurrence__ == "daily" \
-            else utils.to_date_only_string(utils.get_week_start_date(today))
+        # The ordinal of the period that `today` belongs to, e.g. if we are looking at a weekly habit, this is the week
+        # that `today` belongs to
+        today_period = utils.get_period_ordinal(today, self.__recurrence__)
 
-        today_is_part_of_streak = (today_period == active_dates[0])
-        today_could_increase_streak = (today_period == utils.add_interval(active_dates[0], self.__recurrence__, 1))
+        today_is_part_of_streak = (today_period == latest_run[1])
+        today_could_increase_streak = (today_period == latest_run[1] + 1)
 
         # A "current" streak is one that has either been continued in this period or could be extended in this period.
         streak_params["is_current"] = today_is_part_of_streak or today_could_increase_streak
@@ -278,6 +332,23 @@ Has been performed {len(self.__activities__)} time{"" if len(self.__activities__
 
         return streak_params
 
+    def get_longest_streak(self):
+        """
+        Find the run of consecutive periods (days/weeks) in which the habit was performed that lasted the longest.  If
+        there is more than one, the earliest of them is returned.
+        :return: A dictionary object containing the accurate start and end dates of the streak, and the length of the
+            streak (which is 0 if the habit was never performed)
+        """
+        longest_run = self.__streaks__.get_longest_run()
+        if longest_run is None:
+            return {
+                "length": 0,
+                "start": None,
+                "end": None,
+            }
+
+        return streaks.get_run_params(longest_run)
+
     def get_number_of_times_completed(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
         """
         Counts the number of unique periods in which the habit has been performed.  Note that performing the habit five
@@ -287,8 +358,9 @@ Has been performed {len(self.__activities__)} time{"" if len(self.__activities__
         last one.
         :return: The number of unique periods within the date range as described above, on which the habit was performed
         """
-        return len(utils.group_activities_by_performance_period(self.__activities__, self.__recurrence__, start_date,
-                                                                end_date))
+        return self.__periods__.count(lambda: self.__get_activity_log__().get_timestamps(),
+                                      start_date.timestamp() if start_date is not None else None,
+                                      end_date.timestamp() if end_date is not None else None)
 
     def get_completion_rate(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
         """
@@ -299,20 +371,36 @@ Has been performed {len(self.__activities__)} time{"" if len(self.__activities__
         :return: A dictionary object show how many periods performance of the habit were recorded on, the number of
             periods in the date range used for the calculation, and the completion rate
         """
+        return self.get_completion_rates([(start_date, end_date)])[0]
+
+    def get_completion_rates(self, date_ranges: list[tuple[Optional[datetime], Optional[datetime]]]):
+        """
+        Calculate the completion rate (see `get_completion_rate()`) over several date ranges at once, e.g. for the last
+        7 days, 30 days and 6 months.  Each one only costs a couple of binary searches.
+        :param date_ranges: A list of (start_date, end_date) tuples (local time), where either or both can be None as
+            for `get_completion_rate()`
+        :return: A list of dictionary objects like the one returned by `get_completion_rate()`, in the same order as the
+            date ranges
+        """
         get_num_periods_from_to = utils.get_num_days_from_to if self.__recurrence__ == "daily" \
             else utils.get_num_weeks_from_to
-        if start_date is None:
-            start_date = self.__created_at__
-        if end_date is None:
-            end_date = datetime.today()
-        num_total_periods = get_num_periods_from_to(start_date, end_date)
-        num_active_dates = self.get_number_of_times_completed(start_date, end_date)
-
-        return {
-            "num_active_periods": num_active_dates,
-            "num_total_periods": num_total_periods,
-            "rate": num_active_dates / num_total_periods
-        }
+        today = datetime.today()
+
+        rates = []
+        for (start_date, end_date) in date_ranges:
+            if start_date is None:
+                start_date = self.__created_at__
+            if end_date is None:
+                end_date = today
+            num_total_periods = get_num_periods_from_to(start_date, end_date)
+            num_active_dates = self.get_number_of_times_completed(start_date, end_date)
+            rates.append({
+                "num_active_periods": num_active_dates,
+                "num_total_periods": num_total_periods,
+                "rate": num_active_dates / num_total_periods
+            })
+
+        return rates
 
     @staticmethod
     def get_all_abridged():
@@ -1,11 +1,43 @@
-from modules import db
-from modules.cli.home import show_home_menu
+import argparse
+import sys
+from modules import db, batch
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Track your habits.  Run without a command to use the interactive "
+                                                 "app.")
+    parser.add_argument("--profile", action="store_true", help="Time the database queries, models and stats while the "
+                                                               "app runs, and print a report when it exits")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("backfill", help="Rebuild the per-day/week rollup of activities (e.g. after upgrading an "
+                                           "existing database)")
+    batch.add_commands(subparsers)
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    db.connect()
-    setup_required = db.setup_tables()
-    if setup_required:
-        db.populate_starter_data()
+    args = parse_args()
+    if args.profile:
+        from modules import instrumentation
+        instrumentation.enable()
+
+    try:
+        db.connect()
+        setup_required = db.setup_tables()
+        if setup_required:
+            db.populate_starter_data()
 
-    show_home_menu(True)
+        if args.command == "backfill":
+            num_rows = db.backfill_habit_periods()
+            print(f"Rolled up activities into {num_rows} habit period{'' if num_rows == 1 else 's'}")
+        elif args.command is not None:
+            batch.run(args)
+        else:
+            # Only the interactive app needs the menus (and `questionary`), so the other commands don't load them
+            from modules.cli.home import show_home_menu
+            show_home_menu(True)
+    except batch.CommandError as e:
+        sys.exit(f"Error: {e}")
+    finally:
+        if args.profile:
+            print(instrumentation.format_report(), file=sys.stderr)
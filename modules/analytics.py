@@ -1,33 +1,154 @@
+import os
+from collections import deque
+from itertools import islice
 from typing import Optional
 from datetime import datetime
-from modules import db
+from modules import db, utils
 from classes.habit import Habit
+from classes.activity_log import ActivityLog
 
 
-def get_habits(today: Optional[datetime] = None):
+# Below this many activities in total, the models engine always runs serially, as starting a pool of workers would
+# take longer than the stats themselves
+parallel_min_activities = 50_000
+
+# How many chunks to split the habits into per worker, so that a worker that gets a few big habits doesn't hold up the
+# others
+chunks_per_worker = 4
+
+
+def get_habits(today: Optional[datetime] = None, engine: str = "sql", executor: str = "serial",
+               max_workers: Optional[int] = None):
     """
     Fetch all the user's habits.
+    :param today: The date/time to compute the stats relative to (local time).  Defaults to now.
+    :param engine: How to compute the stats: "sql" (the default) has the database do the work, storing the results
+        until the habit changes, and only fetches one row per habit, while "models" loads every habit with all its
+        activities into `Habit` models.  The two give the same results; the "models" engine is kept as a reference for
+        checking the "sql" one.
+    :param executor: How the "models" engine spreads the work across habits: "serial", "thread" or "process" (see
+        `get_habits_from_models()`)
+    :param max_workers: The number of threads/processes to use (defaults to the number of CPUs)
     :return: A list of dictionary objects containing various properties of the user's habits.
     """
     if today is None:  # don't set as default value in constructor because only gets computed once, it seems
         today = datetime.today()
 
-    all_habits = db.get_all_habits()
+    if engine == "sql":
+        return get_habits_from_sql(today)
+    elif engine == "models":
+        return get_habits_from_models(today, executor, max_workers)
+
+    raise ValueError(f"Unknown stats engine: {engine}")
+
+
+def get_habits_from_sql(today: datetime):
+    """
+    Compute the stats of all the user's habits inside the database, serving them from the stored stats where those are
+    still up to date (see `db.get_materialized_habit_stats()`).
+    :param today: The date/time to compute the stats relative to (local time)
+    :return: A list of dictionary objects, as for `get_habits()`
+    """
+    habit_stats = db.get_materialized_habit_stats(utils.format_datetime_for_db(today), today.toordinal(),
+                                                  utils.get_local_timezone_key())
 
-    def compute_properties(h: dict[str, tuple]):
-        habit = Habit(h)
+    def compute_properties(row: tuple):
+        (_, title, recurrence, created_at, last_performed_at, num_periods_performed,
+         num_periods_performed_since_creation, num_total_periods, latest_streak) = row
 
         return {
-            "title": habit.get_title(),
-            "created_at": habit.get_created_at(),
-            "recurrence": habit.get_recurrence(),
-            "last_performed": habit.get_date_last_performed(),
-            "num_periods_performed": habit.get_number_of_times_completed(end_date=today),
-            "completion_rate": round(100 * habit.get_completion_rate(end_date=today)["rate"]),
-            "latest_streak": habit.get_latest_streak(today)["length"],
+            "title": title,
+            "created_at": utils.to_datetime(created_at, True),
+            "recurrence": recurrence,
+            "last_performed": utils.to_datetime(last_performed_at, True) if last_performed_at is not None else None,
+            "num_periods_performed": num_periods_performed,
+            "completion_rate": round(100 * num_periods_performed_since_creation / num_total_periods),
+            "latest_streak": latest_streak,
         }
 
-    return list(map(compute_properties, all_habits))
+    return list(map(compute_properties, habit_stats))
+
+
+def get_habits_from_models(today: datetime, executor: str = "serial", max_workers: Optional[int] = None):
+    """
+    Compute the stats of all the user's habits by loading them (and all their activities) as `Habit` models.  Habits
+    are streamed from the database one at a time (see `db.iter_habits_with_activities()`), so only one habit's
+    activities need to be held at once.  The habits can also be split into chunks that are worked on in a pool of
+    threads or processes.  Each chunk carries the habits' activities as compact columns (an array of timestamps and the
+    packed uuids) rather than `Activity` models, so that they are cheap to send to another process, and only a couple of
+    chunks per worker are in flight at a time.
+    :param today: The date/time to compute the stats relative to (local time)
+    :param executor: "serial", "thread" or "process".  If there are fewer than `parallel_min_activities` activities,
+        the stats are always computed serially.
+    :param max_workers: The number of threads/processes to use (defaults to the number of CPUs)
+    :return: A list of dictionary objects, as for `get_habits()`
+    """
+    if executor not in ("serial", "thread", "process"):
+        raise ValueError(f"Unknown executor: {executor}")
+
+    payloads = (
+        (h["habit"], *ActivityLog(h["habit"][0], h["activities"]).get_columns())
+        for h in db.iter_habits_with_activities()
+    )
+    (num_habits, num_activities) = db.count_habits_and_activities()
+
+    if executor == "serial" or num_activities < parallel_min_activities:
+        return [compute_properties(payload, today) for payload in payloads]
+
+    num_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    chunk_size = max(1, -(-num_habits // (chunks_per_worker * num_workers)))  # i.e. rounded up
+
+    # Not imported at the top, as loading the process pool (and `multiprocessing` with it) slows down every start-up
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    all_properties = []
+    pool_class = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+    with pool_class(num_workers) as pool:
+        in_flight = deque()
+        while True:
+            chunk = list(islice(payloads, chunk_size))
+            if len(chunk) > 0:
+                in_flight.append(pool.submit(compute_properties_of_chunk, chunk, today))
+            # Collect results in order, waiting for the oldest chunk whenever enough are queued up
+            while len(in_flight) > 0 and (len(chunk) == 0 or len(in_flight) >= 2 * num_workers):
+                all_properties.extend(in_flight.popleft().result())
+            if len(chunk) == 0:
+                break
+
+    return all_properties
+
+
+def compute_properties_of_chunk(payloads: list[tuple], today: datetime):
+    """
+    Compute the stats of a chunk of habits.  This runs in the worker threads/processes of `get_habits_from_models()`,
+    so it is a module-level function (which processes can find by name).
+    :param payloads: A list of tuples, each containing a habit's record from the `habits` database table followed by
+        the columns of its activities (see `ActivityLog.get_columns()`)
+    :param today: The date/time to compute the stats relative to (local time)
+    :return: A list of dictionary objects, as for `get_habits()`, in the same order as `payloads`
+    """
+    return [compute_properties(payload, today) for payload in payloads]
+
+
+def compute_properties(payload: tuple, today: datetime):
+    """
+    Compute the stats of one habit.
+    :param payload: A tuple containing the habit's record from the `habits` database table followed by the columns of
+        its activities (see `ActivityLog.get_columns()`)
+    :param today: The date/time to compute the stats relative to (local time)
+    :return: A dictionary object containing various properties of the habit
+    """
+    habit = Habit.from_columns(*payload)
+
+    return {
+        "title": habit.get_title(),
+        "created_at": habit.get_created_at(),
+        "recurrence": habit.get_recurrence(),
+        "last_performed": habit.get_date_last_performed(),
+        "num_periods_performed": habit.get_number_of_times_completed(end_date=today),
+        "completion_rate": round(100 * habit.get_completion_rate(end_date=today)["rate"]),
+        "latest_streak": habit.get_latest_streak(today)["length"],
+    }
 
 
 def sort_habits(habits: list[dict], sort_field: str, order: str):
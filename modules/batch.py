@@ -0,0 +1,204 @@
+"""
+The non-interactive commands of `main.py`, for scripts and cron jobs: they take everything they need from the command
+line (and stdin), print machine-readable output and never prompt, so none of the interactive menus (or `questionary`)
+are loaded.  Each command is a function that takes the parsed arguments and an output stream.
+
+ - perform <habit> [--at DATETIME ...]: record performances of a habit (`--at -` reads one date/time per line from
+   stdin, so that thousands can be recorded in a single transaction)
+ - import <file>: add the habits and activities in a CSV file written by `export` to the database
+ - stats [--format json|csv]: the stats of all the habits, as shown by the stats menu
+ - streaks <habit>: a habit's streaks, latest streak and longest streak, as JSON
+ - export [--output FILE]: all the habits and their activities, as CSV
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from itertools import chain
+from typing import Iterator, TextIO
+
+from classes.habit import Habit
+from modules import analytics, db
+
+# The columns of the CSV files written by `export` and read by `import`: one row per activity, with the habit's details
+# repeated on each, and one row with empty activity columns for each habit that has no activities.  Datetimes are GMT
+# strings in the format YYYY-mm-dd HH:MM:SS, as in the database.
+export_columns = ("habit_uuid", "title", "recurrence", "created_at", "activity_uuid", "performed_at")
+
+# The order of the columns of `stats --format csv`, i.e. the properties returned by `analytics.get_habits()`
+stats_columns = ("title", "created_at", "recurrence", "last_performed", "num_periods_performed", "completion_rate",
+                 "latest_streak")
+
+
+class CommandError(Exception):
+    """
+    Raised when a command can't be carried out because of what it was given, e.g. a habit that doesn't exist.  The
+    message is meant for the user.
+    """
+    pass
+
+
+def add_commands(subparsers):
+    """
+    Add the commands in this module to the command-line parser of `main.py`.
+    :param subparsers: The parser's subparsers (from `add_subparsers()`)
+    :return: None
+    """
+    perform_parser = subparsers.add_parser("perform", help="Record that a habit was performed")
+    perform_parser.add_argument("habit", help="the uuid or title of the habit")
+    perform_parser.add_argument("--at", action="append", metavar="DATETIME",
+                                help="when it was performed (local time, YYYY-mm-dd HH:MM:SS; defaults to now).  Can "
+                                     "be given more than once, or as '-' to read one date/time per line from stdin")
+    perform_parser.set_defaults(run=perform)
+
+    import_parser = subparsers.add_parser("import", help="Add the habits and activities in a CSV file (as written by "
+                                                         "export) to the database")
+    import_parser.add_argument("file")
+    import_parser.set_defaults(run=import_file)
+
+    stats_parser = subparsers.add_parser("stats", help="Print the stats of all the habits")
+    stats_parser.add_argument("--format", choices=("json", "csv"), default="json")
+    stats_parser.set_defaults(run=stats)
+
+    streaks_parser = subparsers.add_parser("streaks", help="Print the streaks of a habit, as JSON")
+    streaks_parser.add_argument("habit", help="the uuid or title of the habit")
+    streaks_parser.set_defaults(run=habit_streaks)
+
+    export_parser = subparsers.add_parser("export", help="Write all the habits and their activities as CSV")
+    export_parser.add_argument("--output", help="the file to write to (defaults to stdout)")
+    export_parser.set_defaults(run=export)
+
+
+def run(args: argparse.Namespace, out: TextIO = sys.stdout):
+    """
+    Run the command chosen on the command line (see `add_commands()`).
+    :param args: The parsed command-line arguments
+    :param out: Where to print the command's output
+    :return: None
+    """
+    args.run(args, out)
+
+
+def find_habit_uuid(uuid_or_title: str):
+    """
+    :param uuid_or_title: The uuid or title of a habit, as given on the command line
+    :return: The habit's uuid
+    """
+    uuids = db.find_habits(uuid_or_title)
+    if uuid_or_title in uuids:  # a uuid wins over a title that happens to look like it
+        return uuid_or_title
+    if len(uuids) == 0:
+        raise CommandError(f"No habit has the uuid or title '{uuid_or_title}'")
+    if len(uuids) > 1:
+        raise CommandError(f"{len(uuids)} habits are called '{uuid_or_title}'; give the uuid of the one you mean")
+    return uuids[0]
+
+
+def format_value(value):
+    """
+    :return: The value as it is printed by the commands: datetimes (which are local) in the format YYYY-mm-dd HH:MM:SS
+    """
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def perform(args: argparse.Namespace, out: TextIO):
+    habit = Habit(find_habit_uuid(args.habit))
+
+    if args.at is None:
+        habit.perform()
+        print(f"Performed '{habit.get_title()}' 1 time", file=out)
+        return
+
+    performed_at = chain.from_iterable(
+        (line.strip() for line in sys.stdin if line.strip() != "") if dt == "-" else (dt, ) for dt in args.at
+    )
+    try:
+        num_created = habit.perform_many(performed_at)
+    except ValueError as e:  # a date/time in the wrong format, in which case none of them are recorded
+        raise CommandError(f"Invalid date/time ({e})")
+    print(f"Performed '{habit.get_title()}' {num_created} time{'' if num_created == 1 else 's'}", file=out)
+
+
+def import_file(args: argparse.Namespace, out: TextIO):
+    def read_rows() -> Iterator[list[str]]:
+        try:
+            file = open(args.file, newline="")
+        except OSError as e:  # e.g. it doesn't exist
+            raise CommandError(f"Couldn't open {args.file} ({e.strerror})")
+        with file:
+            reader = csv.reader(file)
+            if tuple(next(reader, ())) != export_columns:
+                raise CommandError(f"{args.file} doesn't start with the header written by export: "
+                                   f"{','.join(export_columns)}")
+            for row in reader:
+                if len(row) != len(export_columns):
+                    raise CommandError(f"Line {reader.line_num} of {args.file} has {len(row)} columns instead of "
+                                       f"{len(export_columns)}")
+                yield row
+
+    # The file is read twice: once for the habits, which have to go in first, and once to stream the activities.
+    # Habits and activities that are already in the database (e.g. from an earlier import of the same file) are skipped.
+    habits = {}
+    for row in read_rows():
+        habits.setdefault(row[0], tuple(row[:4]))
+    activities = ((row[4], row[0], row[5]) for row in read_rows() if row[4] != "")
+
+    try:
+        (num_habits, num_activities) = db.import_dataset(list(habits.values()), activities, skip_existing=True)
+    except (sqlite3.IntegrityError, ValueError) as e:
+        # E.g. an unknown recurrence, a date/time in the wrong format or an activity uuid that isn't a UUID
+        raise CommandError(f"Couldn't import {args.file}, so nothing was imported ({e})")
+    print(f"Imported {num_habits} habits and {num_activities} activities from {args.file}", file=out)
+
+
+def stats(args: argparse.Namespace, out: TextIO):
+    habits = [{key: format_value(habit[key]) for key in stats_columns} for habit in analytics.get_habits()]
+
+    if args.format == "csv":
+        writer = csv.DictWriter(out, stats_columns, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(habits)
+    else:
+        json.dump(habits, out, indent=2)
+        print(file=out)
+
+
+def habit_streaks(args: argparse.Namespace, out: TextIO):
+    # Streaks only need the rollup of the habit's activities, not the activities themselves
+    habit = Habit.load_from_rollup(find_habit_uuid(args.habit))
+
+    def format_streak(streak: dict):
+        return {key: format_value(value) for (key, value) in streak.items()}
+
+    json.dump({
+        "uuid": habit.get_uuid(),
+        "title": habit.get_title(),
+        "recurrence": habit.get_recurrence(),
+        "latest": format_streak(habit.get_latest_streak()),
+        "longest": format_streak(habit.get_longest_streak()),
+        "streaks": [format_streak(streak) for streak in habit.get_all_streaks()],
+    }, out, indent=2)
+    print(file=out)
+
+
+def export(args: argparse.Namespace, out: TextIO):
+    file = open(args.output, "w", newline="") if args.output is not None else out
+    try:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(export_columns)
+        for db_item in db.iter_habits_with_activities():
+            habit_tuple = db_item["habit"]
+            if len(db_item["activities"]) == 0:
+                writer.writerow((*habit_tuple, "", ""))
+            writer.writerows(
+                (*habit_tuple, uuid, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(performed_at)))
+                for (uuid, _, performed_at) in db_item["activities"]
+            )
+    finally:
+        if file is not out:
+            file.close()
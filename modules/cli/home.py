@@ -1,9 +1,6 @@
 import questionary
 
 from modules.cli.utils import create_choices, close_app, print_menu_title, print_greeting
-from modules.cli.create_habit import show_create_habit_menu
-from modules.cli.view_habit_detail import show_habits_abridged
-from modules.cli.view_stats import show_stats_menu
 
 
 def show_home_menu(starting_up=False):
@@ -23,11 +20,15 @@ def show_home_menu(starting_up=False):
         ("exit", "Exit"),
     ])).ask()
 
+    # Each menu is only imported once the user asks for it, so that the home menu comes up as quickly as possible
     if action == "create":
+        from modules.cli.create_habit import show_create_habit_menu
         show_create_habit_menu(show_home_menu)
     elif action == "show_one":
+        from modules.cli.view_habit_detail import show_habits_abridged
         show_habits_abridged(show_home_menu)
     elif action == "stats":
+        from modules.cli.view_stats import show_stats_menu
         show_stats_menu(show_home_menu)
     elif action == "exit":
         close_app()
@@ -1,6 +1,5 @@
 import questionary
 from typing import Optional, Callable
-from tabulate import tabulate
 from datetime import datetime
 
 from modules.utils import get_last_month_date_range, get_last_week_date_range, get_last_6_months_date_range, \
@@ -37,7 +36,7 @@ def show_habits_abridged(show_home_menu_fn: Optional[Callable] = None):
         close_app()
     else:
         habit_uuid = action
-        habit = Habit(habit_uuid)
+        habit = Habit.load_from_rollup(habit_uuid)
         show_habit_actions_menu(habit)
 
 
@@ -107,6 +106,8 @@ def show_streaks_menu(habit: Habit):
     if len(streaks) == 0:
         questionary.print("Sorry for all that hassle, but you haven't achieved any streaks yet 🥺")
     else:
+        from tabulate import tabulate  # only needed here, so not loaded until it is
+
         streaks_table = list(map(lambda streak: [
             streak["length"],
             prettify_datetime(streak["start"]),
@@ -1,6 +1,5 @@
 import questionary
 from typing import Optional, Callable
-from tabulate import tabulate
 from datetime import datetime
 
 from modules.cli.utils import create_choices, close_app, print_menu_title
@@ -240,6 +239,8 @@ def show_stats_menu(show_home_menu_fn: Callable):
         if menu_subtitle is not None:
             questionary.print(menu_subtitle, style="italic bg:darkmagenta fg:gainsboro")
 
+        from tabulate import tabulate  # only needed here, so not loaded until it is
+
         print(tabulate(map(
             lambda h: [
                 prettify_datetime(value, True) if isinstance(value, datetime)
@@ -0,0 +1,90 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, Optional, Sequence
+
+from modules import utils
+
+
+class PeriodIndex:
+    """
+    The distinct periods (days/weeks) in which a habit was performed, in ascending order, along with the first and last
+    performance in each period.  Since the periods don't overlap, the first and last performances are in ascending order
+    too, so the number of periods in which the habit was performed within any date range can be found with two binary
+    searches rather than by going through every activity.
+    """
+    __slots__ = ("__recurrence__", "__periods__", "__first_timestamps__", "__last_timestamps__")
+
+    def __init__(self, habit_recurrence: str, timestamps: Sequence[int] = ()):
+        """
+        :param habit_recurrence: i.e. "daily" or "weekly"
+        :param timestamps: When the habit has been performed so far, as POSIX timestamps sorted in ascending order
+        """
+        self.__load__(habit_recurrence, utils.group_timestamps_by_performance_period(timestamps, habit_recurrence))
+
+    @classmethod
+    def from_active_periods(cls, habit_recurrence: str, active_periods: Sequence[tuple[int, int, int]]):
+        """
+        Create the index from the periods the habit was performed in, e.g. as stored in the `habit_periods` table.
+        :param habit_recurrence: i.e. "daily" or "weekly"
+        :param active_periods: The periods in which the habit was performed, in ascending order, as returned by
+            `utils.group_timestamps_by_performance_period()`
+        :return: The new `PeriodIndex`
+        """
+        index = cls.__new__(cls)
+        index.__load__(habit_recurrence, active_periods)
+        return index
+
+    def __load__(self, habit_recurrence: str, active_periods: Sequence[tuple[int, int, int]]):
+        self.__recurrence__ = habit_recurrence
+        self.__periods__ = array("q", (period[0] for period in active_periods))
+        self.__first_timestamps__ = array("q", (period[1] for period in active_periods))
+        self.__last_timestamps__ = array("q", (period[2] for period in active_periods))
+
+    def __len__(self):
+        return len(self.__periods__)
+
+    def add(self, timestamp: int):
+        """
+        Record another performance of the habit.  This is an append (O(1) amortised) unless the performance is
+        back-dated, in which case the new period is inserted in its place.
+        :param timestamp: When the habit was performed, as a POSIX timestamp
+        :return: None
+        """
+        period = utils.get_performance_period(timestamp, self.__recurrence__)
+        idx = bisect_left(self.__periods__, period)
+
+        if idx < len(self.__periods__) and self.__periods__[idx] == period:  # already performed in this period
+            self.__first_timestamps__[idx] = min(self.__first_timestamps__[idx], timestamp)
+            self.__last_timestamps__[idx] = max(self.__last_timestamps__[idx], timestamp)
+        else:
+            self.__periods__.insert(idx, period)
+            self.__first_timestamps__.insert(idx, timestamp)
+            self.__last_timestamps__.insert(idx, timestamp)
+
+    def count(self, get_timestamps: Callable[[], Sequence[int]], start: Optional[float] = None,
+              end: Optional[float] = None):
+        """
+        Count the periods in which the habit was performed between two points in time.
+        :param get_timestamps: A function returning when the habit was performed, as POSIX timestamps sorted in
+            ascending order.  This is only called in the one case that the periods alone can't settle (see below), so
+            the timestamps can be loaded lazily.
+        :param start: Only count performances from this POSIX timestamp onwards
+        :param end: Only count performances up to and including this POSIX timestamp
+        :return: The number of unique periods with at least one performance between `start` and `end`
+        """
+        # The periods whose last performance is no earlier than `start` and whose first performance is no later than
+        # `end`
+        lo = 0 if start is None else bisect_left(self.__last_timestamps__, start)
+        hi = len(self.__periods__) if end is None else bisect_right(self.__first_timestamps__, end)
+        if hi - lo != 1:
+            return max(0, hi - lo)
+
+        # Each such period has a performance between `start` and `end` (its first or its last one), unless the whole
+        # date range falls between two performances of the same period.  Only one period can span the date range like
+        # that, and it is then the only candidate, so it's checked against the activities themselves.
+        if start is None or end is None:
+            return 1
+        if self.__first_timestamps__[lo] >= start or self.__last_timestamps__[lo] <= end:
+            return 1
+        timestamps = get_timestamps()
+        return 1 if bisect_left(timestamps, start) < bisect_right(timestamps, end) else 0
@@ -0,0 +1,160 @@
+import queue
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Optional
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when a thread waits too long for a connection because all of the pool's connections are in use
+    """
+    pass
+
+
+class ConnectionPool:
+    """
+    A pool of connections to one SQLite database, where each thread gets a connection of its own.  SQLite connections
+    can't safely be used by two threads at once, so rather than sharing one connection, a thread checks a connection out
+    of the pool the first time it needs one and keeps it until it releases it (or the thread ends).  No more than `size`
+    connections are open at once; a thread that needs one when they're all checked out waits for one to be returned.
+    """
+    __slots__ = ("__db_name__", "__size__", "__timeout__", "__idle__", "__available__", "__local__", "__connections__",
+                 "__lock__", "__on_connect__")
+
+    def __init__(self, db_name: str, size: int = 5, timeout: Optional[float] = None, on_connect=None):
+        """
+        :param db_name: The file name of the SQLite database.  Every connection to ":memory:" is a separate database,
+            so an in-memory database should only be used with a pool of size 1.
+        :param size: The maximum number of connections to have open at once
+        :param timeout: How many seconds a thread waits for a connection before giving up with `PoolTimeout` (by
+            default it waits for as long as it takes)
+        :param on_connect: A function that is given each new connection, e.g. to configure it
+        """
+        if size < 1:
+            raise ValueError("A connection pool needs room for at least one connection")
+
+        self.__db_name__ = db_name
+        self.__size__ = size
+        self.__timeout__ = timeout
+        self.__on_connect__ = on_connect
+        self.__idle__ = queue.LifoQueue()  # the most recently used connection is the one most likely to be cached
+        self.__available__ = threading.BoundedSemaphore(size)
+        self.__local__ = threading.local()
+        self.__connections__ = []
+        self.__lock__ = threading.Lock()
+
+    def get_db_name(self):
+        return self.__db_name__
+
+    def get_size(self):
+        return self.__size__
+
+    def get_connections(self):
+        """
+        :return: A list of all the pool's open connections, whether they are checked out or not
+        """
+        with self.__lock__:
+            return list(self.__connections__)
+
+    def get_connection(self):
+        """
+        :return: The calling thread's connection, checking one out of the pool if the thread doesn't have one yet
+        """
+        checkout = getattr(self.__local__, "checkout", None)
+        if checkout is None:
+            checkout = self.__checkout__()
+            self.__local__.checkout = checkout
+        return checkout.connection
+
+    def release_connection(self):
+        """
+        Return the calling thread's connection to the pool (if it has one), so that another thread can use it.  Any
+        transaction the thread left open is rolled back first.
+        :return: None
+        """
+        checkout = getattr(self.__local__, "checkout", None)
+        if checkout is not None:
+            del self.__local__.checkout
+            checkout.finalizer()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block of statements in a single transaction on the calling thread's connection, e.g.
+            with pool.transaction() as connection:
+                connection.execute(...)
+        The transaction is committed if the block completes and rolled back if it raises (including on
+        `KeyboardInterrupt`).  If the thread is already in a transaction, the block simply becomes part of it.
+        :return: A context manager that gives the connection
+        """
+        connection = self.get_connection()
+        if connection.in_transaction:
+            yield connection
+            return
+
+        connection.execute("BEGIN")
+        try:
+            yield connection
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def close(self):
+        """
+        Close all the pool's connections, including those still checked out by other threads.  The pool can still be
+        used afterwards, in which case it opens new connections.
+        :return: None
+        """
+        with self.__lock__:
+            connections = self.__connections__
+            self.__connections__ = []
+            self.__idle__ = queue.LifoQueue()
+            self.__available__ = threading.BoundedSemaphore(self.__size__)
+            self.__local__ = threading.local()
+
+        for connection in connections:
+            connection.close()
+
+    def __checkout__(self):
+        if not self.__available__.acquire(timeout=self.__timeout__):
+            raise PoolTimeout(f"No connection to {self.__db_name__} became free within {self.__timeout__} seconds")
+
+        try:
+            connection = self.__idle__.get_nowait()
+        except queue.Empty:
+            # Connections are handed from thread to thread, but only ever used by one thread at a time
+            connection = sqlite3.connect(self.__db_name__, check_same_thread=False)
+            if self.__on_connect__ is not None:
+                self.__on_connect__(connection)
+            with self.__lock__:
+                self.__connections__.append(connection)
+
+        checkout = Checkout(connection)
+        # Runs on `release_connection()`, or when the thread ends and its thread-local data is discarded
+        checkout.finalizer = weakref.finalize(checkout, self.__checkin__, connection, self.__idle__,
+                                              self.__available__)
+        return checkout
+
+    @staticmethod
+    def __checkin__(connection: sqlite3.Connection, idle: queue.LifoQueue, available: threading.BoundedSemaphore):
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            idle.put(connection)
+        except sqlite3.ProgrammingError:  # the connection was closed along with the pool
+            return
+        available.release()
+
+
+class Checkout:
+    """
+    A connection checked out of a `ConnectionPool` by one thread
+    """
+    __slots__ = ("connection", "finalizer", "__weakref__")
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.finalizer = None
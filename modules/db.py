@@ -1,33 +1,406 @@
+import json
 import sqlite3
-from typing import Optional, Union
+import sys
+from itertools import chain, groupby, islice
+from typing import Optional, Union, Iterable, Iterator, Callable
 
-from modules import example_data
-from modules.utils import make_uuid
+from modules.connection_pool import ConnectionPool
+from modules.utils import make_uuid, normalise_uuid, get_local_timezone_key, to_timestamp, to_timestamps
 
-# global database connection for the application
-db_connection = None
+# The pool of connections to the application's database, which all the functions below use (see `connect()`)
+default_pool: Optional[ConnectionPool] = None
 
+# The maximum number of connections the default pool has open at once, i.e. the number of threads that can use the
+# database at the same time
+default_pool_size = 5
 
-def connect(db_name="main.db"):
-    global db_connection
-    db_connection = sqlite3.connect(db_name)
+# Named sets of PRAGMA settings that every connection is configured with (see `connect()`).  All of them use
+# write-ahead logging, so that readers don't block the writer and vice versa.  They differ in how much they trade
+# safety for speed:
+# * "durable": every commit is synced to disk, so a committed write survives even a power cut
+# * "balanced": commits are only synced at WAL checkpoints, which can lose the last few commits on a power cut (but
+#   never corrupts the database), and caches more of the database in memory
+# * "bulk-import": doesn't sync at all and uses large caches, for loading lots of data that can be reloaded if the
+#   machine goes down midway
+pragma_profiles = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -16_000,  # negative sizes are in KiB, i.e. 16 MB
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5_000,  # milliseconds to wait for a lock held by another connection
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64_000,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5_000,
+    },
+    "bulk-import": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "mmap_size": 1024 * 1024 * 1024,
+        "cache_size": -256_000,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30_000,
+    },
+}
+
+# The profile `connect()` uses unless told otherwise
+default_pragma_profile = "balanced"
+
+# The tables that make up the base schema, i.e. the schema that `setup_tables()` creates and that the migrations below
+# build on top of
+base_tables = ("habits", "activities", "recurrence_types")
+
+# The columns of a habit's record, as returned by the functions below (the integer `id` stays inside the database)
+habit_columns_sql = "habits.uuid, habits.title, habits.recurrence, habits.created_at"
+
+# The local day a GMT datetime column falls on, as an ordinal that matches Python's `date.toordinal()` (the Julian day
+# number of 1 January of year 1 is 1721425.5, and that is day 1).  This is how the queries below group activities into
+# days/weeks, in the same way as `utils.get_period_ordinal()`.
+local_day_ordinal_sql = "CAST(julianday({column}, 'localtime', 'start of day') - 1721424.5 AS INTEGER)"
+
+# The local day/week a GMT datetime column falls in, given the habit's recurrence, as for `utils.get_period_ordinal()`
+local_period_ordinal_sql = "CASE {recurrence} WHEN 'daily' THEN {day} ELSE ({day} - 1) / 7 END"
+
+
+def get_local_period_ordinal_sql(column: str, recurrence_column: str):
+    """
+    :param column: A GMT datetime column (or other SQL expression)
+    :param recurrence_column: The column holding the recurrence of the habit the datetime belongs to
+    :return: An SQL expression for the ordinal of the local day/week that the datetime falls in
+    """
+    return local_period_ordinal_sql.format(recurrence=recurrence_column,
+                                           day=local_day_ordinal_sql.format(column=column))
+
+
+# A GMT datetime string as a POSIX timestamp, and back again.  The times of activities are stored as timestamps (see
+# migration 5), while the other datetime columns are GMT datetime strings.
+timestamp_sql = "CAST(strftime('%s', {column}) AS INTEGER)"
+gmt_datetime_sql = "datetime({column}, 'unixepoch')"
+
+# Keeps `habit_periods` up to date as activities are added, as created by migrations 3 and 4 (migration 5 replaces it
+# to suit the new `activities` table)
+roll_up_trigger_sql = f"""
+    CREATE TRIGGER IF NOT EXISTS trg_activities_roll_up_into_habit_periods
+    AFTER INSERT ON activities
+    BEGIN
+        INSERT INTO habit_periods(habit, period_ordinal, count, first_at, last_at)
+        SELECT NEW.habit, {get_local_period_ordinal_sql("NEW.performed_at", "habits.recurrence")}, 1,
+            NEW.performed_at, NEW.performed_at
+        FROM habits
+        WHERE habits.uuid = NEW.habit
+        ON CONFLICT (habit, period_ordinal) DO UPDATE SET
+            count = count + 1,
+            first_at = MIN(first_at, excluded.first_at),
+            last_at = MAX(last_at, excluded.last_at);
+    END
+"""
+
+
+# Schema changes made after the base schema was first released.  Each migration is a tuple containing a version number,
+# a short description and the list of SQL statements that make up the change.  Migrations are applied in order of
+# version, exactly once per database, and the versions that have been applied are recorded in the `schema_version`
+# table.  To change the schema, append a new migration here rather than editing `setup_tables()` or an existing
+# migration.
+migrations = [
+    (1, "Index activities by parent habit and performance time", [
+        # Serves `get_habit()` (filter by habit, ordered by performed_at), `delete_habit()` and the ordered scan in
+        # `get_all_habits()`.  Including `uuid` makes it a covering index, so those queries never touch the table.
+        """
+        CREATE INDEX IF NOT EXISTS idx_activities_habit_performed_at
+            ON activities(habit, performed_at, uuid)
+        """,
+    ]),
+    (2, "Store each habit's stats so they don't have to be recomputed on every view", [
+        # One row per habit and local timezone (which decides the days/weeks that activities fall into), holding the
+        # stats computed over all the habit's activities (see `get_materialized_habit_stats()`).  Writes to a habit's
+        # activities delete its rows, and they are recomputed the next time the stats are asked for.  A habit without a
+        # row is simply one whose stats haven't been computed yet.
+        """
+        CREATE TABLE IF NOT EXISTS habit_stats(
+            habit TEXT NOT NULL,
+            timezone TEXT NOT NULL,
+            last_performed_at TEXT,
+            num_periods_performed INTEGER NOT NULL,
+            num_periods_performed_since_creation INTEGER NOT NULL,
+            latest_streak INTEGER NOT NULL,
+            PRIMARY KEY (habit, timezone),
+            FOREIGN KEY (habit)
+                REFERENCES habits(uuid)
+        )
+        """,
+    ]),
+    (3, "Roll up activities per habit and day/week", [
+        # How many times each habit was performed in each day/week (for daily/weekly habits), along with the first and
+        # last performance in the period (in GMT).  The streak and completion calculations only need this, so reading it
+        # costs one row per active period instead of one per activity.  The trigger below keeps it up to date as
+        # activities are added, and `delete_habit()` removes a habit's rows (activities are only ever deleted along with
+        # their habit).  Periods are local days/weeks, so the rows are only valid for the timezone recorded in
+        # `settings` (see `ensure_habit_periods_timezone()`), and the table is filled by `backfill_habit_periods()`.
+        """
+        CREATE TABLE IF NOT EXISTS habit_periods(
+            habit TEXT NOT NULL,
+            period_ordinal INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            first_at TEXT NOT NULL,
+            last_at TEXT NOT NULL,
+            PRIMARY KEY (habit, period_ordinal),
+            FOREIGN KEY (habit)
+                REFERENCES habits(uuid)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS settings(
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """,
+        roll_up_trigger_sql,
+    ]),
+    (4, "Delete a habit's activities, stats and rollup along with the habit", [
+        # SQLite can't add a foreign key action to an existing table, so each table that references `habits` is rebuilt
+        # with `ON DELETE CASCADE`, and deleting a habit (with `PRAGMA foreign_keys = ON`, which every connection sets)
+        # deletes its rows through their indexes on `habit`, in the same statement.  Rows of habits that were deleted
+        # before now can't be copied over (they would break the foreign key), and nothing could reach them anyway.
+        # Since the foreign key on `habits.recurrence` is now enforced too, the recurrence types are made sure of here.
+        """
+        INSERT OR IGNORE INTO recurrence_types VALUES('daily'), ('weekly')
+        """,
+        # The rollup trigger refers to `habit_periods`, so it has to be out of the way while that table is swapped
+        "DROP TRIGGER trg_activities_roll_up_into_habit_periods",
+        # The stored stats are only a cache, so they are simply recomputed
+        "DROP TABLE habit_stats",
+        """
+        CREATE TABLE habit_stats(
+            habit TEXT NOT NULL,
+            timezone TEXT NOT NULL,
+            last_performed_at TEXT,
+            num_periods_performed INTEGER NOT NULL,
+            num_periods_performed_since_creation INTEGER NOT NULL,
+            latest_streak INTEGER NOT NULL,
+            PRIMARY KEY (habit, timezone),
+            FOREIGN KEY (habit)
+                REFERENCES habits(uuid)
+                ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE habit_periods_new(
+            habit TEXT NOT NULL,
+            period_ordinal INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            first_at TEXT NOT NULL,
+            last_at TEXT NOT NULL,
+            PRIMARY KEY (habit, period_ordinal),
+            FOREIGN KEY (habit)
+                REFERENCES habits(uuid)
+                ON DELETE CASCADE
+        )
+        """,
+        """
+        INSERT INTO habit_periods_new
+        SELECT * FROM habit_periods WHERE habit IN (SELECT uuid FROM habits)
+        """,
+        "DROP TABLE habit_periods",
+        "ALTER TABLE habit_periods_new RENAME TO habit_periods",
+        """
+        CREATE TABLE activities_new(
+            uuid TEXT PRIMARY KEY,
+            habit TEXT NOT NULL,
+            performed_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (habit)
+                REFERENCES habits(uuid)
+                ON DELETE CASCADE
+        )
+        """,
+        """
+        INSERT INTO activities_new
+        SELECT * FROM activities WHERE habit IN (SELECT uuid FROM habits)
+        """,
+        # Dropping the table drops its index too, so it is recreated below
+        "DROP TABLE activities",
+        "ALTER TABLE activities_new RENAME TO activities",
+        """
+        CREATE INDEX idx_activities_habit_performed_at
+            ON activities(habit, performed_at, uuid)
+        """,
+        roll_up_trigger_sql,
+    ]),
+    (5, "Key habits and activities by integer ids, and store when activities were performed as timestamps", [
+        # Every activity used to hold two 36-character uuids (its own, as the primary key, and its habit's) and a
+        # 19-character datetime string, and so did the index on (habit, performed_at, uuid).  Now each table is keyed
+        # by an integer `id` (an alias of SQLite's rowid), activities refer to their habit by that id, and the time of
+        # performance is a POSIX timestamp, which are all stored in a few bytes.  The uuids stay, as unique columns,
+        # since they are how the rest of the app refers to habits and activities; the functions below translate between
+        # the two.  `habit_periods` and `habit_stats` (one row per habit and period/timezone) still refer to habits by
+        # uuid.  Tables are rebuilt in the way SQLite recommends, with foreign keys off (see `apply_migrations()`),
+        # since dropping the old `habits` table would otherwise delete everything that refers to it.
+        "DROP TRIGGER IF EXISTS trg_activities_roll_up_into_habit_periods",
+        """
+        CREATE TABLE habits_new(
+            id INTEGER PRIMARY KEY,
+            uuid TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            recurrence TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (recurrence)
+                REFERENCES recurrence_types (type)
+        )
+        """,
+        """
+        INSERT INTO habits_new(uuid, title, recurrence, created_at)
+        SELECT uuid, title, recurrence, created_at FROM habits ORDER BY rowid
+        """,
+        f"""
+        CREATE TABLE activities_new(
+            id INTEGER PRIMARY KEY,
+            uuid TEXT NOT NULL UNIQUE,
+            habit_id INTEGER NOT NULL,
+            performed_at INTEGER DEFAULT ({timestamp_sql.format(column="'now'")}),
+            FOREIGN KEY (habit_id)
+                REFERENCES habits(id)
+                ON DELETE CASCADE
+        )
+        """,
+        # In order of habit and time, so that each habit's existing activities are stored next to each other
+        f"""
+        INSERT INTO activities_new(uuid, habit_id, performed_at)
+        SELECT activities.uuid, habits_new.id, {timestamp_sql.format(column="activities.performed_at")}
+        FROM activities
+        JOIN habits_new ON habits_new.uuid = activities.habit
+        ORDER BY habits_new.id ASC, activities.performed_at ASC
+        """,
+        "DROP TABLE activities",
+        "ALTER TABLE activities_new RENAME TO activities",
+        "DROP TABLE habits",
+        "ALTER TABLE habits_new RENAME TO habits",
+        # The rowid is part of every index entry, so this index leads from a habit's activities straight to their rows
+        """
+        CREATE INDEX idx_activities_habit_performed_at
+            ON activities(habit_id, performed_at)
+        """,
+        f"""
+        CREATE TRIGGER trg_activities_roll_up_into_habit_periods
+        AFTER INSERT ON activities
+        BEGIN
+            INSERT INTO habit_periods(habit, period_ordinal, count, first_at, last_at)
+            SELECT habits.uuid, {get_local_period_ordinal_sql(gmt_datetime_sql.format(column="NEW.performed_at"),
+                                                              "habits.recurrence")}, 1,
+                {gmt_datetime_sql.format(column="NEW.performed_at")},
+                {gmt_datetime_sql.format(column="NEW.performed_at")}
+            FROM habits
+            WHERE habits.id = NEW.habit_id
+            ON CONFLICT (habit, period_ordinal) DO UPDATE SET
+                count = count + 1,
+                first_at = MIN(first_at, excluded.first_at),
+                last_at = MAX(last_at, excluded.last_at);
+        END
+        """,
+    ]),
+]
+
+
+def connect(db_name="main.db", pool_size: Optional[int] = None, profile: Optional[str] = None):
+    """
+    Set up the pool of connections to the database, and bring its schema up to date if the tables have already been set
+    up.  Each thread that uses the functions in this module gets a connection of its own from the pool.
+    :param db_name: The file name of the SQLite database
+    :param pool_size: The maximum number of connections to have open at once (defaults to `default_pool_size`)
+    :param profile: The name of the PRAGMA settings to configure each connection with, i.e. one of the keys of
+        `pragma_profiles` (defaults to `default_pragma_profile`)
+    """
+    if profile is None:
+        profile = default_pragma_profile
+    if profile not in pragma_profiles:
+        raise ValueError(f"Unknown PRAGMA profile: {profile}")
+
+    global default_pool
+    default_pool = ConnectionPool(db_name, pool_size if pool_size is not None else default_pool_size,
+                                  on_connect=lambda connection: configure_connection(connection, profile))
+
+    # A brand-new database gets its migrations applied by `setup_tables()` once the base tables exist
+    if base_tables_exist():
+        apply_migrations()
 
 
 def disconnect():
-    db_connection.close()
+    """
+    Close all the connections to the database.
+    """
+    default_pool.close()
+
+
+def configure_connection(connection: sqlite3.Connection, profile: str):
+    """
+    Set up a newly-opened connection of the pool: apply the PRAGMA profile, and count its statements if
+    instrumentation is enabled (see `instrumentation.enable()`).
+    :param connection: A newly-opened connection
+    :param profile: The name of the PRAGMA profile
+    :return: None
+    """
+    apply_pragma_profile(connection, profile)
+    # Instrumentation can only have been enabled if its module has been imported, and it isn't imported just to find
+    # out that it hasn't
+    instrumentation = sys.modules.get("modules.instrumentation")
+    if instrumentation is not None and instrumentation.is_enabled():
+        instrumentation.trace_connection(connection)
+
+
+def apply_pragma_profile(connection: sqlite3.Connection, profile: str):
+    """
+    Configure a connection with one of the `pragma_profiles`.
+    :param connection: A newly-opened connection
+    :param profile: The name of the profile
+    :return: None
+    """
+    for (pragma, value) in pragma_profiles[profile].items():
+        # PRAGMA statements don't take bound parameters, but these names and values come from `pragma_profiles`
+        connection.execute(f"PRAGMA {pragma} = {value}")
+    # Not a matter of speed, so not part of the profiles: SQLite only enforces foreign keys (and their `ON DELETE`
+    # actions) on connections that ask for it
+    connection.execute("PRAGMA foreign_keys = ON")
+
+
+def get_pragma_settings() -> dict[str, Union[str, int]]:
+    """
+    :return: The current values of the PRAGMAs the profiles set, on the calling thread's connection
+    """
+    cur = get_connection().cursor()
+    return {pragma: cur.execute(f"PRAGMA {pragma}").fetchone()[0] for pragma in pragma_profiles[default_pragma_profile]}
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    :return: The calling thread's connection to the database, from the default pool
+    """
+    return default_pool.get_connection()
+
+
+def transaction():
+    """
+    Run a block of statements in a single transaction on the calling thread's connection (see
+    `ConnectionPool.transaction()`), e.g.
+        with db.transaction():
+            ...
+    :return: A context manager that gives the connection
+    """
+    return default_pool.transaction()
 
 
 def setup_tables():
     """
-    If the required tables aren't all present, clear out the database and create them afresh
+    If the required tables aren't all present, clear out the database and create them afresh (and then apply the
+    migrations to them).  Existing databases are upgraded through `apply_migrations()` instead.
     :return: Indication of whether the table setup had to be done or not
     """
-    cur = db_connection.cursor()
+    cur = get_connection().cursor()
 
-    # check if tables exist
-    cur.execute("SELECT name FROM sqlite_master WHERE name IN ('habits', 'activities', 'recurrence_types')")
-    tables = cur.fetchall()
-    if len(tables) == 3:  # all the expected tables are there; no need to re-create
+    if base_tables_exist():  # all the expected tables are there; no need to re-create
         return False
 
     # just start afresh if some of the expected tables aren't there
@@ -56,35 +429,115 @@ def setup_tables():
         )
     """)
 
+    apply_migrations()
+
     return True
 
 
+def base_tables_exist():
+    """
+    :return: Indication of whether all the tables of the base schema are present in the database
+    """
+    cur = get_connection().cursor()
+    placeholders = ", ".join("?" * len(base_tables))
+    cur.execute(f"SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})", base_tables)
+    return len(cur.fetchall()) == len(base_tables)
+
+
+def get_schema_version():
+    """
+    :return: The version of the most recent migration applied to the database (0 if none have been applied)
+    """
+    cur = get_connection().cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version(
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT MAX(version) FROM schema_version")
+    version = cur.fetchone()[0]
+    return 0 if version is None else version
+
+
+def apply_migrations():
+    """
+    Apply, in order, every migration that is newer than the database's current schema version.  Each migration runs in
+    its own transaction together with the update to `schema_version`, so a failed migration leaves the database at the
+    previous version.
+    :return: The list of versions that were applied
+    """
+    current_version = get_schema_version()
+    get_connection().commit()  # make sure we start each migration from a clean transaction state
+
+    cur = get_connection().cursor()
+    applied = []
+    # Migrations that rebuild a table have to drop the old one, which (with foreign keys on) would delete or refuse to
+    # delete the rows that refer to it.  So foreign keys are turned off while migrating (which can't be done inside a
+    # transaction) and instead checked for violations before each migration is committed.
+    cur.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for (version, description, statements) in sorted(migrations, key=lambda m: m[0]):
+            if version <= current_version:
+                continue
+
+            with transaction():
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute("PRAGMA foreign_key_check")
+                violation = cur.fetchone()
+                if violation is not None:
+                    raise sqlite3.IntegrityError(f"Migration {version} left a row of {violation[0]} (rowid "
+                                                 f"{violation[1]}) referring to a missing row of {violation[2]}")
+                cur.execute("INSERT INTO schema_version(version, description) VALUES(?, ?)", (version, description))
+
+            applied.append(version)
+    finally:
+        cur.execute("PRAGMA foreign_keys = ON")
+
+    return applied
+
+
 def remove_tables():
-    cur = db_connection.cursor()
-    cur.execute("DROP TABLE IF EXISTS recurrence_types")
+    cur = get_connection().cursor()
+    cur.execute("DROP TABLE IF EXISTS schema_version")
+    cur.execute("DROP TABLE IF EXISTS habit_stats")
+    cur.execute("DROP TABLE IF EXISTS habit_periods")
+    cur.execute("DROP TABLE IF EXISTS settings")
+    # Referencing tables go before the tables they reference, as foreign keys are enforced
     cur.execute("DROP TABLE IF EXISTS activities")
     cur.execute("DROP TABLE IF EXISTS habits")
+    cur.execute("DROP TABLE IF EXISTS recurrence_types")
 
 
 def populate_starter_data():
-    cur = db_connection.cursor()
+    """
+    Fill a new database with a few example habits and a month of activities, ending today.
+    :return: None
+    """
+    from modules import example_data  # only needed the first time the app runs, so not imported at the top
+
+    (habits, activities) = example_data.get_starter_data()
+    cur = get_connection().cursor()
 
     cur.execute("""
-            INSERT INTO recurrence_types VALUES
+            INSERT OR IGNORE INTO recurrence_types VALUES
                 ("daily"),
                 ("weekly")
         """)
-    db_connection.commit()
+    get_connection().commit()
 
     cur.executemany("""
-            INSERT INTO habits VALUES (?, ?, ?, ?)
-        """, example_data.habits)
-    db_connection.commit()
+            INSERT INTO habits(uuid, title, recurrence, created_at) VALUES (?, ?, ?, ?)
+        """, habits)
+    get_connection().commit()
 
-    cur.executemany("""
-            INSERT INTO activities VALUES(?, ?, ?)
-        """, example_data.activities)
-    db_connection.commit()
+    cur.executemany(f"""
+            INSERT INTO activities(uuid, habit_id, performed_at)
+            VALUES(?, (SELECT id FROM habits WHERE uuid = ?), {timestamp_sql.format(column="?")})
+        """, activities)
+    get_connection().commit()
 
 
 def create_habit(title, recurrence, created_at: Optional[str] = None):
@@ -97,7 +550,7 @@ def create_habit(title, recurrence, created_at: Optional[str] = None):
     """
     uuid = make_uuid()
 
-    cur = db_connection.cursor()
+    cur = get_connection().cursor()
     if created_at is None:
         cur.execute("""
             INSERT INTO habits(uuid, title, recurrence)
@@ -105,9 +558,9 @@ def create_habit(title, recurrence, created_at: Optional[str] = None):
         """, (uuid, title, recurrence))
     else:
         cur.execute("""
-            INSERT INTO habits VALUES(?, ?, ?, ?)
+            INSERT INTO habits(uuid, title, recurrence, created_at) VALUES(?, ?, ?, ?)
         """, (uuid, title, recurrence, created_at))
-    db_connection.commit()
+    get_connection().commit()
     return get_habit(uuid)
 
 
@@ -117,30 +570,144 @@ def create_activity(habit_uuid, performed_at) -> tuple:
         :param habit_uuid: The uuid of the habit that was performed
         :param performed_at: A datetime string (in GMT) when the habit was performed, with the format
             YYYY-mm-DD HH:MM:SS
-        :return: The newly-created record, which is returned as a tuple
+        :return: The newly-created record, which is returned as a tuple containing the activity's uuid, the habit's uuid
+            and when it was performed (as a POSIX timestamp)
         """
     uuid = make_uuid()
 
-    cur = db_connection.cursor()
+    cur = get_connection().cursor()
     if performed_at is None:
         cur.execute("""
-            INSERT INTO activities(uuid, habit) VALUES(?, ?)
+            INSERT INTO activities(uuid, habit_id) VALUES(?, (SELECT id FROM habits WHERE uuid = ?))
         """, (uuid, habit_uuid))
     else:
         cur.execute("""
-            INSERT INTO activities VALUES(?, ?, ?)
-        """, (uuid, habit_uuid, performed_at))
-    db_connection.commit()
+            INSERT INTO activities(uuid, habit_id, performed_at) VALUES(?, (SELECT id FROM habits WHERE uuid = ?), ?)
+        """, (uuid, habit_uuid, to_timestamp(performed_at)))
+    activity_id = cur.lastrowid
+    invalidate_habit_stats(habit_uuid)
+    get_connection().commit()
 
-    cur.execute("SELECT * FROM activities WHERE uuid = ?", (uuid, ))
+    cur.execute("SELECT uuid, ?, performed_at FROM activities WHERE id = ?", (habit_uuid, activity_id))
     return cur.fetchone()
 
 
+def create_activities_streamed(habit_uuid, performed_at_iterable: Iterable[str], chunk_size: int = 1000,
+                               on_chunk: Optional[Callable[[list[tuple]], None]] = None) -> int:
+    """
+    Create records in the database for many performances of a given habit, all in a single transaction.  The datetimes
+    are consumed lazily, `chunk_size` at a time, so `performed_at_iterable` can be a generator and memory use stays flat
+    however many activities are imported.
+    :param habit_uuid: The uuid of the habit that was performed
+    :param performed_at_iterable: Datetime strings (in GMT) when the habit was performed, with the format
+        YYYY-mm-DD HH:MM:SS
+    :param chunk_size: The number of records to send to the database per batch
+    :param on_chunk: A function that is given the list of newly-created records (as tuples, like those returned by
+        `create_activity()`) after each batch is inserted, e.g. to add them to a model as the import progresses
+    :return: The number of records created
+    """
+    performed_at_iterator = iter(performed_at_iterable)
+    num_created = 0
+
+    get_connection().commit()  # make sure the whole import runs in its own transaction
+    cur = get_connection().cursor()
+    with transaction():
+        # A write comes first, so that the transaction takes the write lock (waiting for other writers if need be)
+        # before it reads anything; a transaction that has read can't wait for the lock once another writer commits
+        invalidate_habit_stats(habit_uuid)
+        cur.execute("SELECT id FROM habits WHERE uuid = ?", (habit_uuid, ))
+        row = cur.fetchone()
+        habit_id = row[0] if row is not None else None  # i.e. the inserts fail, as the habit doesn't exist
+        while True:
+            chunk = [
+                (make_uuid(), habit_uuid, timestamp)
+                for timestamp in to_timestamps(list(islice(performed_at_iterator, chunk_size)))
+            ]
+            if len(chunk) == 0:
+                break
+
+            cur.executemany("INSERT INTO activities(uuid, habit_id, performed_at) VALUES(?, ?, ?)",
+                            ((uuid, habit_id, timestamp) for (uuid, _, timestamp) in chunk))
+            num_created += len(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)  # these are exactly the rows inserted, so there's no need to select them again
+
+    return num_created
+
+
+def create_activities_bulk(habit_uuid, performed_at_iterable: Iterable[str], chunk_size: int = 1000) -> list[tuple]:
+    """
+    Create records in the database for many performances of a given habit, all in a single transaction.
+    :param habit_uuid: The uuid of the habit that was performed
+    :param performed_at_iterable: Datetime strings (in GMT) when the habit was performed, with the format
+        YYYY-mm-DD HH:MM:SS
+    :param chunk_size: The number of records to send to the database per batch
+    :return: The newly-created records, as a list of tuples
+    """
+    created = []
+    create_activities_streamed(habit_uuid, performed_at_iterable, chunk_size, created.extend)
+    return created
+
+
+def import_dataset(habits: Iterable[tuple], activities: Iterable[tuple], chunk_size: int = 10_000,
+                   skip_existing: bool = False) -> tuple[int, int]:
+    """
+    Add many habits and their activities to the database, all in a single transaction, e.g. a dataset from
+    `example_data.generate_dataset()` or `example_data.read_fixture()`.  The activities are consumed lazily,
+    `chunk_size` at a time, so they can be a generator.
+    :param habits: Habit records: tuples containing the uuid, title, recurrence and creation time (GMT datetime string)
+    :param activities: Activity records: tuples containing the uuid, the uuid of the habit (which must be one of
+        `habits` or already be in the database) and the time of performance (a POSIX timestamp or a GMT datetime
+        string).  The activities' uuids must be UUIDs, as that is how a habit's activities are kept in memory (see
+        `ActivityLog`); they are stored in the form `make_uuid()` gives.
+    :param chunk_size: The number of records to send to the database per batch
+    :param skip_existing: Whether to leave out habits and activities whose uuids are already in the database (e.g. when
+        importing an export of this same database), rather than failing on them
+    :return: A tuple containing the number of habits and the number of activities added
+    :raise ValueError: If an activity's uuid isn't a UUID or its time of performance is in the wrong format, in which
+        case nothing is added
+    """
+    activity_iterator = iter(activities)
+    num_activities = 0
+    # Only a clash of uuids is skipped; anything else wrong with a record (e.g. an unknown habit) still fails the import
+    on_conflict = "ON CONFLICT (uuid) DO NOTHING" if skip_existing else ""
+
+    get_connection().commit()  # make sure the whole import runs in its own transaction
+    cur = get_connection().cursor()
+    with transaction():
+        cur.executemany(f"INSERT INTO habits(uuid, title, recurrence, created_at) VALUES(?, ?, ?, ?) {on_conflict}",
+                        habits)
+        num_habits = cur.rowcount
+        # The habits' ids, so that activities can be inserted without looking their habit up one at a time
+        habit_ids = dict(cur.execute("SELECT uuid, id FROM habits").fetchall())
+        while True:
+            chunk = list(islice(activity_iterator, chunk_size))
+            if len(chunk) == 0:
+                break
+
+            timestamps = to_timestamps([performed_at for (_, _, performed_at) in chunk])
+            cur.executemany(f"INSERT INTO activities(uuid, habit_id, performed_at) VALUES(?, ?, ?) {on_conflict}", (
+                (normalise_uuid(uuid), habit_ids.get(habit_uuid), timestamp)
+                for ((uuid, habit_uuid, _), timestamp) in zip(chunk, timestamps)
+            ))
+            num_activities += cur.rowcount
+        # Activities may have been added to habits that already had stats stored, so they are all recomputed
+        cur.execute("DELETE FROM habit_stats")
+
+    return num_habits, num_activities
+
+
 def get_habit(uuid) -> dict[str, Union[tuple, list[tuple]]]:
-    cur = db_connection.cursor()
-    cur.execute("SELECT * FROM habits WHERE uuid = ?", (uuid, ))
+    cur = get_connection().cursor()
+    cur.execute(f"SELECT {habit_columns_sql} FROM habits WHERE uuid = ?", (uuid, ))
     habit = cur.fetchone()
-    cur.execute("SELECT * FROM activities WHERE habit = ? ORDER BY performed_at ASC", (uuid, ))
+    cur.execute("""
+        SELECT activities.uuid, habits.uuid, activities.performed_at
+        FROM habits
+        JOIN activities ON activities.habit_id = habits.id
+        WHERE habits.uuid = ?
+        ORDER BY activities.performed_at ASC
+    """, (uuid, ))
     activities = cur.fetchall()
     return {
         "habit": habit,
@@ -148,12 +715,85 @@ def get_habit(uuid) -> dict[str, Union[tuple, list[tuple]]]:
     }
 
 
+def get_last_performed_at(habit_uuid) -> Optional[int]:
+    """
+    Look up when a habit was last performed.  This is answered from the (habit_id, performed_at) index, so it costs a
+    single index lookup however many activities the habit has.
+    :param habit_uuid: The uuid of the habit
+    :return: A POSIX timestamp, or None if the habit has never been performed
+    """
+    cur = get_connection().cursor()
+    cur.execute("""
+        SELECT MAX(performed_at) FROM activities WHERE habit_id = (SELECT id FROM habits WHERE uuid = ?)
+    """, (habit_uuid, ))
+    return cur.fetchone()[0]
+
+
+def find_habits(uuid_or_title: str) -> list[str]:
+    """
+    Look up habits by uuid or by title, e.g. for a habit named on the command line.
+    :param uuid_or_title: The uuid of a habit, or the exact title of one or more habits
+    :return: The uuids of the matching habits (more than one only if several habits share the title)
+    """
+    cur = get_connection().cursor()
+    cur.execute("SELECT uuid FROM habits WHERE uuid = ? OR title = ? ORDER BY id", (uuid_or_title, uuid_or_title))
+    return [row[0] for row in cur.fetchall()]
+
+
 def delete_habit(uuid):
-    cur = db_connection.cursor()
-    cur.execute("DELETE FROM activities WHERE habit = ?", (uuid,))
-    db_connection.commit()
-    cur.execute("DELETE FROM habits WHERE uuid = ?", (uuid,))
-    db_connection.commit()
+    """
+    Delete a habit, along with its activities, stored stats and rollup (which the foreign keys' `ON DELETE CASCADE`
+    takes care of), in a single transaction.
+    :param uuid: The uuid of the habit
+    :return: None
+    """
+    get_connection().commit()  # make sure the deletion runs in its own transaction
+    with transaction() as connection:
+        connection.execute("DELETE FROM habits WHERE uuid = ?", (uuid, ))
+
+
+def delete_habits_bulk(uuids: Iterable[str], chunk_size: int = 10_000) -> int:
+    """
+    Delete many habits, along with their activities, stored stats and rollup.  So as not to hold the write lock for too
+    long at a time, the habits are deleted in chunks of roughly `chunk_size` activities, one transaction per chunk.  A
+    habit is never split across chunks, so each habit is deleted atomically (a habit with more than `chunk_size`
+    activities gets a chunk of its own).
+    :param uuids: The uuids of the habits
+    :param chunk_size: The number of activities to aim for per transaction
+    :return: The number of habits deleted
+    """
+    uuids = list(dict.fromkeys(uuids))  # without duplicates, keeping the order
+    get_connection().commit()
+    cur = get_connection().cursor()
+    cur.execute("""
+        SELECT habits.uuid, COUNT(*)
+        FROM habits
+        JOIN activities ON activities.habit_id = habits.id
+        WHERE habits.uuid IN (SELECT value FROM json_each(:habit_uuids))
+        GROUP BY habits.id
+    """, {"habit_uuids": json.dumps(uuids)})
+    num_activities = dict(cur.fetchall())
+
+    def delete_chunk(chunk: list[str]):
+        with transaction() as connection:
+            return connection.execute("""
+                DELETE FROM habits WHERE uuid IN (SELECT value FROM json_each(:habit_uuids))
+            """, {"habit_uuids": json.dumps(chunk)}).rowcount
+
+    num_deleted = 0
+    (chunk, chunk_activities) = ([], 0)
+    for uuid in uuids:
+        # Each habit costs at least one row, so that a chunk of habits without activities doesn't grow without bound
+        cost = max(1, num_activities.get(uuid, 0))
+        if len(chunk) > 0 and chunk_activities + cost > chunk_size:
+            num_deleted += delete_chunk(chunk)
+            (chunk, chunk_activities) = ([], 0)
+        chunk.append(uuid)
+        chunk_activities += cost
+    if len(chunk) > 0:
+        num_deleted += delete_chunk(chunk)
+
+    return num_deleted
 
 
 def get_all_habits():
@@ -162,39 +802,276 @@ def get_all_habits():
     :return: A list of dictionary objects, where each object has a "habit" key whose value is a tuple containing the
         data of one record from the "habits" table, and an "activities" key whose value is a list of tuples, each of
         which contain the data of one record from the "activities" table.  The activities are the subset belonging to
-        that particular habit.
+        that particular habit.  Activities whose habit no longer exists are left out (see
+        `count_orphaned_activities()`).
     """
-    cur = db_connection.cursor()
-    cur.execute("SELECT * FROM habits ORDER BY uuid ASC")
-    habit_tuples = cur.fetchall()
-    augmented_habits = []  # i.e. habits with their list of when they got done
+    return list(iter_habits_with_activities())
+
 
-    cur.execute("SELECT * FROM activities ORDER BY habit ASC, performed_at ASC")
-    activity_tuples = cur.fetchall()
+def get_habit_stats(today_gmt: str, today_day: int, habit_uuids: Optional[list[str]] = None) -> list[tuple]:
+    """
+    Compute the figures shown in the habit overview inside the database, so that only one small row per habit (rather
+    than every activity) is sent back.  This reads the `habit_periods` rollup, so it looks at one row per day/week in
+    which a habit was performed.  The latest streak is found by treating each run of consecutive periods as an "island":
+    within a run, the period minus its row number is the same for every period.
+    :param today_gmt: The current date/time (in GMT) with the format YYYY-mm-DD HH:MM:SS.  Periods are only counted as
+        completed if the habit was performed in them on or before this time.
+    :param today_day: The ordinal of the current (local) day, as returned by `date.toordinal()`
+    :param habit_uuids: Only compute the stats of these habits (defaults to all of them)
+    :return: A list of tuples (one per habit, ordered by uuid) containing the habit's uuid, title, recurrence, when it
+        was created (GMT), when it was last performed (GMT, or None if never performed), the number of periods it was
+        performed in up to `today_gmt`, the number of those periods in which it was performed after it was created
+        (activities can be back-dated), the number of periods from its creation up to `today_day`, and the length of its
+        latest streak (0 if never performed)
+    """
+    ensure_habit_periods_timezone()
 
-    activity_idx = 0  # index to loop from start to end of `activity_tuples`
-    for habit in habit_tuples:
-        augmented_habit = {
+    cur = get_connection().cursor()
+    cur.execute(f"""
+        WITH active_periods AS (
+            SELECT habit_periods.habit AS habit, habit_periods.period_ordinal AS period, habit_periods.first_at,
+                habit_periods.last_at,
+                CASE
+                    WHEN habit_periods.last_at < habits.created_at OR habit_periods.first_at > :today_gmt THEN 0
+                    WHEN habit_periods.first_at >= habits.created_at OR habit_periods.last_at <= :today_gmt THEN 1
+                    -- The period spans the whole of the habit's lifetime up to `today_gmt`, so only its individual
+                    -- activities can tell whether it was performed in that time
+                    ELSE EXISTS (
+                        SELECT 1 FROM activities
+                        WHERE activities.habit_id = habits.id
+                            AND activities.performed_at BETWEEN {timestamp_sql.format(column="habits.created_at")}
+                                AND {timestamp_sql.format(column=":today_gmt")}
+                    )
+                END AS performed_since_creation
+            FROM habit_periods
+            JOIN habits ON habits.uuid = habit_periods.habit
+            WHERE :habit_uuids IS NULL OR habit_periods.habit IN (SELECT value FROM json_each(:habit_uuids))
+        ),
+        islands AS (
+            SELECT habit, period, period - ROW_NUMBER() OVER (PARTITION BY habit ORDER BY period) AS island
+            FROM active_periods
+        ),
+        runs AS (
+            SELECT habit, MAX(period) - MIN(period) + 1 AS length,
+                ROW_NUMBER() OVER (PARTITION BY habit ORDER BY MAX(period) DESC) AS recency
+            FROM islands
+            GROUP BY habit, island
+        ),
+        period_counts AS (
+            SELECT habit, MAX(last_at) AS last_performed_at,
+                SUM(first_at <= :today_gmt) AS num_periods_performed,
+                SUM(performed_since_creation) AS num_periods_performed_since_creation
+            FROM active_periods
+            GROUP BY habit
+        ),
+        habit_days AS (
+            SELECT uuid, title, recurrence, created_at, {local_day_ordinal_sql.format(column="created_at")} AS day
+            FROM habits
+            WHERE :habit_uuids IS NULL OR uuid IN (SELECT value FROM json_each(:habit_uuids))
+        )
+        SELECT habit_days.uuid, habit_days.title, habit_days.recurrence, habit_days.created_at,
+            period_counts.last_performed_at,
+            COALESCE(period_counts.num_periods_performed, 0) AS num_periods_performed,
+            COALESCE(period_counts.num_periods_performed_since_creation, 0) AS num_periods_performed_since_creation,
+            CASE habit_days.recurrence
+                WHEN 'daily' THEN :today_day - habit_days.day
+                ELSE (:today_day - 1) / 7 - (habit_days.day - 1) / 7
+            END + 1 AS num_total_periods,
+            COALESCE(runs.length, 0) AS latest_streak
+        FROM habit_days
+        LEFT JOIN period_counts ON period_counts.habit = habit_days.uuid
+        LEFT JOIN runs ON runs.habit = habit_days.uuid AND runs.recency = 1
+        ORDER BY habit_days.uuid ASC
+    """, {
+        "today_gmt": today_gmt,
+        "today_day": today_day,
+        # Passed as a single JSON array, so there's no limit on the number of habits
+        "habit_uuids": json.dumps(habit_uuids) if habit_uuids is not None else None,
+    })
+    return cur.fetchall()
+
+
+def get_habit_with_periods(uuid) -> dict[str, Union[tuple, list[tuple]]]:
+    """
+    Fetch a habit along with its rollup of activities per day/week, instead of all its activities.
+    :param uuid: The uuid of the habit
+    :return: A dictionary object with a "habit" key whose value is the habit's record from the `habits` table, and a
+        "periods" key whose value is a list of the habit's records from the `habit_periods` table, sorted by period
+    """
+    ensure_habit_periods_timezone()
+
+    cur = get_connection().cursor()
+    cur.execute(f"SELECT {habit_columns_sql} FROM habits WHERE uuid = ?", (uuid, ))
+    habit = cur.fetchone()
+    cur.execute("SELECT * FROM habit_periods WHERE habit = ? ORDER BY period_ordinal ASC", (uuid, ))
+    periods = cur.fetchall()
+    return {
+        "habit": habit,
+        "periods": periods,
+    }
+
+
+def backfill_habit_periods() -> int:
+    """
+    (Re)build the `habit_periods` rollup from the `activities` table, for the current local timezone.  This is needed
+    once for a database that had activities before the rollup existed, and whenever the local timezone changes (which
+    `ensure_habit_periods_timezone()` takes care of).
+    :return: The number of rows in the rebuilt rollup
+    """
+    get_connection().commit()  # make sure the rebuild runs in its own transaction
+    cur = get_connection().cursor()
+    with transaction():
+        cur.execute("DELETE FROM habit_periods")
+        cur.execute(f"""
+            INSERT INTO habit_periods(habit, period_ordinal, count, first_at, last_at)
+            SELECT habits.uuid, {get_local_period_ordinal_sql(gmt_datetime_sql.format(column="activities.performed_at"),
+                                                              "habits.recurrence")} AS period,
+                COUNT(*), {gmt_datetime_sql.format(column="MIN(activities.performed_at)")},
+                {gmt_datetime_sql.format(column="MAX(activities.performed_at)")}
+            FROM activities
+            JOIN habits ON habits.id = activities.habit_id
+            GROUP BY habits.id, period
+        """)
+        num_rows = cur.rowcount
+        cur.execute("""
+            INSERT OR REPLACE INTO settings VALUES('habit_periods_timezone', ?)
+        """, (get_local_timezone_key(), ))
+
+    return num_rows
+
+
+def ensure_habit_periods_timezone():
+    """
+    Rebuild the `habit_periods` rollup if it was built for a different local timezone than the current one (or has
+    never been built), since the timezone decides which days/weeks activities fall into.
+    :return: None
+    """
+    cur = get_connection().cursor()
+    cur.execute("SELECT value FROM settings WHERE key = 'habit_periods_timezone'")
+    row = cur.fetchone()
+    if row is None or row[0] != get_local_timezone_key():
+        backfill_habit_periods()
+
+
+# Later than any time a habit could have been performed, for computing stats over all of a habit's activities
+end_of_time_gmt = "9999-12-31 23:59:59"
+
+
+def get_materialized_habit_stats(today_gmt: str, today_day: int, timezone: str) -> list[tuple]:
+    """
+    Fetch the same stats as `get_habit_stats()`, but serve them from the `habit_stats` table where possible.  That
+    table holds the stats over all of each habit's activities, which don't depend on the current date as long as the
+    habit hasn't been performed after `today_gmt`.  Only the habits without a row (new habits, or ones whose activities
+    changed since their stats were stored) are recomputed and stored, and only habits with activities after
+    `today_gmt` (i.e. when looking at the stats as of a date in the past) are recomputed without being stored.  The
+    number of periods since the habit was created depends on the current date, so it is always computed afresh.
+    :param today_gmt: As for `get_habit_stats()`
+    :param today_day: As for `get_habit_stats()`
+    :param timezone: Identifies the local timezone (see `utils.get_local_timezone_key()`).  Stats are stored separately
+        for each timezone, since the timezone decides which days/weeks activities fall into.
+    :return: A list of tuples, as for `get_habit_stats()`
+    """
+    cur = get_connection().cursor()
+    cur.execute("""
+        SELECT uuid FROM habits
+        WHERE NOT EXISTS (SELECT 1 FROM habit_stats WHERE habit_stats.habit = habits.uuid AND timezone = ?)
+    """, (timezone, ))
+    dirty_habit_uuids = [row[0] for row in cur.fetchall()]
+    if len(dirty_habit_uuids) > 0:
+        cur.executemany("""
+            INSERT OR REPLACE INTO habit_stats VALUES(?, ?, ?, ?, ?, ?)
+        """, [
+            (uuid, timezone, last_performed_at, num_periods_performed, num_periods_performed_since_creation,
+             latest_streak)
+            for (uuid, _, _, _, last_performed_at, num_periods_performed, num_periods_performed_since_creation, _,
+                 latest_streak) in get_habit_stats(end_of_time_gmt, today_day, dirty_habit_uuids)
+        ])
+        get_connection().commit()
+
+    cur.execute(f"""
+        SELECT habits.uuid, habits.title, habits.recurrence, habits.created_at, habit_stats.last_performed_at,
+            habit_stats.num_periods_performed, habit_stats.num_periods_performed_since_creation,
+            CASE habits.recurrence
+                WHEN 'daily' THEN :today_day - {local_day_ordinal_sql.format(column="habits.created_at")}
+                ELSE (:today_day - 1) / 7 - ({local_day_ordinal_sql.format(column="habits.created_at")} - 1) / 7
+            END + 1 AS num_total_periods,
+            habit_stats.latest_streak
+        FROM habits
+        JOIN habit_stats ON habit_stats.habit = habits.uuid AND habit_stats.timezone = :timezone
+        ORDER BY habits.uuid ASC
+    """, {"today_day": today_day, "timezone": timezone})
+    habit_stats = cur.fetchall()
+
+    # The stored counts include every activity, so they're too high for habits that were performed after `today_gmt`
+    as_of_past_uuids = [row[0] for row in habit_stats if row[4] is not None and row[4] > today_gmt]
+    if len(as_of_past_uuids) > 0:
+        recomputed = {row[0]: row for row in get_habit_stats(today_gmt, today_day, as_of_past_uuids)}
+        habit_stats = [recomputed.get(row[0], row) for row in habit_stats]
+
+    return habit_stats
+
+
+def invalidate_habit_stats(habit_uuid: str):
+    """
+    Delete the stored stats of a habit in every timezone (see `get_materialized_habit_stats()`), because its activities
+    are changing.  This doesn't commit, so that it happens in the same transaction as the change to the activities.
+    :param habit_uuid: The uuid of the habit
+    :return: None
+    """
+    cur = get_connection().cursor()
+    cur.execute("DELETE FROM habit_stats WHERE habit = ?", (habit_uuid, ))
+
+
+def iter_habits_with_activities(batch_size: int = 1000) -> Iterator[dict[str, Union[tuple, list[tuple]]]]:
+    """
+    Stream all the habit records, each with its activity records, one habit at a time.  A single query walks the habits
+    in order of uuid, joined to their activities in order of performance (looked up through the (habit_id, performed_at)
+    index, so any sorting only ever covers one habit's activities), and rows are fetched `batch_size` at a time.  So
+    unlike `get_all_habits()`, memory use is bounded by the largest single habit rather than by the whole database.
+    Since the activities are matched to their habit by the join rather than by walking two sorted lists side by side,
+    activities whose habit no longer exists can't hold up the habits that come after them; they are simply left out.
+    :param batch_size: The number of rows to fetch from the database at a time
+    :return: A generator of dictionary objects like those returned by `get_all_habits()`, in order of habit uuid
+    """
+    cur = get_connection().cursor()
+    cur.execute("""
+        SELECT habits.uuid, habits.title, habits.recurrence, habits.created_at,
+            activities.uuid, habits.uuid, activities.performed_at
+        FROM habits
+        LEFT JOIN activities ON activities.habit_id = habits.id
+        ORDER BY habits.uuid ASC, activities.performed_at ASC
+    """)
+    rows = chain.from_iterable(iter(lambda: cur.fetchmany(batch_size), []))
+
+    for (habit, habit_rows) in groupby(rows, key=lambda row: row[:4]):
+        yield {
             "habit": habit,
-            "activities": []
+            # a habit without activities comes back as a single row with NULL activity columns
+            "activities": [row[4:] for row in habit_rows if row[4] is not None],
         }
-        habit_id = habit[0]
-
-        # Since activities were fetched ordered by their parent habit's id, we will add one activity at a time to a
-        # habit, until we encounter the first activity to have a different parent habit than the one we are currently
-        # considering (i.e. `habit`).  At that point, we will know to move on to the next habit in `habit_tuples`.
-        for idx in range(activity_idx, len(activity_tuples)):
-            activity = activity_tuples[idx]
-            parent_habit_id = activity[1]
-            if parent_habit_id == habit_id:
-                augmented_habit["activities"].append(activity)
-            else:
-                activity_idx = idx  # Make a note to continue looking at the activities from this index
-                break
 
-        augmented_habits.append(augmented_habit)
 
-    return augmented_habits
+def count_habits_and_activities() -> tuple[int, int]:
+    """
+    :return: A tuple containing the number of habits and the number of activities in the database
+    """
+    cur = get_connection().cursor()
+    cur.execute("SELECT (SELECT COUNT(*) FROM habits), (SELECT COUNT(*) FROM activities)")
+    return cur.fetchone()
+
+
+def count_orphaned_activities() -> int:
+    """
+    Count the activities whose habit no longer exists, e.g. because the habit was deleted by an older version of the
+    app that didn't delete its activities along with it.  These are left out of `get_all_habits()` and the stats.
+    :return: The number of orphaned activities
+    """
+    cur = get_connection().cursor()
+    cur.execute("""
+        SELECT COUNT(*) FROM activities
+        WHERE NOT EXISTS (SELECT 1 FROM habits WHERE habits.id = activities.habit_id)
+    """)
+    return cur.fetchone()[0]
 
 
 def get_all_habits_abridged() -> tuple[str, str]:
@@ -202,7 +1079,7 @@ def get_all_habits_abridged() -> tuple[str, str]:
     Fetch a list of all the habits, but only returning their UUIDs and titles
     :return: A list of tuples, where each tuple comprises two strings
     """
-    cur = db_connection.cursor()
+    cur = get_connection().cursor()
     cur.execute("SELECT uuid, title FROM habits")
     habits = cur.fetchall()
     return habits
@@ -1,69 +1,304 @@
+import argparse
+import csv
+import os
+import random
+import time
+from modules import db
 from modules.utils import make_uuid
 from datetime import datetime, timedelta
+from typing import Iterator, Optional
 
 
-today = datetime.today()
-start = today - timedelta(days=28)
+def date_to_string(dt: datetime):
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
 
-day = []  # dates from `start` until 27 days later
-for index in range(28):
-    day.append(start + timedelta(days=index))
+# The habits a new database starts with (see `get_starter_data()`): their titles, recurrences and the times of day at
+# which they were created, on the first of the 28 days of example activities
+starter_habits = [
+    ("Jog", "daily", (14, 25, 58)),
+    ("Phone parents", "weekly", (8, 49, 14)),
+    ("Read a novel", "daily", (16, 18, 54)),
+    ("Journal", "weekly", (15, 6, 39)),
+    ("isiXhosa lesson", "weekly", (23, 13, 56)),
+]
 
+# The starter habits' activities: the index of the habit in `starter_habits`, the day (0 to 27) and the time of day
+starter_activities = [
+    (0, 1, (5, 8, 28)),
+    (0, 2, (10, 23, 32)),
+    (0, 4, (7, 53, 16)),
+    (0, 5, (17, 15, 5)),
+    (0, 10, (5, 12, 24)),
+    (0, 11, (17, 30, 58)),
+    (0, 12, (18, 51, 6)),
+    (0, 13, (19, 59, 43)),
+    (0, 16, (19, 58, 55)),
+    (0, 17, (19, 37, 26)),
+    (0, 19, (7, 30, 45)),
+    (0, 20, (20, 17, 1)),
+    (0, 23, (15, 30, 40)),
+    (0, 25, (6, 55, 11)),
+    (0, 26, (6, 51, 20)),
 
-def date_to_string(dt: datetime):
-    return dt.strftime("%Y-%m-%d %H:%M:%S")
+    (1, 0, (16, 45, 13)),
+    (1, 3, (11, 33, 47)),
+    (1, 8, (13, 8, 4)),
+    (1, 10, (18, 5, 18)),
+    (1, 16, (15, 12, 35)),
+    (1, 23, (19, 14, 17)),
+    (1, 24, (6, 46, 13)),
+    (1, 27, (7, 55, 55)),
 
+    (2, 5, (12, 28, 52)),
+    (2, 6, (8, 24, 52)),
+    (2, 7, (7, 18, 34)),
+    (2, 12, (15, 43, 49)),
+    (2, 15, (17, 3, 10)),
+    (2, 16, (6, 25, 32)),
+    (2, 20, (5, 47, 29)),
+    (2, 22, (16, 52, 4)),
+    (2, 23, (7, 29, 16)),
 
-habits = [
-    (make_uuid(), "Jog", "daily", date_to_string(day[0].replace(hour=14, minute=25, second=58))),
-    (make_uuid(), "Phone parents", "weekly", date_to_string(day[0].replace(hour=8, minute=49, second=14))),
-    (make_uuid(), "Read a novel", "daily", date_to_string(day[0].replace(hour=16, minute=18, second=54))),
-    (make_uuid(), "Journal", "weekly", date_to_string(day[0].replace(hour=15, minute=6, second=39))),
-    (make_uuid(), "isiXhosa lesson", "weekly", date_to_string(day[0].replace(hour=23, minute=13, second=56))),
+    (3, 13, (22, 17, 43)),
+    (3, 19, (16, 34, 39)),
+    (3, 27, (15, 8, 27)),
+
+    (4, 5, (19, 23, 57)),
+    (4, 19, (6, 31, 58)),
+    (4, 21, (5, 49, 20)),
+    (4, 24, (6, 45, 31)),
 ]
 
-activities = [
-    (make_uuid(), habits[0][0], date_to_string(day[1].replace(hour=5, minute=8, second=28))),
-    (make_uuid(), habits[0][0], date_to_string(day[2].replace(hour=10, minute=23, second=32))),
-    (make_uuid(), habits[0][0], date_to_string(day[4].replace(hour=7, minute=53, second=16))),
-    (make_uuid(), habits[0][0], date_to_string(day[5].replace(hour=17, minute=15, second=5))),
-    (make_uuid(), habits[0][0], date_to_string(day[10].replace(hour=5, minute=12, second=24))),
-    (make_uuid(), habits[0][0], date_to_string(day[11].replace(hour=17, minute=30, second=58))),
-    (make_uuid(), habits[0][0], date_to_string(day[12].replace(hour=18, minute=51, second=6))),
-    (make_uuid(), habits[0][0], date_to_string(day[13].replace(hour=19, minute=59, second=43))),
-    (make_uuid(), habits[0][0], date_to_string(day[16].replace(hour=19, minute=58, second=55))),
-    (make_uuid(), habits[0][0], date_to_string(day[17].replace(hour=19, minute=37, second=26))),
-    (make_uuid(), habits[0][0], date_to_string(day[19].replace(hour=7, minute=30, second=45))),
-    (make_uuid(), habits[0][0], date_to_string(day[20].replace(hour=20, minute=17, second=1))),
-    (make_uuid(), habits[0][0], date_to_string(day[23].replace(hour=15, minute=30, second=40))),
-    (make_uuid(), habits[0][0], date_to_string(day[25].replace(hour=6, minute=55, second=11))),
-    (make_uuid(), habits[0][0], date_to_string(day[26].replace(hour=6, minute=51, second=20))),
-
-    (make_uuid(), habits[1][0], date_to_string(day[0].replace(hour=16, minute=45, second=13))),
-    (make_uuid(), habits[1][0], date_to_string(day[3].replace(hour=11, minute=33, second=47))),
-    (make_uuid(), habits[1][0], date_to_string(day[8].replace(hour=13, minute=8, second=4))),
-    (make_uuid(), habits[1][0], date_to_string(day[10].replace(hour=18, minute=5, second=18))),
-    (make_uuid(), habits[1][0], date_to_string(day[16].replace(hour=15, minute=12, second=35))),
-    (make_uuid(), habits[1][0], date_to_string(day[23].replace(hour=19, minute=14, second=17))),
-    (make_uuid(), habits[1][0], date_to_string(day[24].replace(hour=6, minute=46, second=13))),
-    (make_uuid(), habits[1][0], date_to_string(day[27].replace(hour=7, minute=55, second=55))),
-
-    (make_uuid(), habits[2][0], date_to_string(day[5].replace(hour=12, minute=28, second=52))),
-    (make_uuid(), habits[2][0], date_to_string(day[6].replace(hour=8, minute=24, second=52))),
-    (make_uuid(), habits[2][0], date_to_string(day[7].replace(hour=7, minute=18, second=34))),
-    (make_uuid(), habits[2][0], date_to_string(day[12].replace(hour=15, minute=43, second=49))),
-    (make_uuid(), habits[2][0], date_to_string(day[15].replace(hour=17, minute=3, second=10))),
-    (make_uuid(), habits[2][0], date_to_string(day[16].replace(hour=6, minute=25, second=32))),
-    (make_uuid(), habits[2][0], date_to_string(day[20].replace(hour=5, minute=47, second=29))),
-    (make_uuid(), habits[2][0], date_to_string(day[22].replace(hour=16, minute=52, second=4))),
-    (make_uuid(), habits[2][0], date_to_string(day[23].replace(hour=7, minute=29, second=16))),
-
-    (make_uuid(), habits[3][0], date_to_string(day[13].replace(hour=22, minute=17, second=43))),
-    (make_uuid(), habits[3][0], date_to_string(day[19].replace(hour=16, minute=34, second=39))),
-    (make_uuid(), habits[3][0], date_to_string(day[27].replace(hour=15, minute=8, second=27))),
-
-    (make_uuid(), habits[4][0], date_to_string(day[5].replace(hour=19, minute=23, second=57))),
-    (make_uuid(), habits[4][0], date_to_string(day[19].replace(hour=6, minute=31, second=58))),
-    (make_uuid(), habits[4][0], date_to_string(day[21].replace(hour=5, minute=49, second=20))),
-    (make_uuid(), habits[4][0], date_to_string(day[24].replace(hour=6, minute=45, second=31))),
+
+def get_starter_data(today: Optional[datetime] = None) -> tuple[list[tuple], list[tuple]]:
+    """
+    Make the example habits and activities that a new database starts with, spread over the four weeks up to today.
+    :param today: The date/time the activities lead up to (local time).  Defaults to now.
+    :return: A tuple containing a list of habit records and a list of activity records, with datetimes as strings in
+        the format YYYY-mm-dd HH:MM:SS
+    """
+    if today is None:
+        today = datetime.today()
+    start = today - timedelta(days=28)
+
+    def at(day: int, time_of_day: tuple[int, int, int]):
+        (hour, minute, second) = time_of_day
+        return date_to_string((start + timedelta(days=day)).replace(hour=hour, minute=minute, second=second))
+
+    habits = [(make_uuid(), title, recurrence, at(0, time_of_day))
+              for (title, recurrence, time_of_day) in starter_habits]
+    activities = [(make_uuid(), habits[habit_idx][0], at(day, time_of_day))
+                  for (habit_idx, day, time_of_day) in starter_activities]
+    return habits, activities
+
+
+# Titles for generated habits
+habit_titles = [
+    "Jog", "Phone parents", "Read a novel", "Journal", "isiXhosa lesson", "Meditate", "Stretch", "Practise guitar",
+    "Water the plants", "Call a friend", "Cook something new", "Floss",
 ]
+
+# Generated datasets end here by default, rather than today, so that the same seed always gives the same dataset
+default_end = datetime(2024, 1, 1)
+
+seconds_per_day = 24 * 60 * 60
+
+# The bits of a 128-bit integer that mark it as a version 4 (random) UUID of the RFC 4122 variant
+uuid_version_mask = ~((0xf000 << 64) | (0xc000 << 48))
+uuid_version_bits = (0x4000 << 64) | (0x8000 << 48)
+
+
+def generate_dataset(num_habits: int = 10, years: float = 1, daily_fraction: float = 0.5, num_users: int = 1,
+                     diligence: float = 0.7, burstiness: float = 0.6, backdated_fraction: float = 0.1, seed: int = 0,
+                     end: datetime = default_end) -> tuple[list[tuple], Iterator[tuple]]:
+    """
+    Generate a realistic dataset of habits and their activities, at any scale.  The same arguments always give the same
+    dataset, e.g. `generate_dataset(10_000, years=5)` is "10k habits × 5 years".
+    Each habit is performed in a day/week (a period) or not according to a two-state Markov chain, so that it has
+    streaks and lapses rather than independently random gaps.  In a period in which it is performed, it is performed
+    once or a few times, around a time of day of its own.  Habits are created during the first fifth of the time span,
+    and some of them also get activities from before they were created (back-dated entries, as when a user records what
+    they did before they started tracking), which come after the habit's other activities, i.e. out of order.
+    The schema has no users, so "users" are only a way of grouping habits: each user has a diligence of their own,
+    around which the diligence of their habits varies, and their number is shown in the habits' titles.
+    :param num_habits: The number of habits to generate
+    :param years: How many years of history to generate, ending at `end`
+    :param daily_fraction: The fraction of habits that are daily (the rest are weekly)
+    :param num_users: The number of users to spread the habits across
+    :param diligence: The average fraction of periods in which a habit is performed
+    :param burstiness: Between 0 and 1 (exclusive): how strongly whether a habit is performed in one period carries
+        over to the next.  At 0 periods are independent, and close to 1 there are long streaks and long lapses.
+    :param backdated_fraction: The fraction of habits that get back-dated activities
+    :param seed: Seed for the random number generators
+    :param end: When the generated history ends (GMT)
+    :return: A tuple containing a list of habit records and a generator of activity records, shaped like the records in
+        the database (except that habits have no id): (uuid, title, recurrence, created_at) and (uuid, habit uuid,
+        performed_at as a POSIX timestamp).  Activities are generated one habit at a time, so they can be streamed.
+    """
+    rand = random.Random(seed)
+    end_timestamp = int((end - datetime(1970, 1, 1)).total_seconds())
+    start_timestamp = end_timestamp - int(years * 365.25 * seconds_per_day)
+    user_diligence = [clamp(rand.gauss(diligence, 0.15), 0.05, 0.98) for _ in range(num_users)]
+
+    habits = []
+    habit_params = []  # how each habit behaves, for generating its activities
+    for idx in range(num_habits):
+        user = idx % num_users
+        title = habit_titles[rand.randrange(len(habit_titles))]
+        recurrence = "daily" if rand.random() < daily_fraction else "weekly"
+        created_at = start_timestamp + rand.randrange(max(1, (end_timestamp - start_timestamp) // 5))
+        habits.append((
+            make_seeded_uuid(rand),
+            f"{title} (user {user + 1})" if num_users > 1 else title,
+            recurrence,
+            time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(created_at)),
+        ))
+        habit_params.append((
+            created_at,
+            clamp(rand.gauss(user_diligence[user], 0.1), 0.02, 0.99),
+            rand.randrange(5 * 60 * 60, 22 * 60 * 60),  # the time of day it's usually performed at
+            rand.random() < backdated_fraction,
+        ))
+
+    def generate_activities():
+        # A generator of its own, so that the activities don't depend on how much of them is consumed
+        activity_rand = random.Random(f"{seed}-activities")
+        for (habit, (created_at, habit_diligence, time_of_day, backdated)) in zip(habits, habit_params):
+            period_length = seconds_per_day if habit[2] == "daily" else 7 * seconds_per_day
+            first_period = created_at - created_at % seconds_per_day
+            yield from generate_habit_activities(activity_rand, habit[0], habit[2], first_period, end_timestamp,
+                                                 period_length, habit_diligence, burstiness, time_of_day)
+            if backdated:
+                num_periods = activity_rand.randint(1, 30 if habit[2] == "daily" else 8)
+                yield from generate_habit_activities(activity_rand, habit[0], habit[2],
+                                                     first_period - num_periods * period_length, first_period,
+                                                     period_length, habit_diligence, burstiness, time_of_day)
+
+    return habits, generate_activities()
+
+
+def generate_habit_activities(rand: random.Random, habit_uuid: str, recurrence: str, start: int, end: int,
+                              period_length: int, diligence: float, burstiness: float, time_of_day: int):
+    """
+    Generate the activities of one habit, in order of time (see `generate_dataset()`).
+    :param start: The start of the first period, as a POSIX timestamp (the start of a day, GMT)
+    :param end: The end of the time span, as a POSIX timestamp
+    :return: A generator of activity records
+    """
+    # The chance of being performed in a period, given whether it was performed in the one before.  These keep the
+    # long-run fraction of periods performed at `diligence`, with `burstiness` as the correlation between periods.
+    p_after_performed = diligence + burstiness * (1 - diligence)
+    p_after_skipped = diligence * (1 - burstiness)
+
+    performed = rand.random() < diligence
+    for period_start in range(start, end, period_length):
+        performed = rand.random() < (p_after_performed if performed else p_after_skipped)
+        if not performed:
+            continue
+
+        num_times = 1 + (rand.random() < 0.1) if recurrence == "daily" else rand.choice((1, 1, 1, 2, 2, 3))
+        for _ in range(num_times):
+            day = period_start if recurrence == "daily" else period_start + rand.randrange(7) * seconds_per_day
+            second = int(clamp(rand.gauss(time_of_day, 90 * 60), 0, seconds_per_day - 1))
+            if day + second < end:
+                yield make_seeded_uuid(rand), habit_uuid, day + second
+
+
+def make_seeded_uuid(rand: random.Random):
+    """
+    :return: A random (version 4) UUID drawn from `rand`, so that it is the same each time for the same seed.  This is
+        the same as `str(UUID(int=rand.getrandbits(128), version=4))`, but over twice as fast, which matters when
+        generating millions of activities.
+    """
+    digits = f"{rand.getrandbits(128) & uuid_version_mask | uuid_version_bits:032x}"
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+
+def clamp(value: float, lowest: float, highest: float):
+    return max(lowest, min(highest, value))
+
+
+def write_fixture(directory: str, habits: list[tuple], activities: Iterator[tuple]):
+    """
+    Write a dataset (e.g. from `generate_dataset()`) to fixture files in a directory: habits.csv and activities.csv,
+    with datetimes written as GMT strings in the format YYYY-mm-DD HH:MM:SS.
+    :param directory: The directory to write the files to (which is created if need be)
+    :param habits: Habit records
+    :param activities: Activity records, whose times may be POSIX timestamps or GMT datetime strings
+    :return: A tuple containing the number of habits and the number of activities written
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "habits.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("uuid", "title", "recurrence", "created_at"))
+        writer.writerows(habits)
+
+    num_activities = 0
+    with open(os.path.join(directory, "activities.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("uuid", "habit", "performed_at"))
+        for (uuid, habit_uuid, performed_at) in activities:
+            if isinstance(performed_at, int):
+                performed_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(performed_at))
+            writer.writerow((uuid, habit_uuid, performed_at))
+            num_activities += 1
+
+    return len(habits), num_activities
+
+
+def read_fixture(directory: str) -> tuple[list[tuple], Iterator[tuple]]:
+    """
+    Read a dataset from the fixture files written by `write_fixture()`.
+    :param directory: The directory containing the files
+    :return: A tuple containing a list of habit records and a generator of activity records (whose times are GMT
+        datetime strings), which reads the file as it goes
+    """
+    with open(os.path.join(directory, "habits.csv"), newline="") as file:
+        reader = csv.reader(file)
+        next(reader)  # the header
+        habits = [tuple(row) for row in reader]
+
+    def read_activities():
+        with open(os.path.join(directory, "activities.csv"), newline="") as activities_file:
+            activities_reader = csv.reader(activities_file)
+            next(activities_reader)
+            yield from (tuple(row) for row in activities_reader)
+
+    return habits, read_activities()
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset of habits and activities, and write it "
+                                                 "to a database and/or fixture files")
+    parser.add_argument("--habits", type=int, default=10_000)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--daily-fraction", type=float, default=0.5)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--diligence", type=float, default=0.7)
+    parser.add_argument("--burstiness", type=float, default=0.6)
+    parser.add_argument("--backdated-fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="SQLite database to add the dataset to (its tables are set up if need be)")
+    parser.add_argument("--fixture", help="directory to write habits.csv and activities.csv to")
+    args = parser.parse_args(args)
+    if args.db is None and args.fixture is None:
+        parser.error("nowhere to write the dataset: give --db and/or --fixture")
+
+    def generate():
+        return generate_dataset(args.habits, args.years, args.daily_fraction, args.users, args.diligence,
+                                args.burstiness, args.backdated_fraction, args.seed)
+
+    if args.fixture is not None:
+        (num_habits, num_activities) = write_fixture(args.fixture, *generate())
+        print(f"Wrote {num_habits} habits and {num_activities} activities to {args.fixture}")
+    if args.db is not None:
+        db.connect(args.db, profile="bulk-import")
+        db.setup_tables()
+        (num_habits, num_activities) = db.import_dataset(*generate())
+        db.disconnect()
+        print(f"Added {num_habits} habits and {num_activities} activities to {args.db}")
+
+
+if __name__ == "__main__":
+    main()
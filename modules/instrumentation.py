@@ -0,0 +1,354 @@
+"""
+Timing and query counts for the hot paths of the app, for finding out where the time goes (e.g. when the stats screen is
+slow).  While instrumentation is enabled (see `enable()`):
+ - every SQL statement run on a connection of the database's pool is counted, by its text (with the values of its
+   parameters taken out, so that the runs of one query are counted together).  Python's `sqlite3` reports the triggers
+   a statement fires (and its foreign key actions) under the statement's own text, so these count as extra runs of it.
+ - the public functions of `db`, `utils` and `analytics`, and the public methods of `Habit`, are timed, along with the
+   number of SQL statements each call ran
+The timings of each function are gathered into a `Histogram`, and `get_report()` sums it all up.
+
+Nothing is wrapped until instrumentation is enabled, and `disable()` puts the original functions back, so it costs
+nothing while it is off.  While it is on, every call to an instrumented function pays for a couple of clock reads (and
+the hot `utils` functions are called once per activity), so the timings are best compared with one another rather than
+with timings taken without instrumentation.  Work done in the worker processes of `analytics.get_habits_from_models()`
+isn't recorded.
+"""
+import functools
+import inspect
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from modules import db
+
+# The modules (by name) whose public functions are timed, and the classes (by module and class name) whose public
+# methods are timed.  Functions that are only used to set the app up, or that are too small to be worth timing, are left
+# out.
+instrumented_modules = {
+    "modules.db": ("connect", "disconnect", "get_connection", "transaction", "configure_connection",
+                   "apply_pragma_profile", "get_local_period_ordinal_sql"),
+    "modules.utils": ("make_uuid", "get_local_timezone_key"),
+    "modules.analytics": (),
+}
+instrumented_classes = {
+    ("classes.habit", "Habit"): ("get_uuid", "get_title", "get_recurrence", "get_created_at"),
+}
+
+# Only functions and classes from these packages are instrumented, and only their modules' references to the functions
+# are replaced (see `enable()`)
+app_packages = ("modules.", "classes.")
+
+# Statements longer than this are cut short in the report
+max_statement_length = 100
+
+# SQLite reports statements with the values of their parameters filled in, as string and number literals
+whitespace_pattern = re.compile(r"\s+")
+literal_pattern = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# The state of the instrumentation: whether it is enabled, the functions it has replaced (so that they can be put back)
+# and what it has recorded so far.  The lock guards the recorded data, which may come from several threads at once.
+enabled = False
+replaced = []
+histograms: dict[str, "Histogram"] = {}
+statement_counts: dict[str, int] = {}
+lock = threading.Lock()
+
+# The number of statements the current thread has run, for working out how many each timed call ran
+local = threading.local()
+
+
+class Histogram:
+    """
+    The distribution of the times taken by many calls of one function.  Times are counted in buckets that double in
+    size, i.e. bucket `n` counts the calls that took from 2^(n-1) up to 2^n microseconds (with bucket 0 for calls under
+    a microsecond), so that percentiles can be estimated without keeping every time.
+    """
+    __slots__ = ("count", "total", "min", "max", "statements", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.statements = 0
+        self.buckets = {}
+
+    def add(self, seconds: float, statements: int = 0):
+        """
+        Record a call.
+        :param seconds: How long the call took
+        :param statements: How many SQL statements the call ran
+        :return: None
+        """
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        self.statements += statements
+        bucket = int(seconds * 1_000_000).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def get_mean(self):
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def get_percentile(self, percentile: float):
+        """
+        :param percentile: E.g. 95 for the time that 95% of the calls took at most
+        :return: An estimate of the percentile in seconds (the upper bound of the bucket it falls in, capped at the
+            slowest call), or 0 if no calls have been recorded
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = percentile / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min((1 << bucket) / 1_000_000, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.get_mean(),
+            "min": self.min,
+            "p50": self.get_percentile(50),
+            "p95": self.get_percentile(95),
+            "max": self.max,
+            "statements": self.statements,
+            "buckets": {f"<{1 << bucket}us": count for (bucket, count) in sorted(self.buckets.items())},
+        }
+
+
+def enable():
+    """
+    Start timing the instrumented functions and counting SQL statements.  Connections that are already open are traced
+    from now on, as are those the database opens later.  Enabling it again has no effect.
+    :return: None
+    """
+    global enabled
+    if enabled:
+        return
+    enabled = True
+
+    for (module_name, excluded) in instrumented_modules.items():
+        module = import_module(module_name)
+        for (name, func) in list(vars(module).items()):
+            if is_public_function(func, module_name) and name not in excluded:
+                wrapper = instrument_function(func, f"{module_name.rsplit('.', 1)[-1]}.{name}")
+                replace_references(func, wrapper)
+
+    for ((module_name, class_name), excluded) in instrumented_classes.items():
+        cls = getattr(import_module(module_name), class_name)
+        for (name, attribute) in list(vars(cls).items()):
+            if name.startswith("_") or name in excluded:
+                continue
+            # Class and static methods are wrapped inside their decorators, so that they still bind in the same way
+            func = attribute.__func__ if isinstance(attribute, (classmethod, staticmethod)) else attribute
+            if not inspect.isfunction(func):
+                continue
+            wrapper = instrument_function(func, f"{class_name}.{name}")
+            replace_attribute(cls, name, type(attribute)(wrapper) if func is not attribute else wrapper)
+
+    if db.default_pool is not None:
+        for connection in db.default_pool.get_connections():
+            trace_connection(connection)
+
+
+def disable():
+    """
+    Stop timing and counting, putting the original functions back.  What has been recorded is kept until `reset()`.
+    :return: None
+    """
+    global enabled
+    if not enabled:
+        return
+    enabled = False
+
+    while len(replaced) > 0:
+        (namespace, name, original) = replaced.pop()
+        setattr(namespace, name, original)
+
+    if db.default_pool is not None:
+        for connection in db.default_pool.get_connections():
+            connection.set_trace_callback(None)
+
+
+def is_enabled():
+    return enabled
+
+
+def reset():
+    """
+    Forget everything that has been recorded so far.
+    :return: None
+    """
+    with lock:
+        histograms.clear()
+        statement_counts.clear()
+
+
+def trace_connection(connection: sqlite3.Connection):
+    """
+    Count the statements run on a connection.  The database calls this for each connection it opens while
+    instrumentation is enabled.
+    :param connection: A connection of the database's pool
+    :return: None
+    """
+    connection.set_trace_callback(count_statement)
+
+
+def count_statement(statement: str):
+    """
+    The trace callback of the instrumented connections, which SQLite calls as each statement starts running (including
+    once per row of an `executemany()`).
+    :param statement: The statement's SQL, with its parameters
+    :return: None
+    """
+    local.statements = getattr(local, "statements", 0) + 1
+    key = literal_pattern.sub("?", whitespace_pattern.sub(" ", statement).strip())[:max_statement_length]
+    with lock:
+        statement_counts[key] = statement_counts.get(key, 0) + 1
+
+
+def record(name: str, seconds: float, statements: int = 0):
+    """
+    Add a call to the histogram of the given name (e.g. to time a block that isn't a function of its own).
+    :param name: The name of what was timed, e.g. "db.get_habit"
+    :param seconds: How long it took
+    :param statements: How many SQL statements it ran
+    :return: None
+    """
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(seconds, statements)
+
+
+def get_histograms() -> dict[str, Histogram]:
+    """
+    :return: A copy of the histograms recorded so far, keyed by the name of the function (e.g. "Habit.perform")
+    """
+    with lock:
+        return dict(histograms)
+
+
+def get_statement_counts() -> dict[str, int]:
+    """
+    :return: The number of times each SQL statement has run so far, keyed by the statement (with its literals replaced
+        by "?" and its whitespace collapsed, and cut short if it is long)
+    """
+    with lock:
+        return dict(statement_counts)
+
+
+def get_report():
+    """
+    :return: A dictionary object containing "functions", a list of the histograms (as dictionaries, with a "name") in
+        order of total time, most first, and "statements", a list of tuples each containing a statement and the number
+        of times it ran, most first
+    """
+    functions = [{"name": name, **histogram.to_dict()} for (name, histogram) in get_histograms().items()]
+    return {
+        "functions": sorted(functions, key=lambda f: f["total"], reverse=True),
+        "statements": sorted(get_statement_counts().items(), key=lambda s: s[1], reverse=True),
+    }
+
+
+def format_report(max_statements: int = 20):
+    """
+    :param max_statements: How many of the most-run statements to list
+    :return: The report (see `get_report()`) as a table, for printing
+    """
+    report = get_report()
+    lines = [f"{'function':<45} {'calls':>9} {'total ms':>10} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} "
+             f"{'max ms':>8} {'stmts/call':>10}"]
+    for f in report["functions"]:
+        lines.append(f"{f['name']:<45} {f['count']:>9} {f['total'] * 1000:>10.2f} {f['mean'] * 1000:>9.3f} "
+                     f"{f['p50'] * 1000:>8.3f} {f['p95'] * 1000:>8.3f} {f['max'] * 1000:>8.3f} "
+                     f"{f['statements'] / f['count']:>10.1f}")
+
+    lines.append("")
+    lines.append(f"{'count':>9}  statement")
+    for (statement, count) in report["statements"][:max_statements]:
+        lines.append(f"{count:>9}  {statement}")
+    return "\n".join(lines)
+
+
+def instrument_function(func, name: str):
+    """
+    :param func: A function to time
+    :param name: The name to record its calls under
+    :return: A function that calls `func` and records how long it took.  The calls of a generator function are timed
+        for as long as it takes to produce each item (but not while the caller works on the items), and recorded once
+        the generator is done.
+    """
+    clock = time.perf_counter
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            (elapsed, statements) = (0.0, 0)
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    (start, start_statements) = (clock(), getattr(local, "statements", 0))
+                    try:
+                        item = next(generator)
+                    finally:
+                        elapsed += clock() - start
+                        statements += getattr(local, "statements", 0) - start_statements
+                    yield item
+            except StopIteration:
+                return
+            finally:
+                generator.close()
+                record(name, elapsed, statements)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        (start, start_statements) = (clock(), getattr(local, "statements", 0))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, clock() - start, getattr(local, "statements", 0) - start_statements)
+    return wrapper
+
+
+def is_public_function(value, module_name: str):
+    """
+    :return: Whether `value` is a public function defined in the given module (rather than imported into it)
+    """
+    return inspect.isfunction(value) and value.__module__ == module_name and not value.__name__.startswith("_")
+
+
+def import_module(module_name: str):
+    __import__(module_name)
+    return sys.modules[module_name]
+
+
+def replace_attribute(namespace, name: str, value):
+    # Not `getattr()`, which would give a class's methods already bound
+    replaced.append((namespace, name, vars(namespace)[name]))
+    setattr(namespace, name, value)
+
+
+def replace_references(func, wrapper):
+    """
+    Replace a function with its wrapper in every module of the app that refers to it, i.e. the module that defines it
+    and those that import it by name (e.g. `from modules.db import get_habit`).
+    :return: None
+    """
+    for module in list(sys.modules.values()):
+        if module is None or not module.__name__.startswith(app_packages):
+            continue
+        for (name, value) in list(vars(module).items()):
+            if value is func:
+                replace_attribute(module, name, wrapper)
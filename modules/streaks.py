@@ -0,0 +1,185 @@
+from bisect import bisect_left, bisect_right
+from typing import Sequence
+
+from modules import utils
+
+
+def find_runs(active_periods: Sequence[tuple[int, int, int]]):
+    """
+    Find the runs of consecutive periods (days/weeks) in which a habit was performed, in a single pass.  This is the
+    engine behind all the streak calculations.
+    :param active_periods: The periods in which the habit was performed, in ascending order, as returned by
+        `utils.group_timestamps_by_performance_period()`
+    :return: A dictionary object with
+        * "runs": A list of tuples in chronological order, one per run.  Each tuple holds the ordinals of the first and
+        last periods of the run, followed by the timestamps of the first performance in the first period and the last
+        performance in the last period.  A run may be a single period long.
+        * "latest": The most recent run (or None if the habit was never performed)
+        * "longest": The run spanning the most periods, taking the earliest one if there is a tie (or None if the habit
+        was never performed)
+    """
+    runs = []
+    longest = None
+
+    for (period, first_timestamp, last_timestamp) in active_periods:
+        if len(runs) > 0 and runs[-1][1] == period - 1:  # this period carries on the run we're observing
+            runs[-1] = (runs[-1][0], period, runs[-1][2], last_timestamp)
+        else:
+            if len(runs) > 0 and (longest is None or get_run_length(runs[-1]) > get_run_length(longest)):
+                longest = runs[-1]
+            runs.append((period, period, first_timestamp, last_timestamp))
+
+    # The final run was never compared against the longest one, since no period came along to end it
+    if len(runs) > 0 and (longest is None or get_run_length(runs[-1]) > get_run_length(longest)):
+        longest = runs[-1]
+
+    return {
+        "runs": runs,
+        "latest": runs[-1] if len(runs) > 0 else None,
+        "longest": longest,
+    }
+
+
+def get_run_length(run: tuple[int, int, int, int]):
+    """
+    :param run: A run of consecutive periods, as found by `find_runs()`
+    :return: The number of periods (days/weeks) in the run
+    """
+    return run[1] - run[0] + 1
+
+
+def get_run_params(run: tuple[int, int, int, int]):
+    """
+    Describe a run of consecutive periods the way streaks are presented everywhere else.
+    :param run: A run of consecutive periods, as found by `find_runs()`
+    :return: A dictionary object containing the accurate start and end dates of the streak (local time), and the length
+        of the streak
+    """
+    return {
+        "start": utils.timestamp_to_datetime(run[2]),
+        "end": utils.timestamp_to_datetime(run[3]),
+        "length": get_run_length(run),
+    }
+
+
+class StreakIndex:
+    """
+    The runs of consecutive periods (days/weeks) in which a habit was performed, kept up to date as the habit is
+    performed so that the streak queries don't need to look at every activity each time.  The runs are stored as
+    parallel lists in chronological order, which can be searched with `bisect`.
+    """
+    __slots__ = ("__recurrence__", "__starts__", "__ends__", "__first_timestamps__", "__last_timestamps__",
+                 "__longest_start__")
+
+    def __init__(self, habit_recurrence: str, timestamps: Sequence[int] = ()):
+        """
+        :param habit_recurrence: i.e. "daily" or "weekly"
+        :param timestamps: When the habit has been performed so far, as POSIX timestamps sorted in ascending order
+        """
+        self.__load__(habit_recurrence, utils.group_timestamps_by_performance_period(timestamps, habit_recurrence))
+
+    @classmethod
+    def from_active_periods(cls, habit_recurrence: str, active_periods: Sequence[tuple[int, int, int]]):
+        """
+        Create the index from the periods the habit was performed in, e.g. as stored in the `habit_periods` table.
+        :param habit_recurrence: i.e. "daily" or "weekly"
+        :param active_periods: The periods in which the habit was performed, in ascending order, as returned by
+            `utils.group_timestamps_by_performance_period()`
+        :return: The new `StreakIndex`
+        """
+        index = cls.__new__(cls)
+        index.__load__(habit_recurrence, active_periods)
+        return index
+
+    def __load__(self, habit_recurrence: str, active_periods: Sequence[tuple[int, int, int]]):
+        self.__recurrence__ = habit_recurrence
+        result = find_runs(active_periods)
+        self.__starts__ = [run[0] for run in result["runs"]]
+        self.__ends__ = [run[1] for run in result["runs"]]
+        self.__first_timestamps__ = [run[2] for run in result["runs"]]
+        self.__last_timestamps__ = [run[3] for run in result["runs"]]
+        # Runs are identified by the period they start in, since no two runs can start in the same period
+        self.__longest_start__ = result["longest"][0] if result["longest"] is not None else None
+
+    def __len__(self):
+        return len(self.__starts__)
+
+    def get_run(self, idx: int):
+        """
+        :param idx: The position of the run (in chronological order)
+        :return: The run, as a tuple like the ones returned by `find_runs()`
+        """
+        return self.__starts__[idx], self.__ends__[idx], self.__first_timestamps__[idx], self.__last_timestamps__[idx]
+
+    def get_runs(self):
+        """
+        :return: All the runs, in chronological order, as tuples like the ones returned by `find_runs()`
+        """
+        return list(zip(self.__starts__, self.__ends__, self.__first_timestamps__, self.__last_timestamps__))
+
+    def get_latest_run(self):
+        """
+        :return: The most recent run (or None if the habit was never performed)
+        """
+        return self.get_run(-1) if len(self.__starts__) > 0 else None
+
+    def get_longest_run(self):
+        """
+        :return: The run spanning the most periods, taking the earliest one if there is a tie (or None if the habit was
+            never performed)
+        """
+        if self.__longest_start__ is None:
+            return None
+
+        return self.get_run(bisect_left(self.__starts__, self.__longest_start__))
+
+    def add(self, timestamp: int):
+        """
+        Record another performance of the habit.  Performances normally come after all the existing ones, which only
+        ever touches the latest run, so costs O(1).  Back-dated performances are located with a binary search and can
+        extend a run, merge the two runs either side of them, or start a new run.  (Adding a performance can never split
+        a run.)
+        :param timestamp: When the habit was performed, as a POSIX timestamp
+        :return: None
+        """
+        period = utils.get_performance_period(timestamp, self.__recurrence__)
+        idx = bisect_right(self.__starts__, period) - 1  # the last run that starts on or before `period`
+
+        if idx >= 0 and period <= self.__ends__[idx]:  # `period` is already part of this run
+            if period == self.__starts__[idx] and timestamp < self.__first_timestamps__[idx]:
+                self.__first_timestamps__[idx] = timestamp
+            if period == self.__ends__[idx] and timestamp > self.__last_timestamps__[idx]:
+                self.__last_timestamps__[idx] = timestamp
+            return
+
+        # Note the longest run before the runs change, since changing them can move the period the longest run starts in
+        longest = self.get_longest_run()
+
+        extends_previous = idx >= 0 and self.__ends__[idx] == period - 1
+        extends_next = idx + 1 < len(self.__starts__) and self.__starts__[idx + 1] == period + 1
+
+        if extends_previous and extends_next:  # `period` fills the gap between two runs, so they become one
+            self.__ends__[idx] = self.__ends__[idx + 1]
+            self.__last_timestamps__[idx] = self.__last_timestamps__[idx + 1]
+            for column in (self.__starts__, self.__ends__, self.__first_timestamps__, self.__last_timestamps__):
+                del column[idx + 1]
+        elif extends_previous:
+            self.__ends__[idx] = period
+            self.__last_timestamps__[idx] = timestamp
+        elif extends_next:
+            idx += 1
+            self.__starts__[idx] = period
+            self.__first_timestamps__[idx] = timestamp
+        else:  # a run of its own
+            idx += 1
+            self.__starts__.insert(idx, period)
+            self.__ends__.insert(idx, period)
+            self.__first_timestamps__.insert(idx, timestamp)
+            self.__last_timestamps__.insert(idx, timestamp)
+
+        # Runs only ever grow, so the run that changed is the only one that can have become the longest.  (If the
+        # changed run took in the previous longest run, it is now strictly longer than it.)
+        run = self.get_run(idx)
+        if longest is None or get_run_length(run) > get_run_length(longest) \
+                or (get_run_length(run) == get_run_length(longest) and run[0] < longest[0]):
+            self.__longest_start__ = run[0]
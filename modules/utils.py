@@ -1,8 +1,43 @@
-from uuid import uuid4
+import re
+import time
+from uuid import UUID, uuid4
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Sequence, Iterable, Union
 from math import floor
-from functools import reduce
+from array import array
+
+# numpy is optional; without it, batches of timestamps are decoded one at a time.  It takes longer to import than the
+# rest of the app put together, so it is only imported the first time a batch is big enough to need it (see
+# `load_numpy()`).
+numpy = None
+numpy_loaded = False
+
+# Used to decode the datetime strings stored in the database (which are GMT) without going through `strptime()`
+gmt_epoch = datetime(1970, 1, 1)
+one_second = timedelta(seconds=1)
+parse_iso_datetime = datetime.fromisoformat
+
+# The form of the uuids `make_uuid()` gives, which is the form activities' uuids are stored in
+canonical_uuid_pattern = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+# Batches of at least this many datetime strings are decoded with numpy (if it is installed)
+numpy_batch_threshold = 256
+
+
+def load_numpy():
+    """
+    Import numpy, if that hasn't been done already.
+    :return: The numpy module, or None if it isn't installed
+    """
+    global numpy, numpy_loaded
+    if not numpy_loaded:
+        numpy_loaded = True
+        try:
+            import numpy as numpy_module
+            numpy = numpy_module
+        except ImportError:
+            pass
+    return numpy
 
 
 def make_uuid():
@@ -13,6 +48,20 @@ def make_uuid():
     return str(uuid4())
 
 
+def normalise_uuid(uuid: str):
+    """
+    :param uuid: A UUID in any of the forms `uuid.UUID` accepts, e.g. in upper case or without hyphens
+    :return: The UUID in the form `make_uuid()` gives (lower case, with hyphens)
+    :raise ValueError: If it isn't a UUID
+    """
+    if canonical_uuid_pattern.fullmatch(uuid):  # nearly always the case, and much quicker to check
+        return uuid
+    try:
+        return str(UUID(uuid))
+    except ValueError:
+        raise ValueError(f"'{uuid}' isn't a UUID") from None
+
+
 def get_as_local_time(dt_as_gmt: datetime):
     """
     Converts a GMT datetime to a datetime in the local timezone
@@ -22,6 +71,15 @@ def get_as_local_time(dt_as_gmt: datetime):
     return datetime.fromtimestamp(dt_as_gmt.timestamp())
 
 
+def get_local_timezone_key():
+    """
+    Identify the local timezone of the process, i.e. the one SQLite's "localtime" modifier uses, e.g. so that stats
+    that depend on which day/week activities fall into aren't reused after the timezone changes.
+    :return: A string such as "GMT/BST/0/-3600"
+    """
+    return f"{time.tzname[0]}/{time.tzname[1]}/{time.timezone}/{time.altzone}"
+
+
 def get_as_gmt(local_dt: datetime):
     """
     Converts a datetime into its GMT equivalent
@@ -37,10 +95,16 @@ def format_date_for_db(dt_string: str):
     :param dt_string: A datetime string that is naive (assumes the local timezone)
     :return: A GMT datetime string that looks like 2023-01-20 00:57:12
     """
-    return datetime.strftime(       # (3) format correctly for db
-        get_as_gmt(                 # (2) turn into GMT datetime object
-            to_datetime(dt_string)  # (1) turn into naive datetime object (assumes local timezone)
-        ), "%Y-%m-%d %H:%M:%S")
+    return format_datetime_for_db(to_datetime(dt_string))  # naive datetime object (assumes local timezone)
+
+
+def format_datetime_for_db(local_dt: datetime):
+    """
+    Turns the provided datetime into a GMT datetime string in the correct format for the database
+    :param local_dt: A naive datetime object (assumes the local timezone)
+    :return: A GMT datetime string that looks like 2023-01-20 00:57:12
+    """
+    return datetime.strftime(get_as_gmt(local_dt), "%Y-%m-%d %H:%M:%S")
 
 
 def to_datetime(datetime_str: str, is_gmt: bool = False):
@@ -52,12 +116,59 @@ def to_datetime(datetime_str: str, is_gmt: bool = False):
     :return: The corresponding datetime object (local timezone)
     """
     if is_gmt:
-        gmt_dt = datetime.strptime(f"{datetime_str}+0000", "%Y-%m-%d %H:%M:%S%z")
-        return get_as_local_time(gmt_dt)
+        return timestamp_to_datetime(to_timestamp(datetime_str))
 
     return datetime.strptime(f"{datetime_str}", "%Y-%m-%d %H:%M:%S")
 
 
+def to_timestamp(datetime_str: Union[str, int]):
+    """
+    Take a GMT date/time string (as stored in the database) and convert it into the number of seconds since the epoch.
+    :param datetime_str: e.g. "2023-10-05 12:00:54", which is how dates used to be stored in the database (GMT).  The
+        times of activities are now stored as POSIX timestamps already, and these are returned as they are.
+    :return: The corresponding POSIX timestamp, as an integer
+    """
+    if isinstance(datetime_str, int):
+        return datetime_str
+
+    # The string has a fixed ISO layout and no timezone, so the (C-implemented) ISO parser can read it as a naive
+    # datetime, and its distance from the epoch is the timestamp.  No local timezone is involved at any point.
+    return (parse_iso_datetime(datetime_str) - gmt_epoch) // one_second
+
+
+def to_timestamps(datetime_strs: Sequence[Union[str, int]]):
+    """
+    Take a whole column of GMT date/time strings (as stored in the database) and convert them into the number of
+    seconds since the epoch.
+    :param datetime_strs: e.g. ["2023-10-05 12:00:54", "2023-10-06 08:21:30"], or POSIX timestamps (as the times of
+        activities are now stored in the database), which are simply copied
+    :return: An array of 64-bit integers containing the corresponding POSIX timestamps, in the same order
+    """
+    if len(datetime_strs) > 0 and isinstance(datetime_strs[0], int):
+        try:
+            return array("q", datetime_strs)
+        except TypeError:  # a mix of timestamps and strings
+            pass
+
+    timestamps = array("q")
+    if (len(datetime_strs) >= numpy_batch_threshold and isinstance(datetime_strs[0], str)
+            and load_numpy() is not None):
+        # numpy parses the whole batch at once into seconds since the epoch
+        timestamps.frombytes(numpy.array(datetime_strs, dtype="datetime64[s]").astype(numpy.int64).tobytes())
+    else:
+        timestamps.extend(map(to_timestamp, datetime_strs))
+    return timestamps
+
+
+def timestamp_to_datetime(timestamp: int):
+    """
+    Take a POSIX timestamp and convert it into a naive datetime object
+    :param timestamp: The number of seconds since the epoch
+    :return: The corresponding datetime object (local timezone)
+    """
+    return datetime.fromtimestamp(timestamp)
+
+
 def to_date_only_string(dt: datetime):
     """
     Get a date-only string from `dt`, a datetime object.
@@ -145,7 +256,7 @@ def add_interval(date_a: str, interval_type: str, num_intervals: int):
     return to_date_only_string(return_dt)
 
 
-def group_activities_by_performance_period(activities: list[object], habit_recurrence: str,
+def group_activities_by_performance_period(activities: Iterable[object], habit_recurrence: str,
                                            start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
     """
     Group activities by the day or week in which they were performed.
@@ -158,35 +269,93 @@ def group_activities_by_performance_period(activities: list[object], habit_recur
         the Monday of a week in which the habit was performed.
         * Value: The list of performances of the habit (Activity models) that occurred in that day/week.
     """
-    def make_date_range_fn(start: Optional[datetime], end: Optional[datetime]):
-        if start is not None and end is not None:  # both bounds explicitly given
-            return lambda x: start <= x.get_performed_at() <= end
-        if start is None and end is None:  # no explicit bounds, so let everything through
-            return lambda x: True
-        if start is None:  # no lower bound, but upper bound defined
-            return lambda x: x.get_performed_at() <= end
-        if end is None:  # no upper bound, but lower bound is defined
-            return lambda x: x.get_performed_at() >= start
-    check_date_in_range = make_date_range_fn(start_date, end_date)
-    filtered_activities = filter(check_date_in_range, activities)
-
-    augmented_activities = map(
-        lambda x: dict({
-            "model": x,
-            "performance_period": to_date_only_string(
-                x.get_performed_at() if habit_recurrence == "daily"
-                else get_week_start_date(x.get_performed_at())
-            )
-        }), filtered_activities)
-
-    def group_by_date(grouped, activity):
-        curr_date = activity["performance_period"]
-        if curr_date not in grouped:
-            grouped[curr_date] = []
-        grouped[curr_date].append(activity["model"])
-        return grouped
-
-    return reduce(group_by_date, augmented_activities, {})
+    grouped = {}  # keyed by period ordinal while grouping; only turned into date strings at the end
+    for activity in activities:
+        performed_at = activity.get_performed_at()
+        if (start_date is not None and performed_at < start_date) or (end_date is not None and performed_at > end_date):
+            continue
+
+        period = get_period_ordinal(performed_at, habit_recurrence)
+        if period not in grouped:
+            grouped[period] = []
+        grouped[period].append(activity)
+
+    return {
+        to_date_only_string(get_period_start_date(period, habit_recurrence)): activities_in_period
+        for (period, activities_in_period) in grouped.items()
+    }
+
+
+def get_period_ordinal(dt: datetime, habit_recurrence: str):
+    """
+    Find the day or week that `dt` falls in, as an integer that goes up by 1 from one day/week to the next, so that
+    consecutive periods can be recognised with simple arithmetic.
+    :param dt: A datetime object (local time)
+    :param habit_recurrence: i.e. "daily" or "weekly"
+    :return: For daily habits, the ordinal of the day (where 1 January of year 1 is day 1; see `date.toordinal()`).  For
+        weekly habits, the ordinal of the Monday-to-Sunday week (where the week beginning on Monday 1 January of year 1
+        is week 0).
+    """
+    day = dt.toordinal()
+    return day if habit_recurrence == "daily" else (day - 1) // 7
+
+
+def get_period_start_date(period: int, habit_recurrence: str):
+    """
+    The reverse of `get_period_ordinal()`.
+    :param period: The ordinal of a day or week
+    :param habit_recurrence: i.e. "daily" or "weekly"
+    :return: A datetime object for midnight at the start of the day/week (local time).  For weekly habits, this is on
+        the Monday of the week.
+    """
+    return datetime.fromordinal(period if habit_recurrence == "daily" else 7 * period + 1)
+
+
+def get_performance_period(timestamp: int, habit_recurrence: str):
+    """
+    Find the day or week in which a habit was performed.
+    :param timestamp: When the habit was performed, as a POSIX timestamp
+    :param habit_recurrence: i.e. "daily" or "weekly"
+    :return: The ordinal of the day/week (see `get_period_ordinal()`)
+    """
+    return get_period_ordinal(timestamp_to_datetime(timestamp), habit_recurrence)
+
+
+def group_timestamps_by_performance_period(timestamps: Sequence[int], habit_recurrence: str):
+    """
+    Group the performances of a habit by the day or week in which they happened, keeping only the first and last
+    performance of each period.  This is done in a single pass, relying on the timestamps being sorted.
+    :param timestamps: When the habit was performed, as POSIX timestamps sorted in ascending order
+    :param habit_recurrence: i.e. "daily" or "weekly"
+    :return: A list of tuples in ascending order of period, one per day/week in which the habit was performed.  Each
+        tuple holds the ordinal of the day/week (see `get_period_ordinal()`), followed by the timestamps of the first
+        and last performances in that day/week.
+    """
+    grouped = []
+    for timestamp in timestamps:
+        period = get_performance_period(timestamp, habit_recurrence)
+        if len(grouped) > 0 and grouped[-1][0] == period:
+            grouped[-1] = (period, grouped[-1][1], timestamp)
+        else:
+            grouped.append((period, timestamp, timestamp))
+    return grouped
+
+
+def get_streak_params(accurate_start: datetime, accurate_end: datetime, habit_recurrence: str):
+    """
+    Describe a streak given its first and last performance.
+    :param accurate_start: The first performance of the streak (local time)
+    :param accurate_end: The last performance of the streak (local time)
+    :param habit_recurrence: i.e. "daily" or "weekly"
+    :return: A dictionary object containing the accurate start and end dates of the streak, and the length of the streak
+    """
+    length = get_num_days_from_to(accurate_start, accurate_end) if habit_recurrence == "daily" \
+        else get_num_weeks_from_to(accurate_start, accurate_end)
+    return {
+        "start": accurate_start,
+        "end": accurate_end,
+        "length": length,
+    }
 
 
 def get_streak_accurate_params(start_date_activities: list, end_date_activities: list, habit: object):
@@ -202,15 +371,8 @@ def get_streak_accurate_params(start_date_activities: list, end_date_activities:
     first_activity = sorted(start_date_activities, key=lambda activity: activity.get_performed_at())[0]
     last_activity = sorted(end_date_activities, key=lambda activity: activity.get_performed_at())[-1]
 
-    accurate_start = first_activity.get_performed_at()
-    accurate_end = last_activity.get_performed_at()
-    length = get_num_days_from_to(accurate_start, accurate_end) if habit.get_recurrence() == "daily" \
-        else get_num_weeks_from_to(accurate_start, accurate_end)
-    return {
-        "start": accurate_start,
-        "end": accurate_end,
-        "length": length,
-    }
+    return get_streak_params(first_activity.get_performed_at(), last_activity.get_performed_at(),
+                             habit.get_recurrence())
 
 
 def get_last_week_date_range(end_date: Optional[datetime] = None):
@@ -0,0 +1,36 @@
+from hypothesis import given, settings, strategies as st
+from modules.completion import PeriodIndex
+from modules.utils import get_performance_period
+
+# Timestamps within a few weeks of each other, so that date ranges often start or end part-way through an active period
+timestamps = st.lists(st.integers(min_value=1685000000, max_value=1688000000), max_size=40)
+bounds = st.none() | st.integers(min_value=1684900000, max_value=1688100000)
+
+
+def count_performance_periods(sorted_timestamps: list[int], habit_recurrence: str):
+    """
+    The slow but obvious way to count the days/weeks in which a habit was performed, to check `PeriodIndex` against
+    """
+    return len({get_performance_period(timestamp, habit_recurrence) for timestamp in sorted_timestamps})
+
+
+class TestPeriodIndex:
+    @settings(max_examples=300, deadline=None)
+    @given(st.sampled_from(["daily", "weekly"]), timestamps, bounds, bounds)
+    def test_count_matches_counting_every_activity(self, recurrence, performed_at, start, end):
+        performed_at.sort()
+        index = PeriodIndex(recurrence, performed_at)
+        in_range = [ts for ts in performed_at if (start is None or ts >= start) and (end is None or ts <= end)]
+        assert index.count(lambda: performed_at, start, end) == count_performance_periods(in_range, recurrence)
+
+    @settings(max_examples=100, deadline=None)
+    @given(st.sampled_from(["daily", "weekly"]), timestamps, st.randoms())
+    def test_adding_out_of_order_matches_rebuild(self, recurrence, performed_at, rand):
+        index = PeriodIndex(recurrence)
+        for timestamp in rand.sample(performed_at, len(performed_at)):
+            index.add(timestamp)
+        performed_at.sort()
+        rebuilt = PeriodIndex(recurrence, performed_at)
+        assert len(index) == len(rebuilt)
+        for (start, end) in [(None, None), (performed_at[0], None), (None, performed_at[-1] - 1)] if performed_at else []:
+            assert index.count(lambda: performed_at, start, end) == rebuilt.count(lambda: performed_at, start, end)
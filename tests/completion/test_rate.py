@@ -175,6 +175,20 @@ class TestCompletionRate:
         assert completion_stats["num_total_periods"] == 2
         assert completion_stats["rate"] == 0
 
+    def test_several_date_ranges_at_once(self):
+        habit = Habit("Practise piano", "daily", "2023-05-28 19:04:55")
+        habit.perform("2023-05-29 00:12:32")
+        habit.perform("2023-05-31 14:54:22")
+        habit.perform("2023-06-11 06:55:12")
+        date_ranges = [
+            (None, utils.to_datetime("2023-06-30 12:00:00")),
+            (utils.to_datetime("2023-06-01 00:00:00"), utils.to_datetime("2023-06-30 12:00:00")),
+            (utils.to_datetime("2023-05-31 15:00:00"), utils.to_datetime("2023-06-11 06:00:00")),
+        ]
+        rates = habit.get_completion_rates(date_ranges)
+        assert [rate["num_active_periods"] for rate in rates] == [3, 1, 0]
+        assert rates == [habit.get_completion_rate(start, end) for (start, end) in date_ranges]
+
     def teardown_method(self):
         db.remove_tables()
-        db.disconnect()
\ No newline at end of file
+        db.disconnect()
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+from hypothesis import given, settings, strategies as st
+
+from modules import utils, streaks
+from classes.habit import Habit
+
+habit_uuid = "01234567-89ab-cdef-0123-456789abcdef"
+history_start = datetime(2023, 1, 1)
+
+
+def make_habit(recurrence: str, offsets: list[int]):
+    """
+    Build a habit model (without touching the database) that was performed at the given times.
+    :param recurrence: "daily" or "weekly"
+    :param offsets: When the habit was performed, as a number of seconds after `history_start`
+    :return: The Habit model
+    """
+    activity_tuples = [
+        (f"{idx:08x}-0000-0000-0000-000000000000", habit_uuid,
+         utils.format_datetime_for_db(history_start + timedelta(seconds=offset)))
+        for (idx, offset) in enumerate(sorted(offsets))
+    ]
+    return Habit.from_db_row((habit_uuid, "Jog", recurrence, "2022-12-31 08:00:00"), activity_tuples)
+
+
+def legacy_get_all_streaks(habit: Habit, sort_by: str, sort_order: str):
+    """
+    The implementation of `Habit.get_all_streaks()` from before the streak engine, kept as an oracle.
+    """
+    dict_activities_per_period = utils.group_activities_by_performance_period(habit.get_activities(),
+                                                                              habit.get_recurrence())
+    active_dates = sorted(dict_activities_per_period)
+    streaks = []
+    streak_start = None
+    streak_length = 0
+    interval = 1 if habit.get_recurrence() == "daily" else 7
+
+    for (idx, dt_string) in enumerate(active_dates):
+        curr_dt = utils.to_datetime(f"{dt_string} 00:00:00")
+        if (idx + 1) < len(active_dates):
+            next_dt = utils.to_datetime(f"{active_dates[idx + 1]} 00:00:00")
+            if streak_start is None:
+                streak_start = curr_dt
+                streak_length = 1
+            days_to_next_date = utils.get_num_days_from_to(streak_start, next_dt, False)
+            if days_to_next_date == streak_length * interval:
+                streak_length += 1
+            else:
+                if streak_length > 1:
+                    streaks.append((utils.to_date_only_string(streak_start), dt_string))
+                streak_start = None
+                streak_length = 0
+        else:
+            if streak_length > 1:
+                streaks.append((utils.to_date_only_string(streak_start), dt_string))
+
+    streaks_detailed_list = [
+        utils.get_streak_accurate_params(dict_activities_per_period[streak[0]],
+                                         dict_activities_per_period[streak[1]], habit)
+        for streak in streaks
+    ]
+    streaks_detailed_list.sort(key=lambda s: s["start"] if sort_by == "date" else s["length"],
+                               reverse=sort_order == "desc")
+    return streaks_detailed_list
+
+
+def legacy_get_latest_streak(habit: Habit, today: datetime):
+    """
+    The implementation of `Habit.get_latest_streak()` from before the streak engine, kept as an oracle.
+    """
+    if len(habit.get_activities()) == 0:
+        return {"length": 0, "start": None, "end": None, "is_current": None, "can_extend_today": None}
+
+    activities_grouped_by_date = utils.group_activities_by_performance_period(habit.get_activities(),
+                                                                              habit.get_recurrence())
+    active_dates = sorted(activities_grouped_by_date, reverse=True)
+
+    if len(active_dates) > 1:
+        streak_end = active_dates[0]
+        streak_end_dt = utils.to_datetime(f"{streak_end} 00:00:00")
+        streak_start = None
+        streak_length = 1
+        interval = 1 if habit.get_recurrence() == "daily" else 7
+        idx = 1
+        while idx < len(habit.get_activities()) and streak_start is None:
+            curr_dt = utils.to_datetime(f"{active_dates[idx]} 00:00:00")
+            diff = utils.get_num_days_from_to(curr_dt, streak_end_dt, False)
+            if diff == interval * streak_length:
+                streak_length += 1
+                if (idx + 1) == len(active_dates):
+                    streak_start = active_dates[idx]
+                else:
+                    idx += 1
+            else:
+                streak_start = active_dates[idx - 1]
+    else:
+        streak_start = active_dates[0]
+        streak_end = active_dates[0]
+
+    streak_params = utils.get_streak_accurate_params(activities_grouped_by_date[streak_start],
+                                                     activities_grouped_by_date[streak_end], habit)
+    today_period = utils.to_date_only_string(today) if habit.get_recurrence() == "daily" \
+        else utils.to_date_only_string(utils.get_week_start_date(today))
+    today_is_part_of_streak = (today_period == active_dates[0])
+    today_could_increase_streak = (today_period == utils.add_interval(active_dates[0], habit.get_recurrence(), 1))
+    streak_params["is_current"] = today_is_part_of_streak or today_could_increase_streak
+    streak_params["can_extend_today"] = today_could_increase_streak
+    return streak_params
+
+
+# Performances are clustered into a few months so that randomly generated histories contain plenty of streaks
+recurrences = st.sampled_from(["daily", "weekly"])
+histories = st.lists(st.integers(min_value=0, max_value=120 * 24 * 60 * 60), max_size=60)
+todays = st.integers(min_value=0, max_value=130).map(lambda days: history_start + timedelta(days=days, hours=12))
+
+
+class TestStreakEngine:
+    @settings(max_examples=200, deadline=None)
+    @given(recurrences, histories, st.sampled_from(["date", "length"]), st.sampled_from(["asc", "desc"]))
+    def test_all_streaks_match_legacy_implementation(self, recurrence, offsets, sort_by, sort_order):
+        habit = make_habit(recurrence, offsets)
+        assert habit.get_all_streaks(sort_by, sort_order) == legacy_get_all_streaks(habit, sort_by, sort_order)
+
+    @settings(max_examples=200, deadline=None)
+    @given(recurrences, histories, todays)
+    def test_latest_streak_matches_legacy_implementation(self, recurrence, offsets, today):
+        habit = make_habit(recurrence, offsets)
+        assert habit.get_latest_streak(today) == legacy_get_latest_streak(habit, today)
+
+    @settings(max_examples=200, deadline=None)
+    @given(recurrences, histories)
+    def test_longest_streak_is_longest_of_all_streaks(self, recurrence, offsets):
+        habit = make_habit(recurrence, offsets)
+        all_streaks = habit.get_all_streaks("date", "asc")
+        longest = habit.get_longest_streak()
+        if len(offsets) == 0:
+            assert longest["length"] == 0
+        elif len(all_streaks) == 0:
+            assert longest["length"] == 1
+        else:
+            assert longest == max(all_streaks, key=lambda s: s["length"])  # `max()` also picks the earliest on ties
+
+    @settings(max_examples=200, deadline=None)
+    @given(recurrences, histories, st.randoms())
+    def test_streak_index_built_incrementally_matches_rebuild(self, recurrence, offsets, rand):
+        # Perform the habit in a random order, so that plenty of the performances are back-dated
+        timestamps = [utils.to_timestamp(utils.format_datetime_for_db(history_start + timedelta(seconds=offset)))
+                      for offset in offsets]
+        rand.shuffle(timestamps)
+
+        index = streaks.StreakIndex(recurrence)
+        for timestamp in timestamps:
+            index.add(timestamp)
+
+        rebuilt = streaks.StreakIndex(recurrence, sorted(timestamps))
+        assert index.get_runs() == rebuilt.get_runs()
+        assert index.get_latest_run() == rebuilt.get_latest_run()
+        assert index.get_longest_run() == rebuilt.get_longest_run()
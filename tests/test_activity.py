@@ -1,4 +1,6 @@
 from datetime import datetime, timedelta
+
+import pytest
 from freezegun import freeze_time
 from modules import db
 from classes.habit import Habit
@@ -42,6 +44,11 @@ class TestActivity:
         assert activity.get_uuid() == "01234567-89ab-cdef-0123-456789abcdef"
         assert activity.get_habit_uuid() == "abcdef01-2345-6789-abcd-ef0123456789"
         assert activity.get_performed_at() == to_datetime("2024-01-15 08:00:52")
+        assert not hasattr(activity, "__dict__")
+
+    def test_initialise_with_wrong_arguments(self):
+        with pytest.raises(TypeError):
+            Activity(42)
 
     @freeze_time(tz_offset=+5)
     def test_to_string(self):
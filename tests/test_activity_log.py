@@ -0,0 +1,55 @@
+from freezegun import freeze_time
+from classes.activity_log import ActivityLog
+from modules.utils import to_datetime
+
+habit_uuid = "01234567-89ab-cdef-0123-456789abcdef"
+
+
+class TestActivityLog:
+    activity_tuples = [
+        ("12345678-9abc-def0-1234-56789abcdef0", habit_uuid, "2024-01-15 18:00:52"),
+        ("23456789-abcd-ef01-2345-6789abcdef01", habit_uuid, "2024-01-16 07:12:05"),
+        ("3456789a-bcde-f012-3456-789abcdef012", habit_uuid, "2024-01-18 21:45:00"),
+    ]
+
+    @freeze_time(tz_offset=+2)
+    def test_initialise_from_db_tuples(self):
+        log = ActivityLog(habit_uuid, self.activity_tuples)
+        assert len(log) == 3
+
+        activity = log[1]
+        assert activity.get_uuid() == "23456789-abcd-ef01-2345-6789abcdef01"
+        assert activity.get_habit_uuid() == habit_uuid
+        assert activity.get_performed_at() == to_datetime("2024-01-16 09:12:05")
+
+        assert log[-1].get_uuid() == "3456789a-bcde-f012-3456-789abcdef012"
+        assert [a.get_uuid() for a in log] == [a[0] for a in self.activity_tuples]
+        assert log.get_last_performed_at() == to_datetime("2024-01-18 23:45:00")
+
+    def test_empty_log(self):
+        log = ActivityLog(habit_uuid)
+        assert len(log) == 0
+        assert list(log) == []
+        assert log.get_last_performed_at() is None
+
+    def test_add_keeps_chronological_order(self):
+        log = ActivityLog(habit_uuid, [self.activity_tuples[0], self.activity_tuples[2]])
+        log.add(self.activity_tuples[1])
+        assert [a.get_uuid() for a in log] == [a[0] for a in self.activity_tuples]
+
+    def test_extend_out_of_order(self):
+        log = ActivityLog(habit_uuid)
+        log.extend([self.activity_tuples[2]], sort=False)
+        log.extend([self.activity_tuples[1], self.activity_tuples[0]], sort=False)
+        log.sort()
+        assert [a.get_uuid() for a in log] == [a[0] for a in self.activity_tuples]
+        assert list(log.get_timestamps()) == sorted(log.get_timestamps())
+
+    def test_columns_round_trip(self):
+        log = ActivityLog(habit_uuid, self.activity_tuples)
+        (timestamps, uuids) = log.get_columns()
+        assert len(uuids) == 16 * len(timestamps)
+
+        copy = ActivityLog.from_columns(habit_uuid, timestamps, uuids)
+        assert list(copy.get_timestamps()) == list(log.get_timestamps())
+        assert [a.get_uuid() for a in copy] == [a[0] for a in self.activity_tuples]
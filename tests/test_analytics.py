@@ -1,4 +1,8 @@
-from datetime import datetime
+import os
+import random
+import time
+import pytest
+from datetime import datetime, timedelta
 from modules import db, utils, analytics
 from classes.habit import Habit
 
@@ -136,6 +140,71 @@ class TestAnalytics:
         filtered_habits = analytics.filter_habits(habits, "recurrence", "non_existent_type")
         assert len(filtered_habits) == 0
 
+    def test_sql_engine_matches_models_engine(self):
+        rand = random.Random(20230625)
+        for idx in range(12):
+            habit = Habit(f"Random habit {idx}", rand.choice(["daily", "weekly"]), "2023-01-01 00:30:00")
+            # Performances cluster around a few dates, so that there are streaks, gaps and repeats within a period
+            centres = [datetime(2023, 1, 1) + timedelta(days=rand.randint(0, 300)) for _ in range(4)]
+            habit.perform_many(centre + timedelta(minutes=rand.randint(-20000, 20000))
+                               for centre in centres for _ in range(rand.randint(0, 25)))
+
+        # Periods are local days/weeks, so check a few timezones, including ones with daylight saving transitions
+        original_tz = os.environ.get("TZ")
+        try:
+            for tz in ["UTC", "Europe/London", "America/New_York", "Australia/Sydney"]:
+                os.environ["TZ"] = tz
+                time.tzset()
+                todays = [datetime(2023, 3, 26, 0, 30), datetime(2023, 6, 25, 16, 0), datetime(2023, 12, 31, 23, 59)]
+                for today in todays:
+                    assert analytics.get_habits(today, "sql") == analytics.get_habits(today, "models")
+        finally:
+            if original_tz is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = original_tz
+            time.tzset()
+
+    def test_parallel_executors_match_serial(self, monkeypatch):
+        monkeypatch.setattr(analytics, "parallel_min_activities", 0)  # the test data is far too small otherwise
+        today = datetime(2023, 6, 25, 16, 0, 0)
+        serial = analytics.get_habits(today, "models", "serial")
+        assert analytics.get_habits(today, "models", "thread", max_workers=2) == serial
+        assert analytics.get_habits(today, "models", "process", max_workers=2) == serial
+        assert analytics.get_habits(today, "sql") == serial
+
+    def test_unknown_executor(self):
+        with pytest.raises(ValueError):
+            analytics.get_habits(datetime(2023, 6, 25, 16, 0, 0), "models", "gpu")
+
+    def test_stored_stats_are_reused_and_invalidated(self):
+        today = datetime(2023, 6, 25, 16, 0, 0)
+        before = analytics.get_habits(today)
+        cur = db.get_connection().cursor()
+        assert cur.execute("SELECT COUNT(*) FROM habit_stats").fetchone()[0] == 3
+
+        # Stored stats are served as they are, so tampering with one shows that it wasn't recomputed
+        cur.execute("UPDATE habit_stats SET latest_streak = 99 WHERE latest_streak = 2")
+        assert [h["latest_streak"] for h in analytics.get_habits(today)].count(99) == 1
+
+        # Performing the habit invalidates its stored stats, so they are recomputed
+        habit = Habit(next(uuid for (uuid, title) in Habit.get_all_abridged() if title == "phone parents"))
+        habit.perform("2023-06-25 09:00:00")
+        after = analytics.get_habits(today)
+        assert [h["latest_streak"] for h in after].count(99) == 0
+        assert after == analytics.get_habits(today, "models")
+        assert after != before
+
+        habit.remove()
+        assert cur.execute("SELECT COUNT(*) FROM habit_stats").fetchone()[0] == 2
+
+    def test_stored_stats_as_of_a_past_date(self):
+        analytics.get_habits(datetime(2023, 6, 25, 16, 0, 0))  # store the stats over all the activities
+        past = datetime(2023, 6, 20, 12, 0, 0)
+        assert analytics.get_habits(past) == analytics.get_habits(past, "models")
+        later = datetime(2024, 1, 1, 12, 0, 0)  # the completion rate depends on the date even if nothing changed
+        assert analytics.get_habits(later) == analytics.get_habits(later, "models")
+
     def teardown_method(self):
         db.remove_tables()
         db.disconnect()
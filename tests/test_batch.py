@@ -0,0 +1,150 @@
+import argparse
+import csv
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+
+from modules import db, batch
+from classes.habit import Habit
+
+
+def run_command(*argv: str):
+    parser = argparse.ArgumentParser()
+    batch.add_commands(parser.add_subparsers(dest="command"))
+    out = io.StringIO()
+    batch.run(parser.parse_args(argv), out)
+    return out.getvalue()
+
+
+class TestBatch:
+    def setup_method(self):
+        db.connect("test.db")
+        db.setup_tables()
+
+    def test_perform(self, monkeypatch):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        assert run_command("perform", "Jog", "--at", "2023-05-29 07:00:00") == "Performed 'Jog' 1 time\n"
+
+        monkeypatch.setattr("sys.stdin", io.StringIO("2023-05-30 07:00:00\n\n2023-05-31 07:00:00\n"))
+        assert (run_command("perform", habit.get_uuid(), "--at", "-", "--at", "2023-06-01 07:00:00") ==
+                "Performed 'Jog' 3 times\n")
+        assert run_command("perform", "Jog") == "Performed 'Jog' 1 time\n"
+        assert len(Habit(habit.get_uuid()).get_activities()) == 5
+
+    def test_perform_errors(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        with pytest.raises(batch.CommandError, match="No habit"):
+            run_command("perform", "Swim")
+        with pytest.raises(batch.CommandError, match="Invalid date/time"):
+            run_command("perform", "Jog", "--at", "2023-05-29 07:00:00", "--at", "tomorrow")
+        assert len(Habit(habit.get_uuid()).get_activities()) == 0  # all or nothing
+
+        Habit("Jog", "weekly", "2023-05-28 18:57:19")
+        with pytest.raises(batch.CommandError, match="2 habits are called 'Jog'"):
+            run_command("perform", "Jog")
+        run_command("perform", habit.get_uuid())
+
+    def test_stats(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        habit.perform_many(["2023-05-29 07:00:00", "2023-05-30 07:00:00"])
+
+        stats = json.loads(run_command("stats"))
+        jog = next(h for h in stats if h["title"] == "Jog")
+        assert jog["recurrence"] == "daily"
+        assert jog["created_at"] == "2023-05-28 18:57:19"
+        assert jog["last_performed"] == "2023-05-30 07:00:00"
+        assert jog["num_periods_performed"] == 2
+
+        rows = list(csv.DictReader(io.StringIO(run_command("stats", "--format", "csv"))))
+        assert tuple(rows[0]) == batch.stats_columns
+        assert [(r["title"], int(r["num_periods_performed"])) for r in rows] == [
+            (h["title"], h["num_periods_performed"]) for h in stats
+        ]
+
+    def test_streaks(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        habit.perform_many(["2023-05-29 07:00:00", "2023-05-30 07:00:00", "2023-06-02 07:00:00",
+                            "2023-06-03 07:00:00", "2023-06-04 07:00:00"])
+
+        streaks = json.loads(run_command("streaks", "Jog"))
+        assert streaks["uuid"] == habit.get_uuid()
+        assert [s["length"] for s in streaks["streaks"]] == [3, 2]
+        assert streaks["longest"] == {"start": "2023-06-02 07:00:00", "end": "2023-06-04 07:00:00", "length": 3}
+        assert streaks["latest"]["length"] == 3
+
+    def test_export_and_import(self, tmp_path):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        habit.perform_many(["2023-05-29 07:00:00", "2023-05-30 07:00:00"])
+        Habit("Swim", "weekly", "2023-05-28 18:57:19")
+        exported = run_command("export")
+        before = sorted((h["habit"], h["activities"]) for h in db.get_all_habits())
+
+        (tmp_path / "export.csv").write_text(exported)
+        assert run_command("export", "--output", str(tmp_path / "copy.csv")) == ""
+        assert (tmp_path / "copy.csv").read_text() == exported
+
+        db.remove_tables()
+        db.setup_tables()
+        assert (run_command("import", str(tmp_path / "export.csv")) ==
+                f"Imported 2 habits and 2 activities from {tmp_path / 'export.csv'}\n")
+        assert sorted((h["habit"], h["activities"]) for h in db.get_all_habits()) == before
+        assert run_command("export") == exported
+
+    def test_import_skips_what_is_already_there(self, tmp_path):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        habit.perform_many(["2023-05-29 07:00:00", "2023-05-30 07:00:00"])
+        (tmp_path / "export.csv").write_text(run_command("export"))
+        habit.perform("2023-05-31 07:00:00")
+        Habit("Swim", "weekly", "2023-05-28 18:57:19")
+        exported = run_command("export")
+
+        # Everything in the first export is already there; only what was added since is in the second
+        assert (run_command("import", str(tmp_path / "export.csv")) ==
+                f"Imported 0 habits and 0 activities from {tmp_path / 'export.csv'}\n")
+        (tmp_path / "export.csv").write_text(exported)
+        db.delete_habit(db.find_habits("Swim")[0])
+        assert run_command("import", str(tmp_path / "export.csv")).startswith("Imported 1 habits and 0 activities")
+        assert run_command("export") == exported
+
+    def test_import_rejects_other_files(self, tmp_path):
+        with pytest.raises(batch.CommandError, match="Couldn't open .*missing.csv"):
+            run_command("import", str(tmp_path / "missing.csv"))
+        with pytest.raises(batch.CommandError, match="Couldn't open"):
+            run_command("import", str(tmp_path))
+
+        (tmp_path / "habits.csv").write_text("uuid,title,recurrence,created_at\n")
+        with pytest.raises(batch.CommandError, match="header"):
+            run_command("import", str(tmp_path / "habits.csv"))
+
+        header = ",".join(batch.export_columns)
+        (tmp_path / "short.csv").write_text(f"{header}\nabc,Jog,daily\n")
+        with pytest.raises(batch.CommandError, match="Line 2 .* has 3 columns instead of 6"):
+            run_command("import", str(tmp_path / "short.csv"))
+
+        (tmp_path / "bad.csv").write_text(f"{header}\nabc,Jog,hourly,2023-05-28 18:57:19,,\n")
+        with pytest.raises(batch.CommandError, match="nothing was imported"):
+            run_command("import", str(tmp_path / "bad.csv"))
+        assert db.count_habits_and_activities() == (0, 0)
+
+        # An activity's uuid has to be a UUID, or the habit couldn't be loaded afterwards
+        habit_uuid = Habit("Jog", "daily", "2023-05-28 18:57:19").get_uuid()
+        (tmp_path / "uuids.csv").write_text(f"{header}\n{habit_uuid},Jog,daily,2023-05-28 18:57:19,act-1,"
+                                            f"2023-05-29 07:00:00\n")
+        with pytest.raises(batch.CommandError, match="'act-1' isn't a UUID"):
+            run_command("import", str(tmp_path / "uuids.csv"))
+        assert len(Habit(habit_uuid).get_activities()) == 0
+
+    def test_commands_dont_load_the_menus(self):
+        # The modules the commands load, in a fresh interpreter: none of the interactive app's dependencies are in there
+        script = "import sys, main, modules.batch; print(' '.join(sys.modules))"
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        loaded = result.stdout.split()
+        assert "modules.batch" in loaded
+        assert not {"questionary", "tabulate", "modules.cli.home", "modules.example_data", "numpy"} & set(loaded)
+
+    def teardown_method(self):
+        db.remove_tables()
+        db.disconnect()
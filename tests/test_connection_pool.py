@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules import db
+from modules.connection_pool import ConnectionPool, PoolTimeout
+from classes.habit import Habit
+
+
+def run_in_thread(func):
+    result = {}
+
+    def target():
+        try:
+            result["value"] = func()
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+class TestConnectionPool:
+    def setup_method(self):
+        db.connect("test.db")
+        db.setup_tables()
+
+    def test_each_thread_gets_its_own_connection(self):
+        pool = ConnectionPool("test.db", size=2)
+        connection = pool.get_connection()
+        assert pool.get_connection() is connection
+        assert run_in_thread(pool.get_connection) is not connection
+        pool.close()
+
+    def test_threads_wait_for_a_free_connection(self):
+        pool = ConnectionPool("test.db", size=1, timeout=0.1)
+        pool.get_connection()
+        with pytest.raises(PoolTimeout):
+            run_in_thread(pool.get_connection)
+
+        pool.release_connection()
+        run_in_thread(pool.get_connection)  # the connection goes back to the pool when the thread ends
+        pool.get_connection()
+        pool.close()
+
+    def test_threads_wait_as_long_as_it_takes_without_a_timeout(self):
+        pool = ConnectionPool("test.db", size=1)
+        pool.get_connection()
+
+        waiting = threading.Thread(target=pool.get_connection)
+        waiting.start()
+        waiting.join(0.2)
+        assert waiting.is_alive()
+
+        pool.release_connection()
+        waiting.join()  # the connection goes back to the pool when the thread ends
+
+        def check_out():
+            pool.get_connection()
+            pool.release_connection()
+
+        with ThreadPoolExecutor(8) as executor:  # more threads than connections
+            list(executor.map(lambda _: check_out(), range(32)))
+        assert len(pool.get_connections()) == 1
+        pool.close()
+
+    def test_transaction_commits_or_rolls_back(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+
+        with db.transaction() as connection:
+            connection.execute("INSERT INTO activities(uuid, habit_id, performed_at) SELECT 'a', id, 1685343600 "
+                               "FROM habits WHERE uuid = ?", (habit.get_uuid(), ))
+        with pytest.raises(RuntimeError):
+            with db.transaction() as connection:
+                connection.execute("INSERT INTO activities(uuid, habit_id, performed_at) SELECT 'b', id, 1685430000 "
+                                   "FROM habits WHERE uuid = ?", (habit.get_uuid(), ))
+                raise RuntimeError("something went wrong")
+
+        assert [row[0] for row in db.get_habit(habit.get_uuid())["activities"]] == ["a"]
+
+    def test_concurrent_writes_from_threads(self):
+        habits = [Habit(f"Habit {idx}", "daily", "2023-05-28 18:57:19") for idx in range(8)]
+
+        def perform(habit: Habit):
+            habit.perform_many([f"2023-06-{day:02} 07:00:00" for day in range(1, 11)])
+            db.default_pool.release_connection()
+
+        # More threads than the pool has connections, so that some of them wait for one
+        with ThreadPoolExecutor(len(habits)) as executor:
+            list(executor.map(perform, habits))
+
+        assert all(len(h["activities"]) == 10 for h in db.get_all_habits())
+
+    def teardown_method(self):
+        db.remove_tables()
+        db.disconnect()
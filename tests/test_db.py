@@ -0,0 +1,261 @@
+import pytest
+from modules import db, utils
+from classes.habit import Habit
+
+
+class TestDb:
+    def setup_method(self):
+        db.connect("test.db")
+        db.setup_tables()
+
+    @staticmethod
+    def set_up_old_schema(version: int):
+        """
+        Start the test database afresh with the schema as it was at an earlier version, i.e. the base schema with only
+        the migrations up to `version` applied.
+        """
+        db.remove_tables()
+        migrations = db.migrations
+        db.migrations = [m for m in migrations if m[0] <= version]
+        try:
+            db.setup_tables()
+        finally:
+            db.migrations = migrations
+
+    def test_migrations_applied_on_setup(self):
+        latest_version = max(migration[0] for migration in db.migrations)
+        assert db.get_schema_version() == latest_version
+
+        cur = db.get_connection().cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name = ?",
+                    ("idx_activities_habit_performed_at", ))
+        assert cur.fetchone() is not None
+
+    def test_migrations_not_reapplied_on_reconnect(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        habit.perform("2023-05-29 07:12:43")
+        db.disconnect()
+
+        db.connect("test.db")
+        assert db.apply_migrations() == []
+        assert len(Habit(habit.get_uuid()).get_activities()) == 1
+
+    def test_existing_database_upgraded_on_connect(self):
+        # A database as it looked before there were any migrations
+        self.set_up_old_schema(0)
+        cur = db.get_connection().cursor()
+        cur.execute("DROP TABLE schema_version")
+        cur.execute("INSERT INTO recurrence_types VALUES('daily')")
+        cur.execute("INSERT INTO habits VALUES('jog', 'Jog', 'daily', '2023-05-28 18:57:19')")
+        cur.execute("INSERT INTO activities VALUES(?, 'jog', '2023-05-29 07:12:43')", (utils.make_uuid(), ))
+        db.get_connection().commit()
+        db.disconnect()
+
+        db.connect("test.db")
+        assert db.get_schema_version() == max(migration[0] for migration in db.migrations)
+        assert len(Habit("jog").get_activities()) == 1
+
+    def test_activity_queries_use_index(self):
+        cur = db.get_connection().cursor()
+        cur.execute("EXPLAIN QUERY PLAN SELECT * FROM activities WHERE habit_id = ? ORDER BY performed_at ASC", (1, ))
+        plan = " ".join(str(row[-1]) for row in cur.fetchall())
+        assert "idx_activities_habit_performed_at" in plan
+        assert "TEMP B-TREE" not in plan  # i.e. no separate sorting step
+
+    def test_create_activities_bulk(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        performed_at = ["2023-05-29 07:12:43", "2023-05-30 07:01:12", "2023-05-31 06:58:30"]
+        created = db.create_activities_bulk(habit.get_uuid(), performed_at, chunk_size=2)
+        assert [row[1:] for row in created] == [(habit.get_uuid(), utils.to_timestamp(dt)) for dt in performed_at]
+        assert sorted(created) == sorted(db.get_habit(habit.get_uuid())["activities"])
+
+    def test_create_activities_bulk_is_atomic(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+
+        def performed_at():
+            yield "2023-05-29 07:12:43"
+            yield "2023-05-30 07:01:12"
+            raise RuntimeError("feed interrupted")
+
+        try:
+            db.create_activities_streamed(habit.get_uuid(), performed_at(), chunk_size=1)
+            assert False, "expected the import to fail"
+        except RuntimeError:
+            pass
+
+        assert db.get_habit(habit.get_uuid())["activities"] == []
+
+    def test_habit_periods_kept_up_to_date(self):
+        habit = Habit("Jog", "weekly", "2023-05-28 18:57:19")
+        habit.perform("2023-05-30 07:12:43")
+        habit.perform_many(["2023-05-29 07:01:12", "2023-06-01 06:58:30", "2023-06-06 19:00:00"])
+        rollup = db.get_habit_with_periods(habit.get_uuid())["periods"]
+        assert [row[2] for row in rollup] == [3, 1]
+        assert tuple(map(utils.to_timestamp, rollup[0][3:])) == (db.get_habit(habit.get_uuid())["activities"][0][2],
+                                                                 db.get_habit(habit.get_uuid())["activities"][2][2])
+
+        habit.remove()
+        cur = db.get_connection().cursor()
+        assert cur.execute("SELECT COUNT(*) FROM habit_periods").fetchone()[0] == 0
+
+    def test_backfill_habit_periods(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        habit.perform_many(["2023-05-29 07:01:12", "2023-05-29 19:58:30", "2023-05-31 06:58:30"])
+        expected = db.get_habit_with_periods(habit.get_uuid())["periods"]
+
+        # As if the activities had been recorded before the rollup existed
+        cur = db.get_connection().cursor()
+        cur.execute("DELETE FROM habit_periods")
+        db.get_connection().commit()
+
+        assert db.backfill_habit_periods() == 2
+        assert db.get_habit_with_periods(habit.get_uuid())["periods"] == expected
+
+    def test_iter_habits_with_activities(self):
+        jog = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        jog.perform_many(["2023-05-30 07:01:12", "2023-05-29 07:12:43", "2023-05-31 06:58:30"])
+        Habit("Read", "weekly", "2023-05-28 18:58:00")  # never performed
+        Habit("Stretch", "daily", "2023-05-28 18:59:00").perform("2023-05-29 21:00:00")
+
+        expected = [db.get_habit(uuid) for (uuid, _) in sorted(db.get_all_habits_abridged())]
+        for batch_size in (1, 2, 1000):  # habits that span batches, and everything in a single batch
+            assert list(db.iter_habits_with_activities(batch_size)) == expected
+        assert db.get_all_habits() == expected
+
+    def test_orphaned_activities_do_not_stall_other_habits(self):
+        habits = [Habit(title, "daily", "2023-05-28 18:57:19") for title in ("Jog", "Read", "Stretch")]
+        for habit in habits:
+            habit.perform("2023-05-29 07:12:43")
+
+        # Activities of habits that no longer exist, with ids before, between and after the real habits.  Foreign keys
+        # rule these out now, but databases that predate them can still have them.
+        cur = db.get_connection().cursor()
+        cur.execute("PRAGMA foreign_keys = OFF")
+        cur.executemany("INSERT INTO activities(uuid, habit_id, performed_at) VALUES(?, ?, 1685347200)", [
+            (f"orphan-{idx}", habit_id) for (idx, habit_id) in enumerate([-1, 2.5, 1000])
+        ])
+        db.get_connection().commit()
+        cur.execute("PRAGMA foreign_keys = ON")
+
+        all_habits = db.get_all_habits()
+        assert len(all_habits) == 3
+        assert all(len(h["activities"]) == 1 for h in all_habits)
+        assert db.count_orphaned_activities() == 3
+
+    def test_iter_habits_with_activities_uses_index(self):
+        cur = db.get_connection().cursor()
+        cur.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT * FROM habits LEFT JOIN activities ON activities.habit_id = habits.id
+            ORDER BY habits.uuid ASC, activities.performed_at ASC
+        """)
+        plan = " ".join(str(row[-1]) for row in cur.fetchall())
+        assert "idx_activities_habit_performed_at" in plan
+        # SQLite may still sort each habit's activities (the "right part" of the ordering), but never the whole join
+        assert "TEMP B-TREE FOR ORDER BY" not in plan
+
+    def test_delete_habit_cascades(self):
+        (kept, deleted) = (Habit("Jog", "daily", "2023-05-28 18:57:19"), Habit("Read", "weekly", "2023-05-28 18:57:19"))
+        for habit in (kept, deleted):
+            habit.perform_many(["2023-05-29 07:12:43", "2023-06-05 07:12:43"])
+        db.get_materialized_habit_stats("2023-06-10 12:00:00", 738681, "tz")
+
+        db.delete_habit(deleted.get_uuid())
+
+        cur = db.get_connection().cursor()
+        for table in ("habit_periods", "habit_stats"):
+            cur.execute(f"SELECT DISTINCT habit FROM {table}")
+            assert cur.fetchall() == [(kept.get_uuid(), )]
+        cur.execute("SELECT DISTINCT habits.uuid FROM activities LEFT JOIN habits ON habits.id = activities.habit_id")
+        assert cur.fetchall() == [(kept.get_uuid(), )]
+
+    def test_delete_habits_bulk(self):
+        habits = [Habit(f"Habit {idx}", "daily", "2023-05-28 18:57:19") for idx in range(5)]
+        for (habit, num_activities) in zip(habits, [3, 3, 10, 1, 0]):
+            habit.perform_many([f"2023-06-{day:02} 07:00:00" for day in range(1, num_activities + 1)])
+
+        # Count the transactions, to check that habits are grouped without ever being split
+        transactions = []
+        db.get_connection().set_trace_callback(lambda statement: transactions.append(statement)
+                                               if statement == "BEGIN" else None)
+        uuids = [h.get_uuid() for h in habits[:4]]
+        assert db.delete_habits_bulk(uuids + uuids[:1] + ["no-such-habit"], chunk_size=5) == 4
+        db.get_connection().set_trace_callback(None)
+
+        assert len(transactions) == 4  # [3], [3], [10] and then [1, 0 (missing)]
+        assert [h["habit"][0] for h in db.get_all_habits()] == [habits[4].get_uuid()]
+        assert db.count_habits_and_activities() == (1, 0)
+
+    def test_upgrade_to_cascading_foreign_keys(self):
+        # Set up the database as it was before the foreign keys cascaded, with an activity left over from a deleted
+        # habit
+        self.set_up_old_schema(3)
+        cur = db.get_connection().cursor()
+        cur.execute("INSERT INTO recurrence_types VALUES('daily')")
+        cur.execute("INSERT INTO habits VALUES('jog', 'Jog', 'daily', '2023-05-28 18:57:19')")
+        cur.execute("INSERT INTO activities VALUES(?, 'jog', '2023-05-29 07:12:43')", (utils.make_uuid(), ))
+        db.get_connection().commit()
+        cur.execute("PRAGMA foreign_keys = OFF")
+        cur.execute("INSERT INTO activities VALUES(?, 'deleted-habit', '2023-05-29 08:00:00')", (utils.make_uuid(), ))
+        db.get_connection().commit()
+        db.disconnect()
+
+        db.connect("test.db")
+        assert db.get_schema_version() == max(m[0] for m in db.migrations)
+        assert db.count_orphaned_activities() == 0
+        assert len(db.get_habit_with_periods("jog")["periods"]) == 1
+
+        habit = Habit("jog")
+        habit.perform("2023-05-30 07:12:43")  # the rollup trigger survived the rebuilds
+        assert len(db.get_habit_with_periods("jog")["periods"]) == 2
+        db.delete_habit("jog")
+        assert db.count_habits_and_activities() == (0, 0)
+
+    def test_upgrade_to_integer_keys(self):
+        self.set_up_old_schema(4)
+        cur = db.get_connection().cursor()
+        cur.executemany("INSERT INTO habits VALUES(?, ?, ?, ?)", [
+            ("read", "Read", "weekly", "2023-05-28 18:58:00"),
+            ("jog", "Jog", "daily", "2023-05-28 18:57:19"),
+        ])
+        (a, b, c) = (utils.make_uuid(), utils.make_uuid(), utils.make_uuid())
+        cur.executemany("INSERT INTO activities VALUES(?, ?, ?)", [
+            (a, "jog", "2023-05-30 07:01:12"),
+            (b, "read", "2023-05-29 21:00:00"),
+            (c, "jog", "2023-05-29 07:12:43"),
+        ])
+        db.get_connection().commit()
+        db.disconnect()
+
+        db.connect("test.db")
+        assert db.get_habit("jog") == {
+            "habit": ("jog", "Jog", "daily", "2023-05-28 18:57:19"),
+            "activities": [(c, "jog", utils.to_timestamp("2023-05-29 07:12:43")),
+                           (a, "jog", utils.to_timestamp("2023-05-30 07:01:12"))],
+        }
+        assert db.get_last_performed_at("read") == utils.to_timestamp("2023-05-29 21:00:00")
+        cur = db.get_connection().cursor()
+        assert cur.execute("SELECT typeof(id), typeof(habit_id), typeof(performed_at) FROM activities").fetchall() == \
+            [("integer", "integer", "integer")] * 3
+        assert cur.execute("PRAGMA foreign_key_check").fetchall() == []
+
+        Habit("jog").perform("2023-05-31 07:00:00")
+        assert len(db.get_habit_with_periods("jog")["periods"]) == 3
+
+    def test_pragma_profiles(self):
+        for (profile, synchronous) in [("durable", 2), ("balanced", 1), ("bulk-import", 0)]:
+            db.disconnect()
+            db.connect("test.db", profile=profile)
+            settings = db.get_pragma_settings()
+            assert settings["journal_mode"] == "wal"
+            assert settings["synchronous"] == synchronous
+            assert settings["busy_timeout"] == db.pragma_profiles[profile]["busy_timeout"]
+            assert settings["cache_size"] == db.pragma_profiles[profile]["cache_size"]
+
+    def test_unknown_pragma_profile(self):
+        with pytest.raises(ValueError):
+            db.connect("test.db", profile="reckless")
+
+    def teardown_method(self):
+        db.remove_tables()
+        db.disconnect()
@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import pytest
+
+from modules import db, example_data, analytics, utils
+from classes.habit import Habit
+
+
+class TestExampleData:
+    def setup_method(self):
+        db.connect("test.db")
+        db.setup_tables()
+
+    def test_generated_dataset_is_deterministic(self):
+        (habits, activities) = example_data.generate_dataset(20, years=0.5, seed=7)
+        activities = list(activities)
+        assert len(habits) == 20
+        assert len(activities) > 0
+
+        (same_habits, same_activities) = example_data.generate_dataset(20, years=0.5, seed=7)
+        assert same_habits == habits
+        assert list(same_activities) == activities
+
+        (other_habits, _) = example_data.generate_dataset(20, years=0.5, seed=8)
+        assert other_habits != habits
+
+    def test_recurrence_mix(self):
+        for (daily_fraction, recurrences) in [(1, {"daily"}), (0, {"weekly"}), (0.5, {"daily", "weekly"})]:
+            (habits, _) = example_data.generate_dataset(50, daily_fraction=daily_fraction)
+            assert {h[2] for h in habits} == recurrences
+
+    def test_activities_within_time_span(self):
+        (habits, activities) = example_data.generate_dataset(30, years=2, backdated_fraction=0)
+        created_at = {h[0]: utils.to_timestamp(h[3]) for h in habits}
+        end = utils.to_timestamp(example_data.date_to_string(example_data.default_end))
+        for (_, habit_uuid, performed_at) in activities:
+            # Activities start on the day their habit was created
+            assert created_at[habit_uuid] - created_at[habit_uuid] % (24 * 60 * 60) <= performed_at < end
+
+    def test_back_dated_activities(self):
+        (habits, activities) = example_data.generate_dataset(10, backdated_fraction=1)
+        created_at = {h[0]: utils.to_timestamp(h[3]) for h in habits}
+        by_habit = {}
+        for (_, habit_uuid, performed_at) in activities:
+            by_habit.setdefault(habit_uuid, []).append(performed_at)
+
+        for (habit_uuid, timestamps) in by_habit.items():
+            assert min(timestamps) < created_at[habit_uuid]
+            assert timestamps != sorted(timestamps)  # they come after the habit's other activities
+
+    def test_burstiness(self):
+        def count_runs(burstiness: float):
+            (habits, activities) = example_data.generate_dataset(20, daily_fraction=1, burstiness=burstiness,
+                                                                 backdated_fraction=0)
+            days = {}
+            for (_, habit_uuid, performed_at) in activities:
+                days.setdefault(habit_uuid, set()).add(performed_at // (24 * 60 * 60))
+            num_days = sum(len(d) for d in days.values())
+            num_runs = sum(1 for d in days.values() for day in d if day - 1 not in d)
+            return num_days, num_runs
+
+        (steady_days, steady_runs) = count_runs(0)
+        (bursty_days, bursty_runs) = count_runs(0.9)
+        # Roughly as many days performed, in far fewer (and so longer) streaks
+        assert abs(bursty_days - steady_days) < 0.25 * steady_days
+        assert bursty_runs < steady_runs / 3
+
+    def test_users(self):
+        (habits, _) = example_data.generate_dataset(9, num_users=3)
+        assert [h[1].endswith(f"(user {idx % 3 + 1})") for (idx, h) in enumerate(habits)] == [True] * 9
+
+    def test_import_dataset(self):
+        (habits, activities) = example_data.generate_dataset(25, years=1, backdated_fraction=0.5)
+        activities = list(activities)
+        assert db.import_dataset(habits, iter(activities), chunk_size=100) == (25, len(activities))
+        assert db.count_habits_and_activities() == (25, len(activities))
+
+        today = datetime(2023, 12, 31, 12)
+        assert analytics.get_habits(today) == analytics.get_habits(today, engine="models")
+
+    def test_import_dataset_only_takes_uuids(self):
+        habit = (utils.make_uuid(), "Jog", "daily", "2023-05-28 18:57:19")
+        with pytest.raises(ValueError, match="'act-1' isn't a UUID"):
+            db.import_dataset([habit], [(utils.make_uuid(), habit[0], "2023-05-29 07:00:00"),
+                                        ("act-1", habit[0], "2023-05-30 07:00:00")])
+        assert db.count_habits_and_activities() == (0, 0)
+
+        # Stored the way `make_uuid()` writes them, which is how the habit's model gives them back
+        uuid = utils.make_uuid()
+        db.import_dataset([habit], [(uuid.upper(), habit[0], "2023-05-29 07:00:00")])
+        assert [activity.get_uuid() for activity in Habit(habit[0]).get_activities()] == [uuid]
+
+    def test_fixture_round_trip(self, tmp_path):
+        (habits, activities) = example_data.generate_dataset(10, years=0.5)
+        activities = list(activities)
+        assert example_data.write_fixture(str(tmp_path), habits, iter(activities)) == (10, len(activities))
+
+        (read_habits, read_activities) = example_data.read_fixture(str(tmp_path))
+        assert read_habits == habits
+        db.import_dataset(read_habits, read_activities)
+        assert sorted(a for h in db.get_all_habits() for a in h["activities"]) == sorted(activities)
+
+    def test_starter_data(self):
+        today = datetime(2024, 3, 10, 12)
+        (habits, activities) = example_data.get_starter_data(today)
+        assert [h[1] for h in habits] == [title for (title, _, _) in example_data.starter_habits]
+        assert len(activities) == len(example_data.starter_activities)
+        assert all("2024-02-11 00:00:00" <= a[2] < "2024-03-10 00:00:00" for a in activities)
+        assert {a[1] for a in activities} == {h[0] for h in habits}
+
+        db.populate_starter_data()
+        assert db.count_habits_and_activities() == (len(habits), len(activities))
+
+    def teardown_method(self):
+        db.remove_tables()
+        db.disconnect()
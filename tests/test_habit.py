@@ -1,4 +1,5 @@
 from datetime import timedelta, datetime
+import pytest
 from freezegun import freeze_time
 from modules import db
 from modules.utils import to_datetime
@@ -49,6 +50,79 @@ class TestHabit:
         latest = now + timedelta(minutes=2)
         assert now <= execution.get_performed_at() <= latest
 
+    def test_perform_habit_out_of_order(self):
+        habit = Habit("Practise piano", "daily", "2023-05-28 18:57:19")
+        habit.perform("2023-05-31 21:00:43")
+        habit.perform("2023-05-29 07:15:02")
+        habit.perform("2023-06-02 12:30:00")
+        performed_at = [activity.get_performed_at() for activity in habit.get_activities()]
+        assert performed_at == [
+            to_datetime("2023-05-29 07:15:02"),
+            to_datetime("2023-05-31 21:00:43"),
+            to_datetime("2023-06-02 12:30:00"),
+        ]
+        assert [a.get_uuid() for a in habit.get_activities()] == \
+            [a.get_uuid() for a in Habit(habit.get_uuid()).get_activities()]
+
+    def test_perform_habit_changed_elsewhere(self):
+        habit = Habit("Practise piano", "daily", "2023-05-28 18:57:19")
+        habit.perform("2023-05-29 21:00:43")
+
+        # Another model of the same habit records a performance that this model doesn't know about
+        Habit(habit.get_uuid()).perform("2023-06-04 08:12:11")
+
+        habit.perform("2023-05-30 18:22:05")
+        assert len(habit.get_activities()) == 3
+        assert habit.get_date_last_performed() == to_datetime("2023-06-04 08:12:11")
+
+    def test_perform_habit_many_times(self):
+        habit = Habit("Practise piano", "daily", "2023-05-28 18:57:19")
+        habit.perform("2023-06-01 08:00:00")
+        num_created = habit.perform_many([
+            "2023-05-30 21:00:43",
+            datetime(2023, 6, 3, 7, 15, 2),
+            "2023-05-29 12:30:00",
+        ], chunk_size=2)
+        assert num_created == 3
+
+        performed_at = [activity.get_performed_at() for activity in habit.get_activities()]
+        assert performed_at == [
+            to_datetime("2023-05-29 12:30:00"),
+            to_datetime("2023-05-30 21:00:43"),
+            to_datetime("2023-06-01 08:00:00"),
+            to_datetime("2023-06-03 07:15:02"),
+        ]
+        assert [a.get_uuid() for a in habit.get_activities()] == \
+            [a.get_uuid() for a in Habit(habit.get_uuid()).get_activities()]
+
+    def test_perform_habit_many_times_from_generator(self):
+        habit = Habit("Practise piano", "daily", "2023-05-28 18:57:19")
+        start = datetime(2023, 5, 29, 6, 30, 0)
+        num_created = habit.perform_many((start + timedelta(days=i) for i in range(250)), chunk_size=100)
+        assert num_created == 250
+        assert len(habit.get_activities()) == 250
+        assert len(Habit(habit.get_uuid()).get_activities()) == 250
+        assert habit.get_date_last_performed() == start + timedelta(days=249)
+
+    def test_perform_habit_many_times_fails_midway(self):
+        habit = Habit("Practise piano", "daily", "2023-05-28 18:57:19")
+        habit.perform("2023-05-29 06:30:00")
+
+        def performances():
+            yield "2023-05-30 06:30:00"
+            yield "2023-05-31 06:30:00"
+            raise RuntimeError("something went wrong")
+
+        with pytest.raises(RuntimeError):
+            habit.perform_many(performances(), chunk_size=2)  # the first chunk goes in before the failure
+
+        # None of them were recorded, and the model doesn't count them either
+        assert len(Habit(habit.get_uuid()).get_activities()) == 1
+        assert len(habit.get_activities()) == 1
+        assert habit.get_all_streaks() == []
+        assert habit.get_longest_streak()["length"] == 1
+        assert habit.get_number_of_times_completed(end_date=datetime(2023, 6, 1)) == 1
+
     def test_fetch_habit(self):
         habit = Habit("Practise piano", "daily", "2023-05-28 19:01:33")
         habit.perform()
@@ -77,6 +151,39 @@ class TestHabit:
         assert habit_model.get_created_at() == to_datetime("2023-05-29 01:33:12")
         assert len(habit_model.get_activities()) == 2
 
+    @freeze_time(tz_offset=+6)
+    def test_initialise_from_db_row(self):
+        habit_model = Habit.from_db_row(
+            ("01234567-89ab-cdef-0123-456789abcdef", "Practise piano", "daily", "2023-05-28 19:33:12"),
+            [("12345678-9abc-def0-1234-56789abcdef0", "01234567-89ab-cdef-0123-456789abcdef", "2023-05-29 19:23:00")]
+        )
+        assert habit_model.get_uuid() == "01234567-89ab-cdef-0123-456789abcdef"
+        assert habit_model.get_title() == "Practise piano"
+        assert habit_model.get_created_at() == to_datetime("2023-05-29 01:33:12")
+        assert len(habit_model.get_activities()) == 1
+        assert habit_model.get_date_last_performed() == to_datetime("2023-05-30 01:23:00")
+        assert not hasattr(habit_model, "__dict__")
+
+    def test_load_from_rollup(self):
+        habit = Habit("Practise piano", "daily", "2023-05-28 19:33:12")
+        habit.perform_many(["2023-05-29 19:23:00", "2023-05-30 08:00:00", "2023-05-30 21:00:00", "2023-06-02 07:00:00"])
+
+        habit_model = Habit.load_from_rollup(habit.get_uuid())
+        assert habit_model.get_title() == "Practise piano"
+        assert habit_model.get_date_last_performed() == to_datetime("2023-06-02 07:00:00")
+        assert habit_model.get_all_streaks() == habit.get_all_streaks()
+        assert habit_model.get_latest_streak(datetime(2023, 6, 3)) == habit.get_latest_streak(datetime(2023, 6, 3))
+        assert habit_model.get_completion_rate(end_date=datetime(2023, 6, 3)) == \
+            habit.get_completion_rate(end_date=datetime(2023, 6, 3))
+        # A date range between two performances of the same day needs the individual activities
+        assert habit_model.get_number_of_times_completed(to_datetime("2023-05-30 09:00:00"),
+                                                         to_datetime("2023-05-30 20:00:00")) == 0
+
+        # Activities are fetched when they're first needed, and performing the habit doesn't add them twice
+        habit_model.perform("2023-06-03 07:00:00")
+        assert len(habit_model.get_activities()) == 5
+        assert habit_model.get_latest_streak(datetime(2023, 6, 3))["length"] == 2
+
     def test_to_string(self):
         habit = Habit("Practise piano", "daily", "2023-05-28 18:57:19")
         habit_string = str(habit).split("\n")
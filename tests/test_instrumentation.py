@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from modules import db, analytics, instrumentation
+from classes import habit as habit_module
+from classes.habit import Habit
+
+
+class TestInstrumentation:
+    def setup_method(self):
+        db.connect("test.db")
+        db.setup_tables()
+        instrumentation.reset()
+
+    def test_disabled_by_default(self):
+        original = db.get_habit
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        habit.perform("2023-05-29 07:00:00")
+        assert instrumentation.get_histograms() == {}
+        assert instrumentation.get_statement_counts() == {}
+        assert db.get_habit is original and habit_module.get_habit is original
+
+    def test_times_functions_and_counts_statements(self):
+        habit = Habit("Jog", "daily", "2023-05-28 18:57:19")
+        instrumentation.enable()
+        try:
+            habit.perform("2023-05-29 07:00:00")
+            habit.perform("2023-05-30 07:00:00")
+            Habit(habit.get_uuid())  # fetched through `get_habit`, which `classes.habit` imports by name
+            analytics.get_habits(datetime(2023, 6, 1))
+            list(db.iter_habits_with_activities())
+        finally:
+            instrumentation.disable()
+
+        histograms = instrumentation.get_histograms()
+        assert histograms["Habit.perform"].count == 2
+        assert histograms["db.create_activity"].count == 2
+        assert histograms["db.get_habit"].count == 1
+        assert histograms["db.get_habit"].statements >= 2  # the habit and its activities
+        assert histograms["analytics.get_habits"].count == 1
+        assert histograms["db.iter_habits_with_activities"].count == 1
+        assert histograms["Habit.perform"].total >= histograms["db.create_activity"].total
+
+        statements = instrumentation.get_statement_counts()
+        assert statements["INSERT INTO activities(uuid, habit_id, performed_at) VALUES(?, (SELECT id FROM habits WHERE "
+                          "uuid = ?), ?)"[:instrumentation.max_statement_length]] >= 2  # plus the triggers it fires
+
+        report = instrumentation.format_report()
+        assert "Habit.perform" in report and "INSERT INTO activities" in report
+
+    def test_disable_restores_functions(self):
+        (original_get_habit, original_from_db_row) = (db.get_habit, Habit.__dict__["from_db_row"])
+        instrumentation.enable()
+        instrumentation.enable()  # no effect
+        assert db.get_habit is not original_get_habit and habit_module.get_habit is db.get_habit
+        instrumentation.disable()
+
+        assert db.get_habit is original_get_habit and habit_module.get_habit is original_get_habit
+        assert Habit.__dict__["from_db_row"] is original_from_db_row
+        db.get_habit(Habit("Jog", "daily").get_uuid())
+        assert "db.get_habit" not in instrumentation.get_histograms()
+        assert not any(s.startswith("SELECT") for s in instrumentation.get_statement_counts())
+
+    def test_histogram(self):
+        histogram = instrumentation.Histogram()
+        for microseconds in [1] * 90 + [1000] * 9 + [50_000]:
+            histogram.add(microseconds / 1_000_000)
+        assert histogram.count == 100
+        assert histogram.get_percentile(50) == 2 / 1_000_000  # the upper bound of the bucket
+        assert histogram.get_percentile(95) == 1024 / 1_000_000
+        assert histogram.get_percentile(100) == 0.05
+        assert histogram.to_dict()["buckets"] == {"<2us": 90, "<1024us": 9, "<65536us": 1}
+
+    def teardown_method(self):
+        instrumentation.disable()
+        instrumentation.reset()
+        db.remove_tables()
+        db.disconnect()
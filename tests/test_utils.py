@@ -1,3 +1,7 @@
+import os
+import time
+
+import pytest
 from freezegun import freeze_time
 from datetime import datetime, timezone
 from modules import db, utils
@@ -44,6 +48,54 @@ class TestUtils:
         assert dt.minute == 1
         assert dt.second == 23
 
+    def test_to_timestamp(self):
+        assert utils.to_timestamp("1970-01-01 00:00:00") == 0
+        assert utils.to_timestamp("2023-08-11 19:01:23") == 1691780483
+        assert utils.to_timestamp("1969-12-31 23:59:59") == -1
+
+    def test_normalise_uuid(self):
+        uuid = utils.make_uuid()
+        assert utils.normalise_uuid(uuid) is uuid
+        assert utils.normalise_uuid(uuid.upper()) == uuid
+        assert utils.normalise_uuid(uuid.replace("-", "")) == uuid
+        with pytest.raises(ValueError, match="'act-1' isn't a UUID"):
+            utils.normalise_uuid("act-1")
+
+    def test_to_timestamps(self):
+        dt_strings = [f"2024-0{month}-{day:02} {hour:02}:15:42" for month in range(1, 10) for day in range(1, 29)
+                      for hour in (0, 13)]
+        expected = [utils.to_timestamp(dt_string) for dt_string in dt_strings]
+        assert list(utils.to_timestamps(dt_strings)) == expected  # large enough to use numpy, if it is installed
+        assert list(utils.to_timestamps(dt_strings[:3])) == expected[:3]
+
+        numpy = utils.numpy
+        utils.numpy = None
+        try:
+            assert list(utils.to_timestamps(dt_strings)) == expected
+        finally:
+            utils.numpy = numpy
+
+    def test_to_datetime_with_gmt_time_input_across_dst_transitions(self):
+        def decode_with_strptime(dt_string: str):  # how GMT strings used to be decoded
+            return datetime.fromtimestamp(datetime.strptime(f"{dt_string}+0000", "%Y-%m-%d %H:%M:%S%z").timestamp())
+
+        original_tz = os.environ.get("TZ")
+        try:
+            for tz in ("Europe/London", "America/New_York", "Australia/Lord_Howe"):
+                os.environ["TZ"] = tz
+                time.tzset()
+                for dt_string in ("2024-03-31 00:59:59", "2024-03-31 01:00:00", "2024-10-27 00:30:00",
+                                  "2024-10-27 01:30:00", "2024-03-10 06:59:59", "2024-03-10 07:00:00",
+                                  "2024-11-03 05:30:00", "2024-11-03 06:30:00", "2024-04-06 14:45:00",
+                                  "2024-10-05 15:29:59", "2024-10-05 15:30:00"):
+                    assert utils.to_datetime(dt_string, True) == decode_with_strptime(dt_string)
+        finally:
+            if original_tz is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = original_tz
+            time.tzset()
+
     def test_to_date_only_string(self):
         dt = datetime(2023, 12, 25, 15, 22, 0)
         dt_string = utils.to_date_only_string(dt)
@@ -336,6 +388,40 @@ class TestUtils:
         test_grouping_by_week()
         teardown_method()
 
+    def test_get_period_ordinal(self):
+        def test_for_day_periods():
+            monday = utils.get_period_ordinal(datetime(2023, 12, 11, 14, 30, 0), "daily")
+            assert utils.get_period_ordinal(datetime(2023, 12, 12, 0, 0, 0), "daily") == monday + 1
+            assert utils.get_period_start_date(monday, "daily") == datetime(2023, 12, 11)
+
+        def test_for_week_periods():
+            week = utils.get_period_ordinal(datetime(2023, 12, 11, 0, 0, 0), "weekly")  # a Monday
+            assert utils.get_period_ordinal(datetime(2023, 12, 17, 23, 59, 59), "weekly") == week  # the Sunday after
+            assert utils.get_period_ordinal(datetime(2023, 12, 18, 0, 0, 0), "weekly") == week + 1
+            assert utils.get_period_ordinal(datetime(2023, 12, 10, 23, 59, 59), "weekly") == week - 1
+            assert utils.get_period_start_date(week, "weekly") == datetime(2023, 12, 11)
+            assert utils.get_period_start_date(utils.get_period_ordinal(datetime(2024, 1, 3), "weekly"), "weekly") \
+                == datetime(2024, 1, 1)
+
+        test_for_day_periods()
+        test_for_week_periods()
+
+    def test_group_timestamps_by_performance_period(self):
+        timestamps = [int(utils.get_as_gmt(utils.to_datetime(dt_string)).timestamp()) for dt_string in [
+            "2023-05-29 20:12:12", "2023-05-29 22:05:56", "2023-06-03 01:37:05", "2023-06-05 08:57:00",
+        ]]
+        grouped = utils.group_timestamps_by_performance_period(timestamps, "daily")
+        assert [utils.to_date_only_string(utils.get_period_start_date(p[0], "daily")) for p in grouped] == \
+            ["2023-05-29", "2023-06-03", "2023-06-05"]
+        assert [(p[1], p[2]) for p in grouped] == \
+            [(timestamps[0], timestamps[1]), (timestamps[2], timestamps[2]), (timestamps[3], timestamps[3])]
+
+        grouped = utils.group_timestamps_by_performance_period(timestamps, "weekly")
+        assert [utils.to_date_only_string(utils.get_period_start_date(p[0], "weekly")) for p in grouped] == \
+            ["2023-05-29", "2023-06-05"]
+        assert [(p[1], p[2]) for p in grouped] == [(timestamps[0], timestamps[2]), (timestamps[3], timestamps[3])]
+        assert grouped[1][0] == grouped[0][0] + 1
+
     def test_get_accurate_streak_params(self):
         def setup_method():
             db.connect("test.db")